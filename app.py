@@ -1,4 +1,5 @@
 import os
+import asyncio
 import base64
 import io
 import sys
@@ -7,23 +8,35 @@ import json
 import logging
 import time
 import datetime
-import glob
-import argparse
+import shutil
+import socket
+import threading
+import atexit
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging.handlers import RotatingFileHandler
-from flask import Flask, render_template, request, jsonify, send_file, make_response, after_this_request
+from flask import Blueprint, Flask, render_template, request, jsonify, send_file, send_from_directory, make_response, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import google.generativeai as genai
-from PIL import Image
-import requests
-from openai import OpenAI
-import openai  # RateLimitError gibi hata tiplerini yakalamak için
 import tempfile
-from gtts import gTTS
-from docx import Document
-from docx.shared import Inches
-from docx import Document
-from docx.shared import Inches
+from log_utils import JsonFormatter, TruncatingFormatter, start_queue_listener
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from providers import AbortSignal, RequestAborted, TextRequest, TextProvider, ImageProvider, SpeechProvider, ProviderRegistry
+from hedging import HedgedTextProvider, TextHedger
+from circuit_breaker import BreakerBoard, CircuitOpenError
+from lazy_imports import LazyClient, is_installed, lazy_callable
+from async_runner import AsyncLoopThread
+from tale_jobs import TaleJobManager, JobStage
+from gemini_registry import GeminiModelRegistry
+from rate_limiter import TokenBucketLimiter
+from image_cache import ImageCache, InFlightRequests
+from text_cache import TaleTextCache
+from audio_store import AudioStore
+from http_fetch import HttpFetcher
+from prefetch import Prefetcher
+from tale_index import TaleIndex
+import tale_store
+from image_variants import render_variant, render_variants, is_valid_variant, variant_mimetype
 
 # Log klasörünü oluştur
 logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
@@ -38,71 +51,336 @@ prompt_log_path = os.path.join(logs_dir, f"prompt_{timestamp}.log")
 # Loglama yapılandırması
 logger = logging.getLogger("masal_app")
 logger.setLevel(logging.DEBUG)
+# Kayıtlar kök logger'a da gitmesin (gunicorn vb. kendi handler'larını ekleyebilir)
+logger.propagate = False
 
-# Log formatı
-log_format = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+# Uzun alanlar (base64 görsel, istek gövdesi) bu uzunlukta kırpılır
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", 4000))
+
+# Log formatı - dosyalar satır başına bir JSON kaydı, konsol okunabilir metin (LOG_CONSOLE_FORMAT=json ile JSON)
+log_format = TruncatingFormatter('%(asctime)s [%(levelname)s] %(message)s', max_chars=LOG_MAX_FIELD_CHARS)
+json_log_format = JsonFormatter(max_chars=LOG_MAX_FIELD_CHARS)
 
 # Console handler
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(log_format)
+console_handler.setFormatter(json_log_format if os.getenv("LOG_CONSOLE_FORMAT") == "json" else log_format)
 
 # Normal log dosyası (INFO ve üstü seviye mesajlar için)
 file_handler = RotatingFileHandler(
     app_log_path, maxBytes=10*1024*1024, backupCount=3
 )
 file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(log_format)
+file_handler.setFormatter(json_log_format)
 
 # Debug log dosyası (tüm detaylı loglar için)
 debug_file_handler = RotatingFileHandler(
     debug_log_path, maxBytes=10*1024*1024, backupCount=3
 )
 debug_file_handler.setLevel(logging.DEBUG)
-debug_file_handler.setFormatter(log_format)
+debug_file_handler.setFormatter(json_log_format)
 
-# Handlerleri loggera ekle
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
-logger.addHandler(debug_file_handler)
+# İstek iş parçacığı kaydı yalnızca kuyruğa bırakır; biçimlendirme ve yazma dinleyici iş parçacığında yapılır
+log_listener = start_queue_listener(logger, [console_handler, file_handler, debug_file_handler])
 
 # Promt testi için ayrı bir logger
 prompt_logger = logging.getLogger("prompt_test")
 prompt_logger.setLevel(logging.INFO)
+prompt_logger.propagate = False
 prompt_handler = RotatingFileHandler(
     prompt_log_path, maxBytes=10*1024*1024, backupCount=3
 )
-prompt_handler.setFormatter(log_format)
-prompt_logger.addHandler(prompt_handler)
-prompt_logger.addHandler(console_handler)
+prompt_handler.setFormatter(json_log_format)
+prompt_log_listener = start_queue_listener(prompt_logger, [prompt_handler, console_handler])
+
+# Süreç kapanırken kuyrukta kalan kayıtlar yazılsın
+atexit.register(prompt_log_listener.stop)
+atexit.register(log_listener.stop)
 
 # .env dosyasından API anahtarlarını yükle
 load_dotenv()
 google_api_key = os.getenv("GOOGLE_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-if not google_api_key:
-    logger.error("Google API anahtarı bulunamadı! .env dosyanızı kontrol edin.")
-    raise ValueError("Lütfen .env dosyasına GOOGLE_API_KEY değerini ekleyin.")
+# Sağlayıcı SDK'ları (google.generativeai, openai, gtts, docx) başlangıçta değil ilk kullanımda yüklenir
+gTTS = lazy_callable('gtts', 'gTTS')
+Document = lazy_callable('docx', 'Document')
+Inches = lazy_callable('docx.shared', 'Inches')
+
+# Gemini için isteğe bağlı özel uç nokta (vekil sunucu veya benchmark.py'nin sahte sağlayıcısı); REST taşıması kullanılır
+gemini_api_endpoint = os.getenv("GEMINI_API_ENDPOINT", "")
+
+def gemini_model_factory(model_name):
+    """Gemini SDK'sını ilk model oluşturulurken yükler ve yapılandırır"""
+    import google.generativeai as genai
+    if gemini_api_endpoint:
+        genai.configure(api_key=google_api_key, transport='rest', client_options={'api_endpoint': gemini_api_endpoint})
+    else:
+        genai.configure(api_key=google_api_key)
+    return genai.GenerativeModel(model_name)
+
+def openai_client_factory():
+    """OpenAI SDK'sını ilk istekte yükler ve istemciyi oluşturur"""
+    from openai import OpenAI
+    logger.info("OpenAI istemcisi oluşturuldu.")
+    return OpenAI(api_key=openai_api_key)
+
+def async_openai_client_factory():
+    """Async sağlayıcı katmanı için AsyncOpenAI istemcisini oluşturur"""
+    from openai import AsyncOpenAI
+    logger.info("Async OpenAI istemcisi oluşturuldu.")
+    return AsyncOpenAI(api_key=openai_api_key)
+
+def is_provider_failure(error):
+    """
+    Devre kesici için sağlayıcı arızası mı? İsteğin kendisinden kaynaklanan
+    hatalar (içerik politikası, engellenen prompt) ve yerel kuyruk/iptal
+    hataları sağlayıcının sağlığı hakkında bilgi vermez.
+    """
+    if isinstance(error, (ImageRequestCancelled, TimeoutError, CircuitOpenError)):
+        return False
+    openai = sys.modules.get('openai')
+    if openai is not None and isinstance(error, openai.BadRequestError):
+        return False
+    genai_types = sys.modules.get('google.generativeai.types')
+    if genai_types is not None and isinstance(error, (genai_types.BlockedPromptException, genai_types.StopCandidateException)):
+        return False
+    return True
+
+# Devre kesiciler: art arda CIRCUIT_FAILURE_THRESHOLD kez hata veren sağlayıcı veya model
+# CIRCUIT_RESET_TIMEOUT saniye çağrılmaz, sonra tek bir deneme isteğiyle yoklanır
+circuit_breakers = BreakerBoard(
+    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+    reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30)),
+    max_reset_timeout=float(os.getenv("CIRCUIT_MAX_RESET_TIMEOUT", 300)),
+    is_failure=is_provider_failure
+)
 
-# Gemini API'yi yapılandır
-genai.configure(api_key=google_api_key)
-logger.info("Gemini API yapılandırıldı.")
+# Gemini modelleri ilk kullanımda bir kez yüklenir; ısınma isteği arka planda gönderilir
+if google_api_key and is_installed('google.generativeai'):
+    gemini_models = GeminiModelRegistry(model_factory=gemini_model_factory, breakers=circuit_breakers)
+    if os.getenv("GEMINI_WARMUP", "1") == "1":
+        gemini_models.start_warm_up()
+else:
+    gemini_models = GeminiModelRegistry(model_names=())
+    logger.warning("UYARI: Google API anahtarı bulunamadı. Gemini metin oluşturma devre dışı.")
 
-# OpenAI API'yi yapılandır
-if openai_api_key:
-    openai_client = OpenAI(api_key=openai_api_key)
-    logger.info("OpenAI API yapılandırıldı.")
+if openai_api_key and is_installed('openai'):
+    openai_client = LazyClient(openai_client_factory)
+    async_openai_client = LazyClient(async_openai_client_factory)
 else:
     openai_client = None
+    async_openai_client = None
     logger.warning("UYARI: OpenAI API anahtarı bulunamadı. DALL-E görsel oluşturma devre dışı.")
 
-app = Flask(__name__)
-# Tüm kaynaklardan gelen isteklere izin ver
-CORS(app, resources={r"/*": {"origins": "*"}})
-logger.info("Flask uygulaması ve CORS yapılandırıldı.")
+# DALL-E hız sınırı - dakikada 5 istek, tüm worker süreçleri tarafından paylaşılır
+dalle_rate_limiter = TokenBucketLimiter(
+    db_path=os.getenv("DALLE_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "masal_rate_limits.sqlite3")),
+    name="dalle",
+    rate_per_minute=float(os.getenv("DALLE_RATE_PER_MINUTE", 5)),
+    capacity=int(os.getenv("DALLE_RATE_BURST", 1))
+)
+# Kuyrukta en fazla bu kadar saniye beklenir, sonra placeholder görsel kullanılır
+dalle_queue_timeout = float(os.getenv("DALLE_QUEUE_TIMEOUT", 120))
+
+# Masal metni için kullanılan OpenAI modeli - daha yeni ve gelişmiş bir model
+OPENAI_TEXT_MODEL = "gpt-4o-mini-2024-07-18"
+
+# DALL-E istek parametreleri (önbellek anahtarının parçası)
+DALLE_MODEL = "dall-e-3"
+DALLE_SIZE = "1024x1024"
+DALLE_QUALITY = "standard"
+
+# Uzak görsel indirmeleri için paylaşılan bağlantı havuzu (DALL-E CDN, kaydedilen uzak URL'ler)
+http_fetcher = HttpFetcher(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", 20)),
+    per_host_limit=int(os.getenv("HTTP_PER_HOST_LIMIT", 4)),
+    connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)),
+    read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", 30)),
+    max_bytes=int(float(os.getenv("HTTP_MAX_MB", 20)) * 1024 * 1024)
+)
+
+# Aynı prompt için tekrar ücret ödememek adına üretilen görsellerin disk önbelleği
+image_cache = ImageCache(
+    directory=os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'images')),
+    max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", 500)) * 1024 * 1024)
+)
+# Önbellekte olmayan aynı görsel için süren DALL-E çağrıları - ikinci istek ona katılır
+dalle_flights = InFlightRequests()
+
+# Üretilen görsellerin teslim deposu - JSON içinde base64 yerine /images/<özet> adresinden sunulur
+generated_images = ImageCache(
+    directory=os.getenv("GENERATED_IMAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'generated')),
+    max_bytes=int(float(os.getenv("GENERATED_IMAGE_MAX_MB", 1000)) * 1024 * 1024),
+    extension='.img'
+)
+DEFAULT_TALE_IMAGE = "static/img/default-tale.jpg"
+# Teslim deposundaki dosyalar LRU ile silinebilir; adresleri kalıcı olmadığından
+# immutable işaretlenmez, tarayıcı süre dolunca ETag ile yeniden doğrular.
+# Kalıcı kopya için masal kaydedilir (/save_tale görselleri masal dizinine yazar)
+GENERATED_IMAGE_MAX_AGE = int(os.getenv("GENERATED_IMAGE_MAX_AGE", 86400))
+
+# Aynı girdilerle gelen masal istekleri için isteğe bağlı metin önbelleği
+if os.getenv("TALE_TEXT_CACHE", "0") == "1":
+    tale_text_cache = TaleTextCache(
+        ttl=int(os.getenv("TALE_TEXT_CACHE_TTL", 86400)),
+        variants=int(os.getenv("TALE_TEXT_CACHE_VARIANTS", 3)),
+        max_keys=int(os.getenv("TALE_TEXT_CACHE_MAX_KEYS", 1000))
+    )
+    logger.info("Masal metni önbelleği etkin.")
+else:
+    tale_text_cache = None
+
+# Sayfa seslendirmeleri - aynı metin için gTTS yalnızca bir kez çalışır
+audio_store = AudioStore(
+    directory=os.getenv("AUDIO_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'audio')),
+    max_bytes=int(float(os.getenv("AUDIO_STORE_MAX_MB", 500)) * 1024 * 1024)
+)
+# Depodaki sesler de LRU ile silinebilir; adresleri immutable işaretlenmez
+AUDIO_MAX_AGE = int(os.getenv("AUDIO_MAX_AGE", 86400))
+
+# Kaydedilmiş masalların meta veri indeksi - list_tales tek sorguyla çalışır
+TALES_DIR = tale_store.TALES_DIR
+tale_index = TaleIndex(
+    os.getenv("TALE_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'tale_index.sqlite3'))
+)
+if tale_index.count() == 0:
+    tale_index.rebuild(TALES_DIR)
+
+# Masal kaydederken görsel çözme/dönüştürme ve dosya yazma işleri için sınırlı havuz
+save_tale_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SAVE_TALE_WORKERS", 8)),
+    thread_name_prefix="save_tale"
+)
+
+# Toplu sayfa görseli üretimi - istekler yine de DALL-E hız sınırlayıcısında sıraya girer
+page_image_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PAGE_IMAGE_WORKERS", 4)),
+    thread_name_prefix="page_image"
+)
+
+# Sonraki sayfaların sesi için arka plan ön üretimi (PREFETCH=0 ile kapatılabilir)
+if os.getenv("PREFETCH", "1") == "1":
+    prefetcher = Prefetcher(
+        max_workers=int(os.getenv("PREFETCH_WORKERS", 2)),
+        idle_timeout=int(os.getenv("PREFETCH_IDLE_TIMEOUT", 300))
+    )
+else:
+    prefetcher = None
+PREFETCH_AHEAD = int(os.getenv("PREFETCH_AHEAD", 2))
+
+# Async sağlayıcı katmanı (ASYNC_PROVIDERS=1): /generate_tale ve /tale_jobs sağlayıcı
+# isteklerini tek bir olay döngüsünde bekler; istek başına iş parçacığı tutulmaz
+if os.getenv("ASYNC_PROVIDERS", "0") == "1":
+    provider_loop = AsyncLoopThread(blocking_workers=int(os.getenv("ASYNC_BLOCKING_WORKERS", 8)))
+else:
+    provider_loop = None
+
+# /metrics için süreç içi metrikler (Prometheus metin biçimi)
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    'masal_stage_duration_seconds',
+    "Aşama süreleri: text, image (sağlayıcı başına), llm_text, word_count_retry, dalle, image_download, base64_decode, tts, docx, store_io",
+    ('stage', 'target')
+)
+provider_errors = metrics.counter(
+    'masal_provider_errors_total', "Sağlayıcı çağrısı hataları", ('provider', 'stage')
+)
+provider_fallbacks = metrics.counter(
+    'masal_provider_fallbacks_total', "Bir sağlayıcı/model başarısız olunca bir sonrakine geçişler", ('source', 'target')
+)
+placeholder_images = metrics.counter(
+    'masal_placeholder_images_total', "Gerçek görsel yerine üretilen placeholder görseller", ('reason',)
+)
+
+def collect_cache_metrics():
+    """Önbelleklerin kendi isabet/ıskalama sayaçlarını metrik olarak döndürür"""
+    caches = {
+        'images': image_cache,
+        'generated_images': generated_images,
+        'texts': tale_text_cache,
+        'audio': audio_store
+    }
+    stats = {name: cache.stats() for name, cache in caches.items() if cache is not None}
+    return [
+        ('masal_cache_hits_total', 'counter', "Önbellek isabetleri",
+         [({'cache': name}, values['hits']) for name, values in stats.items()]),
+        ('masal_cache_misses_total', 'counter', "Önbellek ıskalamaları",
+         [({'cache': name}, values['misses']) for name, values in stats.items()]),
+    ]
+
+metrics.add_collector(collect_cache_metrics)
+
+circuit_short_circuits = metrics.counter(
+    'masal_circuit_short_circuits_total', "Devresi açık olduğu için çağrılmadan atlanan sağlayıcılar", ('breaker',)
+)
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+def collect_circuit_metrics():
+    """Devre kesicilerin durumunu ve açılma sayılarını metrik olarak döndürür"""
+    status = circuit_breakers.status()
+    return [
+        ('masal_circuit_state', 'gauge', "Devre durumu: 0 kapalı, 1 yarı açık, 2 açık",
+         [({'breaker': name}, CIRCUIT_STATE_VALUES[info['state']]) for name, info in status.items()]),
+        ('masal_circuit_opened_total', 'counter', "Devrenin açılma sayısı",
+         [({'breaker': name}, info['opened']) for name, info in status.items()]),
+    ]
+
+metrics.add_collector(collect_circuit_metrics)
+
+@contextlib.contextmanager
+def provider_call(stage, provider):
+    """Sağlayıcı çağrısının süresini kaydeder; hata olursa sağlayıcı hata sayacını artırır"""
+    try:
+        with stage_seconds.time(stage=stage, target=provider):
+            yield
+    except Exception:
+        provider_errors.inc(provider=provider, stage=stage)
+        raise
+
+# Kapanış (drenaj) durumu: SIGTERM alındığında veya DRAIN_FILE oluşturulduğunda
+# hazır olma kontrolü 503 döner, yeni masal işleri ve ön üretimler kabul edilmez
+draining = threading.Event()
+DRAIN_FILE = os.getenv("DRAIN_FILE", "")
+
+def is_draining():
+    return draining.is_set() or bool(DRAIN_FILE and os.path.exists(DRAIN_FILE))
+
+def begin_draining():
+    """Süreci kapanışa hazırlar; bekleyen ön üretimler iptal edilir"""
+    if draining.is_set():
+        return
+    draining.set()
+    logger.info("Kapanış başladı: yeni işler kabul edilmiyor.")
+    if prefetcher:
+        prefetcher.shutdown()
+
+def shutdown_background_work(timeout=30):
+    """Çalışan masal işlerinin bitmesini bekler ve iş havuzlarını kapatır"""
+    begin_draining()
+    finished = tale_jobs.shutdown(timeout=timeout)
+    for executor in (save_tale_executor, page_image_executor):
+        executor.shutdown(wait=False)
+    text_hedger.shutdown()
+    if provider_loop:
+        provider_loop.stop()
+    logger.info(f"Arka plan işleri kapatıldı (tümü tamamlandı: {finished})")
+
+bp = Blueprint('masal', __name__)
+
+# Arka plan masal işleri - her aşamanın kendi eşzamanlılık limiti var
+tale_jobs = TaleJobManager(stage_limits={
+    'text': int(os.getenv("TALE_JOB_TEXT_WORKERS", 4)),
+    'image': int(os.getenv("TALE_JOB_IMAGE_WORKERS", 2)),
+    'audio': int(os.getenv("TALE_JOB_AUDIO_WORKERS", 4))
+}, loop_runner=provider_loop, async_stage_limits={
+    # Async aşamalar iş parçacığı tutmadığından çok daha fazla iş aynı anda bekleyebilir
+    'text': int(os.getenv("ASYNC_TALE_JOB_TEXT_LIMIT", 200)),
+    'image': int(os.getenv("ASYNC_TALE_JOB_IMAGE_LIMIT", 200)),
+    'audio': int(os.getenv("ASYNC_TALE_JOB_AUDIO_LIMIT", 16))
+})
 
-@app.route('/')
+@bp.route('/')
 def index():
     logger.debug("Ana sayfa isteği alındı.")
     response = make_response(render_template('index.html'))
@@ -112,7 +390,7 @@ def index():
     response.headers["Expires"] = "0"
     return response
     
-@app.route('/debug')
+@bp.route('/debug')
 def debug_page():
     logger.debug("Debug sayfası isteği alındı.")
     response = make_response(render_template('debug.html'))
@@ -180,20 +458,175 @@ def parse_form_data(request):
         
     return character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes
 
-@app.route('/generate_tale', methods=['POST'])
+# Sayfa görseli isteklerinde gelen karakter özelliği alanları
+PAGE_IMAGE_ATTRIBUTE_KEYS = ('character_age', 'character_gender', 'character_hair_type', 'character_hair_color', 'character_skin_color')
+
+def build_character_description(character_attributes):
+    """Görsel promptları için karakter özelliklerinden '(... ) ' biçiminde açıklama oluşturur"""
+    character_attributes = character_attributes or {}
+    character_description = ""
+
+    if character_attributes.get('character_age'):
+        character_description += f"{character_attributes.get('character_age')} yaşında, "
+
+    if character_attributes.get('character_gender'):
+        character_description += f"{character_attributes.get('character_gender')}, "
+
+    hair_parts = []
+    if character_attributes.get('character_hair_type'):
+        hair_parts.append(character_attributes.get('character_hair_type'))
+    if character_attributes.get('character_hair_color'):
+        hair_parts.append(character_attributes.get('character_hair_color'))
+
+    if hair_parts:
+        character_description += f"{' '.join(hair_parts)} saçlı, "
+
+    if character_attributes.get('character_skin_color'):
+        character_description += f"{character_attributes.get('character_skin_color')} tenli, "
+
+    # Son virgülü ve boşluğu kaldır
+    if character_description:
+        character_description = character_description.rstrip(", ")
+        character_description = f"({character_description}) "
+
+    return character_description
+
+def build_first_page_image_prompt(sections, character_name, character_type, setting, theme, character_attributes):
+    """Masalın ilk sayfası için görsel promptu oluşturur"""
+    character_description = build_character_description(character_attributes)
+
+    if sections:
+        return f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında: {sections[0]}"
+
+    # Bölüm yoksa genel bir prompt kullan
+    return f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında, {theme} temalı bir masal için illüstrasyon"
+
+def build_page_image_prompt(character_name, character_description, character_type, setting, page_text):
+    """Sayfa görseli için DALL-E promptunu oluşturur"""
+    return f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında: {page_text}"
+
+def image_mimetype(image_data):
+    """Görsel baytlarının ilk baytlarına bakarak MIME tipini belirler"""
+    if image_data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if image_data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+def variant_image_key(image_key, variant, fmt):
+    """Orijinal görselin türevi için teslim deposu anahtarı"""
+    return ImageCache.content_key(f"{image_key}/{variant}.{fmt}".encode('utf-8'))
+
+def publish_image(image_data):
+    """
+    Görseli ve okuyucu boyutundaki WebP türevini teslim deposuna koyar, türevin adresini döndürür.
+    
+    Yanıtın gösterdiği tek türev istek sırasında üretilir; diğer türevler ilk
+    istendiklerinde /images/<özet>/<türev>.<uzantı> tarafından üretilir. Adres
+    orijinal görselin özetini içerir; kaydetme ve Word çıktısı her zaman orijinale ulaşır.
+    """
+    if not image_data:
+        return DEFAULT_TALE_IMAGE
+    image_key = generated_images.put_content(image_data)
+    try:
+        generated_images.put(variant_image_key(image_key, 'reader', 'webp'), render_variant(image_data, 'reader', 'webp'))
+    except Exception as e:
+        logger.error(f"Görsel türevleri üretilemedi, orijinal sunulacak: {e}")
+        return f"/images/{image_key}"
+    return f"/images/{image_key}/reader.webp"
+
+def render_image_outputs(image_data, outputs):
+    """İstenen türevleri teslim deposunda hazır olanlardan alır, yalnızca eksikleri üretir"""
+    image_key = ImageCache.content_key(image_data)
+    results = {}
+    for variant, fmt in outputs:
+        variant_data = generated_images.get(variant_image_key(image_key, variant, fmt))
+        if variant_data:
+            results[(variant, fmt)] = variant_data
+    missing = [output for output in outputs if output not in results]
+    if missing:
+        results.update(render_variants(image_data, outputs=missing))
+    return results
+
+def save_image_files(image_data, path_prefix, variants=('reader',)):
+    """
+    Kaydedilen masal görselini {önek}.jpg (baskı boyutu, progresif JPEG) ve
+    {önek}_{türev}.webp dosyaları olarak yazar.
+    """
+    try:
+        rendered = render_image_outputs(image_data, [('print', 'jpg')] + [(variant, 'webp') for variant in variants])
+    except Exception as e:
+        # Görsel çözülemiyorsa eski davranış: baytları olduğu gibi yaz
+        logger.warning(f"Görsel dönüştürülemedi, ham hali kaydediliyor: {e}")
+        with open(f"{path_prefix}.jpg", 'wb') as f:
+            f.write(image_data)
+        return
+    
+    with open(f"{path_prefix}.jpg", 'wb') as f:
+        f.write(rendered[('print', 'jpg')])
+    for variant in variants:
+        with open(f"{path_prefix}_{variant}.webp", 'wb') as f:
+            f.write(rendered[(variant, 'webp')])
+
+def print_image_bytes(image_data):
+    """Word çıktısı için görseli baskı boyutunda JPEG'e dönüştürür (WebP dahil her formatı kabul eder)"""
+    try:
+        return render_image_outputs(image_data, [('print', 'jpg')])[('print', 'jpg')]
+    except Exception as e:
+        logger.warning(f"Görsel baskı boyutuna dönüştürülemedi, orijinali kullanılacak: {e}")
+        return image_data
+
+def load_image_reference(reference):
+    """data: URL, /images/<özet>, static/ altındaki dosya, uzak URL veya ham base64 görselin baytlarını döndürür"""
+    if reference.startswith('data:image/'):
+        with stage_seconds.time(stage='base64_decode', target='image'):
+            return base64.b64decode(reference.split(',')[1])
+    
+    if reference.startswith('/images/'):
+        # /images/<özet>/<türev>.<uzantı> adresleri de orijinal görsele çözülür
+        image_key = reference[len('/images/'):].split('/')[0]
+        image_path = generated_images.locate(image_key) if ImageCache.is_valid_key(image_key) else None
+        if not image_path:
+            raise FileNotFoundError(f"Görsel bulunamadı: {reference}")
+        with open(image_path, 'rb') as f:
+            return f.read()
+    
+    if reference.startswith(('http://', 'https://')):
+        logger.debug("URL'den görsel indiriliyor: %.30s...", reference)
+        with stage_seconds.time(stage='image_download', target='remote'):
+            return http_fetcher.fetch(reference)
+    
+    if reference.lstrip('/').startswith('static/'):
+        # Masal dosyaları TALES_DIR'de, diğerleri uygulamanın static dizininde (çalışma dizininden bağımsız)
+        if reference.lstrip('/').startswith(tale_store.TALES_URL + '/'):
+            local_path = tale_store.tale_path(TALES_DIR, reference)
+        else:
+            static_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+            local_path = os.path.abspath(os.path.join(os.path.dirname(static_root), reference.lstrip('/')))
+            if not local_path.startswith(static_root + os.sep):
+                local_path = None
+        if not local_path:
+            raise ValueError(f"Geçersiz görsel yolu: {reference}")
+        # Kaydedilmiş masal türevleri yerine ana JPEG'i kullan
+        for variant_suffix in ('_thumb.webp', '_reader.webp'):
+            if local_path.endswith(variant_suffix) and os.path.exists(local_path[:-len(variant_suffix)] + '.jpg'):
+                local_path = local_path[:-len(variant_suffix)] + '.jpg'
+        with open(local_path, 'rb') as f:
+            return f.read()
+    
+    # Eski istemciler ham base64 veri gönderir
+    with stage_seconds.time(stage='base64_decode', target='image'):
+        return base64.b64decode(reference)
+
+@bp.route('/generate_tale', methods=['POST'])
 def generate_tale():
     try:
         logger.info("Masal oluşturma isteği alındı.")
         
-        # Request içeriğini logla
-        try:
-            logger.debug(f"İstek türü: {request.content_type}")
-            if request.data:
-                logger.debug(f"İstek verisi: {request.data.decode('utf-8')}")
-            logger.debug(f"Form verisi: {request.form}")
-            logger.debug(f"JSON verisi: {request.json if request.is_json else 'JSON verisi yok'}")
-        except Exception as e:
-            logger.error(f"İstek verisi loglanırken hata: {str(e)}")
+        # Request içeriğini logla (biçimlendirme ve kırpma log iş parçacığında yapılır)
+        logger.debug("İstek türü: %s, veri: %s, form: %s", request.content_type, request.get_data(), request.form.to_dict())
         
         # Form verilerini parse et
         character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes = parse_form_data(request)
@@ -205,6 +638,14 @@ def generate_tale():
             logger.error("Eksik form verileri")
             return jsonify({"error": "Lütfen tüm alanları doldurunuz."}), 400
         
+        if provider_loop:
+            # Async katman: metinden sonra ilk sayfa görseli ve sesi birlikte beklenir
+            response_data = provider_loop.run(generate_tale_async(
+                character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes
+            ))
+            logger.info("Masal başarıyla oluşturuldu (async).")
+            return jsonify(response_data)
+        
         # Masal oluşturma
         logger.info("Masal metni oluşturuluyor...")
         tale_text = generate_tale_text(character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
@@ -216,82 +657,11 @@ def generate_tale():
         # İlk sayfa için görsel oluştur
         logger.info(f"{image_api} API kullanarak ilk sayfa görseli oluşturuluyor...")
         
-        # Masalı bölümlere ayır
+        # İlk sayfa görseli için prompt hazırla
         sections = split_text_into_sections(tale_text, 50)
-        if sections:
-            first_section = sections[0]
-            # Karakter özelliklerini al ve prompta ekle
-            character_description = ""
-            # Debug log için özellikleri göster
-            logger.info(f"character_age: {request.form.get('character_age', 'YOK')}")
-            logger.info(f"character_gender: {request.form.get('character_gender', 'YOK')}")
-            logger.info(f"character_hair_color: {request.form.get('character_hair_color', 'YOK')}")
-            logger.info(f"character_hair_type: {request.form.get('character_hair_type', 'YOK')}")
-            logger.info(f"character_skin_color: {request.form.get('character_skin_color', 'YOK')}")
-            
-            if request.form.get('character_age'):
-                character_description += f"{request.form.get('character_age')} yaşında, "
-                
-            if request.form.get('character_gender'):
-                character_description += f"{request.form.get('character_gender')}, "
-            
-            hair_parts = []
-            if request.form.get('character_hair_type'):
-                hair_parts.append(request.form.get('character_hair_type'))
-            if request.form.get('character_hair_color'):
-                hair_parts.append(request.form.get('character_hair_color'))
-            
-            if hair_parts:
-                character_description += f"{' '.join(hair_parts)} saçlı, "
-            
-            if request.form.get('character_skin_color'):
-                character_description += f"{request.form.get('character_skin_color')} tenli, "
-            
-            # Son virgülü ve boşluğu kaldır
-            if character_description:
-                character_description = character_description.rstrip(", ")
-                character_description = f"({character_description}) "
-            
-            # İlk sayfa için özel prompt oluştur
-            image_prompt = f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında: {first_section}"
-            # Prompt'u logla
-            prompt_logger.info(f"Image prompt: {image_prompt}")
-        else:
-            # Bölüm yoksa genel bir prompt kullan
-            character_description = ""
-            # Debug log için özellikleri göster
-            logger.info(f"Bölüm yoksa - character_age: {request.form.get('character_age', 'YOK')}")
-            logger.info(f"Bölüm yoksa - character_gender: {request.form.get('character_gender', 'YOK')}")
-            logger.info(f"Bölüm yoksa - character_hair_color: {request.form.get('character_hair_color', 'YOK')}")
-            logger.info(f"Bölüm yoksa - character_hair_type: {request.form.get('character_hair_type', 'YOK')}")
-            logger.info(f"Bölüm yoksa - character_skin_color: {request.form.get('character_skin_color', 'YOK')}")
-            
-            if request.form.get('character_age'):
-                character_description += f"{request.form.get('character_age')} yaşında, "
-                
-            if request.form.get('character_gender'):
-                character_description += f"{request.form.get('character_gender')}, "
-            
-            hair_parts = []
-            if request.form.get('character_hair_type'):
-                hair_parts.append(request.form.get('character_hair_type'))
-            if request.form.get('character_hair_color'):
-                hair_parts.append(request.form.get('character_hair_color'))
-            
-            if hair_parts:
-                character_description += f"{' '.join(hair_parts)} saçlı, "
-            
-            if request.form.get('character_skin_color'):
-                character_description += f"{request.form.get('character_skin_color')} tenli, "
-            
-            # Son virgülü ve boşluğu kaldır
-            if character_description:
-                character_description = character_description.rstrip(", ")
-                character_description = f"({character_description}) "
-                
-            image_prompt = f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında, {theme} temalı bir masal için illüstrasyon"
-            # Prompt'u logla
-            prompt_logger.info(f"Image prompt: {image_prompt}")
+        image_prompt = build_first_page_image_prompt(sections, character_name, character_type, setting, theme, character_attributes)
+        # Prompt'u logla
+        prompt_logger.info(f"Image prompt: {image_prompt}")
         
         # Görseli oluştur
         image_data = generate_image_for_section(image_prompt, image_api)
@@ -302,11 +672,11 @@ def generate_tale():
         else:
             logger.warning("Görsel oluşturma başarısız, varsayılan görsel kullanılacak.")
         
-        # Yanıt hazırla
+        # Yanıt hazırla - görsel JSON içine gömülmez, adresi verilir
         response_data = {
             "tale_title": tale_title,
             "tale_text": tale_text,
-            "image_url": f"data:image/jpeg;base64,{image_data}" if image_data else "static/img/default-tale.jpg"
+            "image_url": publish_image(image_data)
         }
         
         logger.info("Masal başarıyla oluşturuldu.")
@@ -321,7 +691,225 @@ def generate_tale():
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e), "details": error_details}), 500
 
-@app.route('/save_word', methods=['POST'])
+def sse_event(event, data):
+    """Server-Sent Events biçiminde tek bir olay satırı oluşturur"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@bp.route('/generate_tale_stream', methods=['POST'])
+def generate_tale_stream():
+    """Masal metnini model ürettikçe Server-Sent Events olarak gönderir"""
+    logger.info("Akışlı masal oluşturma isteği alındı.")
+
+    character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes = parse_form_data(request)
+
+    # Veri doğrulama
+    if not character_name or not character_type or not setting or not theme:
+        logger.error("Eksik form verileri")
+        return jsonify({"error": "Lütfen tüm alanları doldurunuz."}), 400
+
+    tale_title = f"{character_name}'nin {setting} Macerası"
+
+    def events():
+        yield sse_event('meta', {"tale_title": tale_title})
+        try:
+            for event, text in stream_tale_text(character_name, character_type, setting, theme, word_limit, text_api, character_attributes):
+                if event == 'delta':
+                    yield sse_event('delta', {"text": text})
+                elif event == 'reset':
+                    yield sse_event('reset', {})
+                elif event == 'final':
+                    logger.info("Akışlı masal metni tamamlandı.")
+                    yield sse_event('final', {"tale_title": tale_title, "tale_text": text})
+        except CircuitOpenError as e:
+            logger.warning(f"Akışlı masal oluşturulamadı: {str(e)}")
+            yield sse_event('error', {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Akışlı masal oluşturulurken hata oluştu: {str(e)}")
+            logger.error(traceback.format_exc())
+            yield sse_event('error', {"error": str(e)})
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    # Ters vekil sunucuların (nginx) yanıtı tamponlamasını engelle
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@bp.route('/tale_jobs', methods=['POST'])
+def create_tale_job():
+    """Masal oluşturma işini başlatır ve iş kimliğini hemen döndürür"""
+    if is_draining():
+        # Yük dengeleyici isteği başka bir sürece yönlendirebilsin
+        return jsonify({"error": "Sunucu yeniden başlatılıyor, lütfen tekrar deneyin."}), 503, {'Retry-After': '5'}
+    try:
+        logger.info("Masal oluşturma işi isteği alındı.")
+
+        character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes = parse_form_data(request)
+
+        # Veri doğrulama
+        if not character_name or not character_type or not setting or not theme:
+            logger.error("Eksik form verileri")
+            return jsonify({"error": "Lütfen tüm alanları doldurunuz."}), 400
+
+        # Async sağlayıcı döngüsü varsa aşamalar iş parçacığı tutmayan coroutine'lerdir
+        if provider_loop:
+            async def text_stage(job):
+                tale_text = await generate_tale_text_async(character_name, character_type, setting, theme, word_limit, text_api, character_attributes, raise_errors=True)
+                job.context['sections'] = split_text_into_sections(tale_text, 50)
+                return {
+                    "tale_title": f"{character_name}'nin {setting} Macerası",
+                    "tale_text": tale_text
+                }
+
+            async def image_stage(job):
+                image_prompt = build_first_page_image_prompt(job.context['sections'], character_name, character_type, setting, theme, character_attributes)
+                prompt_logger.info(f"Image prompt: {image_prompt}")
+                image_data = await generate_image_for_section_async(image_prompt, image_api)
+                if not image_data:
+                    logger.warning("Görsel oluşturma başarısız, varsayılan görsel kullanılacak.")
+                return {"image_url": await asyncio.to_thread(publish_image, image_data)}
+
+            async def audio_stage(job):
+                sections = job.context['sections']
+                if not sections:
+                    return None
+                return {"audio_url": f"/audio/{await create_audio_async(sections[0])}.mp3"}
+        else:
+            def text_stage(job):
+                tale_text = generate_tale_text(character_name, character_type, setting, theme, word_limit, text_api, character_attributes, raise_errors=True)
+                job.context['sections'] = split_text_into_sections(tale_text, 50)
+                return {
+                    "tale_title": f"{character_name}'nin {setting} Macerası",
+                    "tale_text": tale_text
+                }
+
+            def image_stage(job):
+                image_prompt = build_first_page_image_prompt(job.context['sections'], character_name, character_type, setting, theme, character_attributes)
+                prompt_logger.info(f"Image prompt: {image_prompt}")
+                image_data = generate_image_for_section(image_prompt, image_api)
+                if not image_data:
+                    logger.warning("Görsel oluşturma başarısız, varsayılan görsel kullanılacak.")
+                return {"image_url": publish_image(image_data)}
+
+            def audio_stage(job):
+                sections = job.context['sections']
+                if not sections:
+                    return None
+                audio_key, _ = audio_store.get_or_create(sections[0], 'tr', False, create_audio)
+                return {"audio_url": f"/audio/{audio_key}.mp3"}
+
+        job = tale_jobs.submit([
+            JobStage('text', text_stage, required=True),
+            JobStage('image', image_stage, after=['text']),
+            JobStage('audio', audio_stage, after=['text'])
+        ])
+
+        return jsonify({"job_id": job.id, "status_url": f"/tale_jobs/{job.id}"}), 202
+
+    except Exception as e:
+        logger.error(f"Masal işi oluşturulurken hata oluştu: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/tale_jobs/<job_id>', methods=['GET'])
+def get_tale_job(job_id):
+    """Masal işinin aşama bazında durumunu ve hazır olan sonuçlarını döndürür"""
+    job = tale_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/capabilities', methods=['GET'])
+def get_capabilities():
+    """Hangi sağlayıcıların ve çıktıların kullanılabildiğini döndürür"""
+    return jsonify(capabilities)
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Canlılık kontrolü - süreç istek yanıtlayabiliyor mu"""
+    return jsonify({'status': 'ok'})
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Hazır olma kontrolü - kapanışta veya bağımlılıklar kullanılamazken 503 döner"""
+    checks = {'draining': is_draining()}
+    try:
+        tale_index.count()
+        checks['tale_index'] = True
+    except Exception as e:
+        logger.error(f"Hazır olma kontrolü: masal indeksi okunamadı: {e}")
+        checks['tale_index'] = False
+    checks['storage'] = all(
+        os.access(directory, os.W_OK)
+        for directory in (image_cache.directory, generated_images.directory, audio_store.directory)
+    )
+    checks['text_provider'] = any(capabilities['text'].values())
+
+    ready = not checks['draining'] and checks['tale_index'] and checks['storage'] and checks['text_provider']
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Aşama gecikme histogramlarını ve sayaçları Prometheus metin biçiminde döndürür"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Önbelleklerin isabet/ıskalama istatistiklerini döndürür"""
+    return jsonify({
+        'images': {**image_cache.stats(), **dalle_flights.stats()},
+        'generated_images': generated_images.stats(),
+        'texts': tale_text_cache.stats() if tale_text_cache else None,
+        'audio': audio_store.stats(),
+        'prefetch': prefetcher.stats() if prefetcher else None,
+        'text_hedge': text_hedger.stats() if text_hedger.enabled else None,
+        'circuits': circuit_breakers.status()
+    })
+
+@bp.route(f'/{tale_store.TALES_URL}/<path:filename>', methods=['GET'])
+def get_tale_file(filename):
+    """Kaydedilmiş masal dosyalarını TALES_DIR'den sunar (static dizininin dışında da olabilir)"""
+    return send_from_directory(TALES_DIR, filename)
+
+@bp.route('/images/<image_key>', methods=['GET'])
+def get_image(image_key):
+    """Üretilen görseli ETag ile ikili olarak gönderir"""
+    image_path = generated_images.locate(image_key) if ImageCache.is_valid_key(image_key) else None
+    if not image_path:
+        return jsonify({'error': 'Görsel bulunamadı'}), 404
+    
+    with open(image_path, 'rb') as f:
+        mimetype = image_mimetype(f.read(16))
+    
+    response = send_file(image_path, mimetype=mimetype, conditional=True, etag=image_key, max_age=GENERATED_IMAGE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={GENERATED_IMAGE_MAX_AGE}'
+    return response
+
+@bp.route('/images/<image_key>/<variant>.<fmt>', methods=['GET'])
+def get_image_variant(image_key, variant, fmt):
+    """Görselin boyut/format türevini gönderir; depoda yoksa orijinalden üretip saklar"""
+    if not ImageCache.is_valid_key(image_key) or not is_valid_variant(variant, fmt):
+        return jsonify({'error': 'Görsel bulunamadı'}), 404
+    
+    variant_key = variant_image_key(image_key, variant, fmt)
+    image_path = generated_images.locate(variant_key)
+    if not image_path:
+        original_path = generated_images.locate(image_key)
+        if not original_path:
+            return jsonify({'error': 'Görsel bulunamadı'}), 404
+        try:
+            with open(original_path, 'rb') as f:
+                generated_images.put(variant_key, render_variant(f.read(), variant, fmt))
+        except Exception as e:
+            logger.error(f"Görsel türevi üretilemedi ({variant}.{fmt}): {e}")
+            logger.error(traceback.format_exc())
+            return jsonify({'error': str(e)}), 500
+        image_path = generated_images.locate(variant_key)
+    
+    response = send_file(image_path, mimetype=variant_mimetype(fmt), conditional=True, etag=variant_key, max_age=GENERATED_IMAGE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={GENERATED_IMAGE_MAX_AGE}'
+    return response
+
+@bp.route('/save_word', methods=['POST'])
 def save_word():
     try:
         data = request.json
@@ -332,38 +920,99 @@ def save_word():
         logger.info(f"Word dosyası oluşturma isteği alındı - Metin uzunluğu: {len(tale_text)} karakter, Görsel sayısı: {len(images)}")
         
         # Word dosyası oluştur
-        doc_path = create_word_document(tale_text, images)
+        with stage_seconds.time(stage='docx', target='python-docx'):
+            doc_buffer = create_word_document(tale_text, images)
         
-        logger.info(f"Word dosyası başarıyla oluşturuldu: {doc_path}")
+        logger.info("Word dosyası başarıyla oluşturuldu")
         
         # Word dosyasını gönder
-        return send_file(doc_path, as_attachment=True, download_name='masal.docx')
+        return send_file(
+            doc_buffer,
+            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            as_attachment=True,
+            download_name='masal.docx'
+        )
     except Exception as e:
         logger.error(f"Word dosyası oluşturma hatası: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/generate_audio', methods=['POST'])
+def prefetch_audio(tale_id, next_texts, lang, slow):
+    """Sonraki sayfaların seslerini arka planda ses deposuna üretir"""
+    if not prefetcher or not tale_id or is_draining():
+        return
+    for text in [text for text in next_texts if text][:PREFETCH_AHEAD]:
+        audio_key = AudioStore.make_key(text, lang, slow)
+        if audio_store.exists(audio_key):
+            continue
+        prefetcher.schedule(
+            tale_id, f"audio:{audio_key}",
+            lambda cancel_event, text=text: audio_store.get_or_create(text, lang, slow, create_audio)
+        )
+
+@bp.route('/prefetch/cancel', methods=['POST'])
+def cancel_prefetch():
+    """Masal terk edildiğinde (yeni masal, sayfadan çıkış) bekleyen ön üretimleri iptal eder"""
+    data = request.get_json(silent=True) or {}
+    tale_id = data.get('tale_id')
+    cancelled = prefetcher.cancel(tale_id) if prefetcher and tale_id else 0
+    if cancelled:
+        logger.info(f"{tale_id} masalı için {cancelled} ön üretim işi iptal edildi")
+    return jsonify({'cancelled': cancelled})
+
+@bp.route('/generate_audio', methods=['POST'])
 def generate_audio():
+    page = 0
     try:
         data = request.json
         text = data.get('text', '')
         page = data.get('page', 0)  # Sayfa numarasını al (debug için)
+        lang = data.get('lang', 'tr')
+        slow = bool(data.get('slow', False))
         
         logger.info(f"Sayfa {page+1} için ses oluşturma isteği alındı, metin uzunluğu: {len(text)} karakter")
-        logger.debug(f"Sayfa {page+1} metin başlangıcı: {text[:30]}...")
+        logger.debug("Sayfa %d metin başlangıcı: %.30s...", page + 1, text)
+        
+        # Ses dosyasını depodan al, yoksa oluştur
+        audio_key, audio_path = audio_store.get_or_create(text, lang, slow, create_audio)
         
-        # Ses dosyası oluştur
-        audio_path = create_audio(text)
+        logger.info(f"Sayfa {page+1} için ses dosyası hazır: {audio_key[:12]}")
         
-        logger.info(f"Sayfa {page+1} için ses dosyası oluşturuldu: {audio_path}")
+        # Sonraki sayfaların seslerini okuyucu oraya gelmeden hazırla
+        prefetch_audio(data.get('tale_id'), data.get('next_texts') or [], lang, slow)
+        
+        # İstemcide aynı ses zaten varsa tekrar gönderme
+        if request.if_none_match.contains(audio_key):
+            response = make_response('', 304)
+            response.set_etag(audio_key)
+            return response
         
         # Ses dosyasını gönder - mimetype belirtiyoruz ve attachment olarak değil normal dosya olarak gönderiyoruz
-        return send_file(audio_path, mimetype='audio/mpeg', as_attachment=False)
+        response = send_file(audio_path, mimetype='audio/mpeg', as_attachment=False, etag=audio_key)
+        # Tekrar oynatma ve ileri/geri sarma için Range destekli kalıcı adres
+        response.headers['Content-Location'] = f"/audio/{audio_key}.mp3"
+        return response
     except Exception as e:
         logger.error(f"Sayfa {page+1} için ses oluşturma hatası: {str(e)}")
-        
-@app.route('/save_tale', methods=['POST'])
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/audio/<audio_key>.mp3', methods=['GET'])
+def get_audio(audio_key):
+    """Depodaki ses dosyasını ETag, 304 ve byte-range desteğiyle gönderir"""
+    audio_path = None
+    if len(audio_key) == 64 and all(c in '0123456789abcdef' for c in audio_key):
+        audio_path = audio_store.locate(audio_key)
+    if not audio_path:
+        return jsonify({'error': 'Ses bulunamadı'}), 404
+    
+    # conditional=True: If-None-Match için 304, Range başlığı için 206 yanıtı
+    response = send_file(audio_path, mimetype='audio/mpeg', conditional=True, etag=audio_key, max_age=AUDIO_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={AUDIO_MAX_AGE}'
+    return response
+
+
+@bp.route('/save_tale', methods=['POST'])
 def save_tale():
     try:
         data = request.json
@@ -372,18 +1021,15 @@ def save_tale():
             return jsonify({'error': 'Veri bulunamadı'}), 400
         
         # Masal ID'sini kontrol et, yoksa oluştur
-        tale_id = data.get('id', str(int(time.time())))
+        tale_id = str(data.get('id', int(time.time())))
+        if not tale_store.is_valid_tale_id(tale_id):
+            logger.error(f"save_tale: Geçersiz masal ID'si: {tale_id}")
+            return jsonify({'error': 'Geçersiz masal ID'}), 400
         tale_type = data.get('type', 'history')  # 'history' veya 'favorites'
         tale_title = data.get('title', 'Başlıksız Masal')
         
         logger.info(f"save_tale: Masal kaydediliyor - ID: {tale_id}, Tür: {tale_type}, Başlık: {tale_title}")
         
-        # Tek bir dizin kullan
-        directory = 'static/tales/all'
-        
-        # Klasör yoksa oluştur
-        os.makedirs(directory, exist_ok=True)
-        
         # Masal bilgilerini JSON olarak kaydet
         tale_info = {
             'id': tale_id,
@@ -398,96 +1044,98 @@ def save_tale():
             'isFavorite': tale_type == 'favorites'  # Favorilere ait mi işareti ekle
         }
         
-        # JSON dosyasını kaydet
-        json_path = f"{directory}/{tale_id}.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(tale_info, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"save_tale: JSON bilgileri kaydedildi: {json_path}")
-        
-        # Görsel varsa kaydet
-        image_saved = False
-        if 'image' in data and data['image']:
-            # Base64 veriyi ayır ve decode et
-            try:
-                image_path = f"{directory}/{tale_id}_image.jpg"
-                if data['image'].startswith('data:image/'):
-                    logger.debug(f"save_tale: Base64 görsel verisi işleniyor")
-                    img_data = data['image'].split(',')[1]
-                    binary_data = base64.b64decode(img_data)
-                else:
-                    # URL ise indirip kaydedelim
-                    logger.debug(f"save_tale: URL'den görsel indiriliyor: {data['image'][:30]}...")
-                    response = requests.get(data['image'])
-                    binary_data = response.content
-                
-                # Görsel dosyasını kaydet
-                with open(image_path, 'wb') as f:
-                    f.write(binary_data)
-                
-                logger.info(f"save_tale: Ana görsel kaydedildi: {image_path}")
-                image_saved = True
-            except Exception as img_err:
-                logger.error(f"save_tale: Ana görsel kaydedilirken hata: {img_err}")
-        
-        if not image_saved:
-            logger.warning(f"save_tale: Masal görseli bulunamadı veya kaydedilemedi")
-        
-        # Eğer sayfalanmış metin varsa her sayfa için ayrı resim kaydedelim
-        pages_count = 0
-        pages_with_images = 0
-        
-        if 'pages' in data and isinstance(data['pages'], list):
-            pages_count = len(data['pages'])
-            logger.info(f"save_tale: {pages_count} sayfa verisi kaydedilecek")
+        # Tüm dosyalar önce hazırlık dizinine yazılır, sonra tek bir rename ile
+        # static/tales/all/<önek>/<id>/ olur - okuyucular yarım masal görmez
+        directory = tale_store.create_staging_dir(TALES_DIR, tale_id)
+        try:
+            with stage_seconds.time(stage='store_io', target='tale_json_write'), \
+                    open(f"{directory}/{tale_store.TALE_JSON}", 'w', encoding='utf-8') as f:
+                json.dump(tale_info, f, ensure_ascii=False, indent=2)
             
-            for i, page in enumerate(data['pages']):
-                page_content = page.get('text', '')
-                page_image = page.get('image', '')
-                
+            def save_main_image(reference):
+                try:
+                    # data: URL, /images/<özet> veya uzak URL olabilir
+                    binary_data = load_image_reference(reference)
+                    # Baskı boyutu JPEG ile liste (thumb) ve okuyucu (reader) türevlerini kaydet
+                    save_image_files(binary_data, f"{directory}/image", variants=('thumb', 'reader'))
+                    logger.info("save_tale: Ana görsel kaydedildi")
+                    return True
+                except Exception as img_err:
+                    logger.error(f"save_tale: Ana görsel kaydedilirken hata: {img_err}")
+                    return False
+            
+            def save_page(i, page):
                 # Sayfa metnini kaydet
-                page_text_path = f"{directory}/{tale_id}_page_{i}.txt"
-                with open(page_text_path, 'w', encoding='utf-8') as f:
-                    f.write(page_content)
+                with open(f"{directory}/page_{i}.txt", 'w', encoding='utf-8') as f:
+                    f.write(page.get('text', ''))
                 
                 # Sayfa görselini kaydet
-                if page_image:
-                    try:
-                        page_image_path = f"{directory}/{tale_id}_page_{i}_image.jpg"
-                        
-                        if page_image.startswith('data:image/'):
-                            img_data = page_image.split(',')[1]
-                            binary_data = base64.b64decode(img_data)
-                        else:
-                            # URL ise indirip kaydedelim
-                            response = requests.get(page_image)
-                            binary_data = response.content
-                        
-                        with open(page_image_path, 'wb') as f:
-                            f.write(binary_data)
-                        
-                        pages_with_images += 1
-                    except Exception as page_img_err:
-                        logger.error(f"save_tale: Sayfa {i+1} görseli kaydedilirken hata: {page_img_err}")
+                page_image = page.get('image', '')
+                if not page_image:
+                    return False
+                try:
+                    save_image_files(load_image_reference(page_image), f"{directory}/page_{i}_image")
+                    return True
+                except Exception as page_img_err:
+                    logger.error(f"save_tale: Sayfa {i+1} görseli kaydedilirken hata: {page_img_err}")
+                    return False
+            
+            def save_audio(page_idx, audio_data):
+                try:
+                    # Base64 veri
+                    with stage_seconds.time(stage='base64_decode', target='audio'):
+                        audio_bytes = base64.b64decode(audio_data['blob'])
+                    with stage_seconds.time(stage='store_io', target='tale_audio_write'), \
+                            open(f"{directory}/page_{int(page_idx)}_audio.mp3", 'wb') as f:
+                        f.write(audio_bytes)
+                    return True
+                except Exception as audio_err:
+                    logger.error(f"save_tale: Sayfa {page_idx} ses dosyası kaydedilirken hata: {audio_err}")
+                    return False
+            
+            # Çözme, dönüştürme ve yazma işleri sınırlı bir havuzda paralel çalışır
+            main_image_future = None
+            if 'image' in data and data['image']:
+                main_image_future = save_tale_executor.submit(save_main_image, data['image'])
+            
+            pages = data['pages'] if isinstance(data.get('pages'), list) else []
+            logger.info(f"save_tale: {len(pages)} sayfa verisi kaydedilecek")
+            page_futures = [save_tale_executor.submit(save_page, i, page) for i, page in enumerate(pages)]
+            
+            audios = data['audios'] if isinstance(data.get('audios'), dict) else {}
+            audio_futures = [
+                save_tale_executor.submit(save_audio, page_idx, audio_data)
+                for page_idx, audio_data in audios.items()
+                if 'blob' in audio_data
+            ]
+            
+            # Sayfa metni yazılamazsa hata yükselir ve masal hiç kaydedilmez
+            image_saved = main_image_future.result() if main_image_future else False
+            pages_count = len(pages)
+            pages_with_images = sum(future.result() for future in page_futures)
+            audio_count = sum(future.result() for future in audio_futures)
+            
+            with stage_seconds.time(stage='store_io', target='tale_commit'):
+                tale_store.commit_staging_dir(TALES_DIR, tale_id, directory)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
         
+        if not image_saved:
+            logger.warning("save_tale: Masal görseli bulunamadı veya kaydedilemedi")
         logger.info(f"save_tale: Toplam {pages_count} sayfa kaydedildi, {pages_with_images} sayfa görsel içeriyor")
+        logger.info(f"save_tale: Toplam {audio_count} sayfa için ses dosyası kaydedildi")
         
-        # Eğer ses dosyaları varsa kaydedelim
-        audio_count = 0
-        if 'audios' in data and isinstance(data['audios'], dict):
-            for page_idx, audio_data in data['audios'].items():
-                if 'blob' in audio_data:
-                    try:
-                        # Base64 veri
-                        audio_path = f"{directory}/{tale_id}_page_{page_idx}_audio.mp3"
-                        binary_data = base64.b64decode(audio_data['blob'])
-                        with open(audio_path, 'wb') as f:
-                            f.write(binary_data)
-                        audio_count += 1
-                    except Exception as audio_err:
-                        logger.error(f"save_tale: Sayfa {page_idx} ses dosyası kaydedilirken hata: {audio_err}")
+        # Liste sorgularının diski taramaması için indeksi güncelle
+        tale_index.upsert(
+            tale_info,
+            has_image=image_saved,
+            thumb_url=tale_store.image_url(TALES_DIR, tale_store.tale_files(TALES_DIR, tale_id), 'image', 'thumb') if image_saved else None,
+            page_count=pages_count,
+            audio_count=audio_count,
+            page_image_count=pages_with_images
+        )
         
-        logger.info(f"save_tale: Toplam {audio_count} sayfa için ses dosyası kaydedildi")
         logger.info(f"save_tale: Masal başarıyla kaydedildi - ID: {tale_id}, Tür: {tale_type}, Başlık: {tale_title}")
         
         return jsonify({
@@ -501,78 +1149,15 @@ def save_tale():
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/list_tales', methods=['GET'])
+@bp.route('/list_tales', methods=['GET'])
 def list_tales():
     try:
-        tale_type = request.args.get('type', 'history')  # 'history' veya 'favorites'
+        tale_type = request.args.get('type', 'history')  # 'history', 'favorites' veya 'all'
         
         logger.info(f"list_tales: {tale_type} tipindeki masallar listeleniyor")
         
-        # Tek klasör kullan
-        directory = 'static/tales/all'
-        
-        # Klasör yoksa oluştur
-        os.makedirs(directory, exist_ok=True)
-        
-        # JSON dosyalarını bul
-        tales = []
-        json_files = glob.glob(f"{directory}/*.json")
-        
-        logger.info(f"list_tales: {len(json_files)} adet JSON dosyası bulundu")
-        
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    tale_data = json.load(f)
-                
-                # Dosya adından ID al
-                tale_id = os.path.basename(json_file).replace('.json', '')
-                
-                # Masal tipine göre filtrele - JSON içindeki type değerine göre
-                tale_data_type = tale_data.get('type', 'history')
-                if tale_type != 'all' and tale_data_type != tale_type:
-                    # İstenen tipe uymayan masalları atla
-                    continue
-                
-                # Favori ise özellikle belirt
-                is_favorite = tale_data.get('isFavorite', False) or tale_data_type == 'favorites'
-                
-                # Görsel ve ses dosyalarını kontrol et
-                image_path = f"{directory}/{tale_id}_image.jpg"
-                has_image = os.path.exists(image_path)
-                
-                # Sayfa dosyalarını say
-                page_files = glob.glob(f"{directory}/{tale_id}_page_*.txt")
-                audio_files = glob.glob(f"{directory}/{tale_id}_page_*_audio.mp3")
-                page_image_files = glob.glob(f"{directory}/{tale_id}_page_*_image.jpg")
-                
-                # Masal bilgilerini listeye ekle
-                tale_info = {
-                    'id': tale_id,
-                    'title': tale_data.get('title', 'Başlıksız Masal'),
-                    'date': tale_data.get('date', ''),
-                    'characterName': tale_data.get('characterName', ''),
-                    'characterType': tale_data.get('characterType', ''),
-                    'has_image': has_image,
-                    'image_url': image_path if has_image else None,
-                    'page_count': len(page_files),
-                    'has_audio': len(audio_files) > 0,
-                    'has_page_images': len(page_image_files) > 0,
-                    'type': tale_data_type,
-                    'isFavorite': is_favorite
-                }
-                
-                logger.debug(f"list_tales: Masal bilgileri: {tale_info}")
-                tales.append(tale_info)
-                
-            except Exception as e:
-                logger.error(f"list_tales: JSON dosyası okuma hatası ({json_file}): {e}")
-        
-        # Tarihe göre sırala (en yeni en üstte)
-        tales.sort(key=lambda x: x.get('date', ''), reverse=True)
-        
-        # En fazla 5 masal döndür
-        tales = tales[:5]
+        # En yeni 5 masalı indeksten tek sorguyla al
+        tales = tale_index.list(tale_type, limit=5)
         
         logger.info(f"list_tales: Toplam {len(tales)} adet masal listelendi")
         
@@ -583,7 +1168,7 @@ def list_tales():
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/clear_tales', methods=['POST'])
+@bp.route('/clear_tales', methods=['POST'])
 def clear_tales():
     try:
         data = request.json
@@ -591,41 +1176,28 @@ def clear_tales():
         
         logger.info(f"clear_tales: {tale_type} tipindeki masallar temizleniyor")
         
-        directory = 'static/tales/all'
+        directory = TALES_DIR
         
-        # Tek klasör olduğu için, favoriler veya geçmişe göre filtreleyerek silme yapmalıyız
         if os.path.exists(directory):
             if tale_type == 'all':
-                # Tüm dosyaları temizle
+                # Tüm masal dizinlerini ve eski düzendeki dosyaları temizle
                 try:
-                    for file in os.listdir(directory):
-                        file_path = os.path.join(directory, file)
-                        if os.path.isfile(file_path):
-                            os.unlink(file_path)
-                    logger.info(f"clear_tales: Tüm masallar silindi")
+                    for entry in os.scandir(directory):
+                        if entry.is_dir():
+                            shutil.rmtree(entry.path)
+                        else:
+                            os.unlink(entry.path)
+                    tale_index.clear()
+                    logger.info("clear_tales: Tüm masallar silindi")
                 except Exception as e:
                     logger.error(f"clear_tales: Masallar silinirken hata: {e}")
             else:
-                # Belirli tipteki masalları bul ve sil
-                json_files = glob.glob(f"{directory}/*.json")
-                for json_file in json_files:
+                # Belirli tipteki masalları indeksten bul; her biri tek bir dizin silme işlemi
+                for tale_id in tale_index.ids_by_type(tale_type):
                     try:
-                        # JSON dosyasını oku ve tipini kontrol et
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            tale_data = json.load(f)
-                        
-                        tale_data_type = tale_data.get('type', 'history')
-                        if tale_data_type == tale_type:
-                            tale_id = os.path.basename(json_file).replace('.json', '')
-                            
-                            # Bu masala ait tüm dosyaları sil
-                            for file in os.listdir(directory):
-                                if file.startswith(tale_id):
-                                    file_path = os.path.join(directory, file)
-                                    if os.path.isfile(file_path):
-                                        os.unlink(file_path)
-                            
-                            logger.info(f"clear_tales: {tale_id} ID'li {tale_type} masalı silindi")
+                        tale_store.delete_tale(directory, tale_id)
+                        tale_index.delete([tale_id])
+                        logger.info(f"clear_tales: {tale_id} ID'li {tale_type} masalı silindi")
                     except Exception as e:
                         logger.error(f"clear_tales: Masal silinirken hata: {e}")
         
@@ -636,25 +1208,29 @@ def clear_tales():
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/load_tale/<tale_id>')
+@bp.route('/load_tale/<tale_id>')
 def load_tale(tale_id):
     try:
         tale_type = request.args.get('type', 'history')  # 'history' veya 'favorites' (artık sadece bilgi amaçlı)
         
         logger.info(f"load_tale: Masal {tale_id} yükleniyor (istenen tip: {tale_type})")
         
-        # Tek klasör kullan
-        directory = 'static/tales/all'
-        
-        # JSON dosyasını oku
-        json_file = f"{directory}/{tale_id}.json"
-        
-        if not os.path.exists(json_file):
-            logger.error(f"load_tale: Masal bulunamadı - dosya yok: {json_file}")
+        # Masalın dosyaları (yeni dizin düzeni, taşınmamışsa eski düz düzen)
+        if not tale_store.is_valid_tale_id(tale_id):
+            logger.error(f"load_tale: Geçersiz masal ID'si: {tale_id}")
             return jsonify({'error': 'Masal bulunamadı'}), 404
-        
-        with open(json_file, 'r', encoding='utf-8') as f:
-            tale_data = json.load(f)
+        with stage_seconds.time(stage='store_io', target='tale_load'):
+            files = tale_store.tale_files(TALES_DIR, tale_id)
+            
+            # JSON dosyasını oku
+            json_file = files.get(tale_store.TALE_JSON)
+            
+            if not json_file:
+                logger.error(f"load_tale: Masal bulunamadı: {tale_id}")
+                return jsonify({'error': 'Masal bulunamadı'}), 404
+            
+            with open(json_file, 'r', encoding='utf-8') as f:
+                tale_data = json.load(f)
         
         logger.info(f"load_tale: Masal JSON verisi yüklendi: {tale_data.get('title', 'Başlıksız')}")
         
@@ -670,48 +1246,45 @@ def load_tale(tale_id):
         tale_data['pages'] = []
         
         # Ana görsel
-        image_path = f"{directory}/{tale_id}_image.jpg"
-        if os.path.exists(image_path):
-            tale_data['image_url'] = image_path
-            logger.info(f"load_tale: Ana görsel bulundu: {image_path}")
+        image_url = tale_store.image_url(TALES_DIR, files, 'image', 'reader')
+        if image_url:
+            tale_data['image_url'] = image_url
+            logger.info(f"load_tale: Ana görsel bulundu: {image_url}")
         else:
-            logger.warning(f"load_tale: Ana görsel bulunamadı: {image_path}")
+            logger.warning(f"load_tale: Ana görsel bulunamadı: {tale_id}")
         
         # Sayfa dosyalarını bul
-        page_files = sorted(glob.glob(f"{directory}/{tale_id}_page_*.txt"))
-        logger.info(f"load_tale: {len(page_files)} adet sayfa metni dosyası bulundu")
+        page_indexes = sorted(
+            int(match.group(1)) for match in map(tale_store.PAGE_TEXT_PATTERN.match, files) if match
+        )
+        logger.info(f"load_tale: {len(page_indexes)} adet sayfa metni dosyası bulundu")
         
-        for i, page_file in enumerate(page_files):
+        for page_idx in page_indexes:
             try:
-                page_idx = os.path.basename(page_file).replace(f'{tale_id}_page_', '').replace('.txt', '')
-                
                 # Sayfa metni
-                with open(page_file, 'r', encoding='utf-8') as f:
+                with open(files[f"page_{page_idx}.txt"], 'r', encoding='utf-8') as f:
                     page_text = f.read()
                 
                 # Sayfa görseli
-                page_image = f"{directory}/{tale_id}_page_{page_idx}_image.jpg"
-                page_image_url = None
-                if os.path.exists(page_image):
-                    page_image_url = page_image
-                    logger.debug(f"load_tale: Sayfa {page_idx} için görsel bulundu")
+                page_image_url = tale_store.image_url(TALES_DIR, files, f"page_{page_idx}_image", 'reader')
+                if page_image_url:
+                    logger.debug("load_tale: Sayfa %s için görsel bulundu", page_idx)
                 
                 # Sayfa ses dosyası
-                page_audio = f"{directory}/{tale_id}_page_{page_idx}_audio.mp3"
-                page_audio_url = None
-                if os.path.exists(page_audio):
-                    page_audio_url = page_audio
-                    logger.debug(f"load_tale: Sayfa {page_idx} için ses dosyası bulundu")
+                page_audio_url = files.get(f"page_{page_idx}_audio.mp3")
+                if page_audio_url:
+                    page_audio_url = tale_store.tale_url(TALES_DIR, page_audio_url)
+                    logger.debug("load_tale: Sayfa %s için ses dosyası bulundu", page_idx)
                 
                 # Sayfa bilgilerini ekle
                 tale_data['pages'].append({
-                    'index': int(page_idx),
+                    'index': page_idx,
                     'text': page_text,
                     'image_url': page_image_url,
                     'audio_url': page_audio_url
                 })
             except Exception as page_err:
-                logger.error(f"load_tale: Sayfa {i} yüklenirken hata: {page_err}")
+                logger.error(f"load_tale: Sayfa {page_idx} yüklenirken hata: {page_err}")
         
         # Sayfaları sırala
         tale_data['pages'].sort(key=lambda x: x['index'])
@@ -725,7 +1298,7 @@ def load_tale(tale_id):
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/generate_page_image', methods=['POST'])
+@bp.route('/generate_page_image', methods=['POST'])
 def generate_page_image():
     try:
         data = request.json
@@ -736,51 +1309,18 @@ def generate_page_image():
         page_number = data.get('page_number', 1)
         image_api = data.get('image_api', 'dalle')
         
-        # Dump the entire data for debugging
-        logger.info(f"generate_page_image - FULL DATA: {data}")
-        
         # Karakter özelliklerini al
-        character_description = ""
-        character_age = data.get('character_age', '')
-        character_gender = data.get('character_gender', '')
-        character_hair_type = data.get('character_hair_type', '')
-        character_hair_color = data.get('character_hair_color', '')
-        character_skin_color = data.get('character_skin_color', '')
-        
-        # Debug için tüm özellikleri logla
-        logger.info(f"generate_page_image - character_age: {character_age}")
-        logger.info(f"generate_page_image - character_gender: {character_gender}")
-        logger.info(f"generate_page_image - character_hair_type: {character_hair_type}")
-        logger.info(f"generate_page_image - character_hair_color: {character_hair_color}")
-        logger.info(f"generate_page_image - character_skin_color: {character_skin_color}")
-        
-        if character_age:
-            character_description += f"{character_age} yaşında, "
-        
-        if character_gender:
-            character_description += f"{character_gender}, "
-        
-        hair_parts = []
-        if character_hair_type:
-            hair_parts.append(character_hair_type)
-        if character_hair_color:
-            hair_parts.append(character_hair_color)
-        
-        if hair_parts:
-            character_description += f"{' '.join(hair_parts)} saçlı, "
-        
-        if character_skin_color:
-            character_description += f"{character_skin_color} tenli, "
-        
-        # Son virgülü ve boşluğu kaldır
-        if character_description:
-            character_description = character_description.rstrip(", ")
-            character_description = f"({character_description}) "
-        
+        character_attributes = {key: data.get(key, '') for key in PAGE_IMAGE_ATTRIBUTE_KEYS}
+
+        # İstek gövdesi yalnızca debug seviyesinde ve kırpılarak loglanır
+        logger.debug("generate_page_image - alanlar: %s, özellikler: %s", sorted(data), character_attributes)
+
+        character_description = build_character_description(character_attributes)
+
         logger.info(f"Sayfa {page_number} için görsel isteği alındı")
         
         # Görsel oluşturma promptu hazırla
-        image_prompt = f"{character_name} adlı {character_description}{character_type} karakteri {setting} ortamında: {page_text}"
+        image_prompt = build_page_image_prompt(character_name, character_description, character_type, setting, page_text)
         logger.info(f"Oluşturulan prompt: {image_prompt[:100]}...")
         # Prompt'u tamamen logla
         prompt_logger.info(f"Page {page_number} image prompt: {image_prompt}")
@@ -794,10 +1334,9 @@ def generate_page_image():
         
         logger.info(f"Sayfa {page_number} için görsel başarıyla oluşturuldu")
         
-        # Base64 verisi olarak dön
+        # Görselin adresini dön - görsel /images/<özet> üzerinden önbelleklenebilir şekilde sunulur
         return jsonify({
-            "image_data": image_data,
-            "image_url": f"data:image/jpeg;base64,{image_data}"
+            "image_url": publish_image(image_data)
         })
         
     except Exception as e:
@@ -805,14 +1344,94 @@ def generate_page_image():
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-def create_word_document(tale_text, images):
-    """Masal metni ve görsellerden Word dosyası oluşturur"""
+@bp.route('/generate_page_images', methods=['POST'])
+def generate_page_images():
+    """
+    Bir masalın tüm sayfa görsellerini tek istekte üretir.
+    
+    Aynı promptlar bir kez üretilir; görseller DALL-E hız sınırına göre sıraya
+    girer ve her biri hazır olur olmaz NDJSON satırı olarak gönderilir:
+    {"page_number": 2, "image_url": "/images/..."} veya {"page_number": 2, "error": "..."},
+    en sonda {"done": true, ...}.
+    """
     try:
-        # Word dosyası oluştur
-        doc = Document()
+        data = request.json or {}
+        pages = data.get('pages')
+        if not isinstance(pages, list) or not pages:
+            return jsonify({'error': 'Sayfa bulunamadı'}), 400
         
-        # Başlık ekle
-        doc.add_heading('Masal Dünyası', 0)
+        character_name = data.get('character_name', '')
+        character_type = data.get('character_type', '')
+        setting = data.get('setting', '')
+        image_api = data.get('image_api', 'dalle')
+        
+        # Karakter tanımı tüm sayfalar için bir kez hazırlanır
+        character_attributes = {key: data.get(key, '') for key in PAGE_IMAGE_ATTRIBUTE_KEYS}
+        character_description = build_character_description(character_attributes)
+        
+        # Aynı prompta sahip sayfalar tek görseli paylaşır
+        prompt_pages = {}
+        for page in pages:
+            image_prompt = build_page_image_prompt(
+                character_name, character_description, character_type, setting, page.get('page_text', '')
+            )
+            prompt_pages.setdefault(image_prompt, []).append(page.get('page_number'))
+        
+        logger.info(f"Toplu sayfa görseli isteği: {len(pages)} sayfa, {len(prompt_pages)} farklı prompt")
+        for image_prompt, page_numbers in prompt_pages.items():
+            prompt_logger.info(f"Pages {page_numbers} image prompt: {image_prompt}")
+    except Exception as e:
+        logger.error(f"Toplu sayfa görseli isteği hatası: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+    
+    # İstemci bağlantıyı keserse kuyrukta bekleyen üretimler de iptal edilir
+    cancel_event = threading.Event()
+    
+    def render_page_image(image_prompt):
+        image_data = generate_image_for_section(image_prompt, image_api, cancel_event=cancel_event)
+        if not image_data:
+            raise ValueError("Görsel oluşturulamadı")
+        return publish_image(image_data)
+    
+    def results():
+        # Sayfa sırasıyla gönderilir; hız sınırlayıcı kuyruğu da bu sırayla dolar
+        futures = {
+            page_image_executor.submit(render_page_image, image_prompt): image_prompt
+            for image_prompt in prompt_pages
+        }
+        failed = 0
+        try:
+            for future in as_completed(futures):
+                try:
+                    line = {"image_url": future.result()}
+                except Exception as e:
+                    logger.error(f"Sayfa görseli oluşturma hatası: {str(e)}")
+                    line = {"error": str(e)}
+                    failed += 1
+                for page_number in prompt_pages[futures[future]]:
+                    yield json.dumps({"page_number": page_number, **line}, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "pages": len(pages), "unique_prompts": len(prompt_pages), "failed": failed}) + "\n"
+        finally:
+            # İstemci bağlantıyı kestiyse bekleyen üretimleri iptal et
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+    
+    response = Response(stream_with_context(results()), mimetype='application/x-ndjson')
+    response.headers["Cache-Control"] = "no-cache"
+    # Ters vekil sunucuların (nginx) yanıtı tamponlamasını engelle
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def create_word_document(tale_text, images):
+    """Masal metni ve görsellerden bellekte Word dosyası oluşturur (BytesIO döndürür)"""
+    try:
+        # Word dosyası oluştur
+        doc = Document()
+        
+        # Başlık ekle
+        doc.add_heading('Masal Dünyası', 0)
         
         # Masal metnini ve görselleri ekle
         paragraphs = tale_text.split('\n\n')
@@ -822,31 +1441,24 @@ def create_word_document(tale_text, images):
             # Sayfaları ve görselleri yan yana ekle
             for i, paragraph_text in enumerate(paragraphs):
                 # Metni ekle
-                p = doc.add_paragraph(paragraph_text)
+                doc.add_paragraph(paragraph_text)
                 
                 # Sayfa sonuna uygun görsel varsa ekle
                 if i < len(images):
                     try:
-                        # Base64 görselini dosyaya dönüştür
-                        image_data = images[i]
-                        logger.info(f"Görsel {i+1} işleniyor - Veri uzunluğu: {len(image_data[:20])}...")
-                        
-                        image_bytes = base64.b64decode(image_data)
+                        # Görsel ham base64 veya /images/<özet> adresi olabilir
+                        image_reference = images[i]
+                        logger.info(f"Görsel {i+1} işleniyor - Referans: {image_reference[:20]}...")
                         
-                        # Geçici dosya oluştur
-                        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                            temp_path = temp_file.name
-                            temp_file.write(image_bytes)
+                        # Belge boyutunu küçük tutmak için baskı boyutu JPEG kullan
+                        image_bytes = print_image_bytes(load_image_reference(image_reference))
                         
-                        # Görseli ekle
+                        # Görseli doğrudan bellekten ekle
                         try:
-                            doc.add_picture(temp_path, width=Inches(6))
+                            doc.add_picture(io.BytesIO(image_bytes), width=Inches(6))
                             logger.info(f"Görsel {i+1} Word belgesine eklendi")
                         except Exception as img_error:
                             logger.error(f"Görsel {i+1} eklenirken hata: {str(img_error)}")
-                        
-                        # Geçici dosyayı sil
-                        os.unlink(temp_path)
                     except Exception as img_e:
                         logger.error(f"Görsel {i+1} işlenirken hata: {str(img_e)}")
                 
@@ -858,205 +1470,93 @@ def create_word_document(tale_text, images):
             doc.add_paragraph(tale_text)
             logger.info("Görsel olmadığı için sadece metin eklendi")
         
-        # Word dosyasını kaydet
-        doc_path = tempfile.mktemp(suffix='.docx')
-        doc.save(doc_path)
+        # Word dosyasını belleğe kaydet
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        buffer.seek(0)
         
-        logger.info(f"Word belgesi oluşturuldu: {doc_path}, Boyut: {os.path.getsize(doc_path)} bytes")
-        return doc_path
+        logger.info(f"Word belgesi oluşturuldu, Boyut: {buffer.getbuffer().nbytes} bytes")
+        return buffer
     except Exception as e:
         logger.error(f"Word dosyası oluşturma hatası: {e}")
         logger.error(traceback.format_exc())
         raise
 
-def create_audio(text):
-    """Metinden ses dosyası oluşturur - basitleştirilmiş, pydub gerektirmeyen sürüm"""
+def create_audio(text, lang='tr', slow=False):
+    """Metinden ses oluşturur ve MP3 verisini bellekte döndürür - geçici dosya kullanmaz"""
     try:
-        # Geçici ses dosyası oluştur
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
-            audio_path = f.name
-        
         # Metin içeriğinin uzunluğunu logla
         text_words = len(text.split())
         logger.info(f"Ses oluşturulacak metin: {text_words} kelime, {len(text)} karakter")
-        logger.debug(f"Metin başlangıcı: {text[:min(50, len(text))]}...")
+        logger.debug("Metin başlangıcı: %.50s...", text)
         
-        # Metni sese dönüştür - uzun metinler için gTTS kendi içinde parçalama yapıyor
-        tts = gTTS(text=text, lang='tr', slow=False)
+        chain, skipped = without_open_circuits('speech', speech_providers.chain())
+        if not chain:
+            if skipped:
+                raise CircuitOpenError(f"Tüm ses sağlayıcılarının devresi açık: {', '.join(provider.name for provider in skipped)}")
+            raise ValueError("Ses oluşturma için hiçbir sağlayıcı kullanılamıyor")
         
-        # Dosyaya kaydet
-        tts.save(audio_path)
+        for index, provider in enumerate(chain):
+            try:
+                with provider_guard('speech', provider), provider_call('tts', provider.name):
+                    audio_data = provider.synthesize(text, lang=lang, slow=slow)
+                break
+            except Exception as e:
+                if not record_fallback(chain, index, e, 'ses'):
+                    raise
         
-        # Dosya boyutunu kontrol et
-        file_size = os.path.getsize(audio_path)
-        logger.info(f"Ses dosyası oluşturuldu: {audio_path} (Boyut: {file_size} bytes)")
+        logger.info(f"Ses oluşturuldu (Boyut: {len(audio_data)} bytes)")
         
-        return audio_path
+        return audio_data
+    except CircuitOpenError as e:
+        logger.warning(f"Ses oluşturulamadı: {e}")
+        raise
     except Exception as e:
         logger.error(f"Ses oluşturma hatası: {e}")
         logger.error(traceback.format_exc())
         raise
 
-def generate_tale_text(character_name, character_type, setting, theme, word_limit, text_api='openai', character_attributes=None):
-    """Gemini API veya OpenAI API kullanarak masal metni oluşturur"""
-    try:
-        # Karakter bilgilerini al
-        character_description = ""
-        if character_attributes:
-            description_parts = []
-            age = character_attributes.get('character_age')
-            gender = character_attributes.get('character_gender')
-            hair_color = character_attributes.get('character_hair_color')
-            hair_type = character_attributes.get('character_hair_type')
-            skin_color = character_attributes.get('character_skin_color')
-            
-            if age:
-                description_parts.append(f"{age} yaşında")
-            if gender:
-                description_parts.append(f"{gender}")
-            if hair_color and hair_type:
-                description_parts.append(f"{hair_type} {hair_color} saçlı")
-            elif hair_color:
-                description_parts.append(f"{hair_color} saçlı")
-            elif hair_type:
-                description_parts.append(f"{hair_type} saçlı")
-            if skin_color:
-                description_parts.append(f"{skin_color} tenli")
-            
-            if description_parts:
-                character_description = f"Fiziksel özellikler: {', '.join(description_parts)}. "
-                logger.info(f"Karakter detayları: {character_description}")
-        
-        # Kelime limitini 1.4 ile çarp - daha gerçekçi sayılara ulaşmak için
-        adjusted_word_limit = int(word_limit * 1.4)
-        logger.info(f"Orijinal kelime limiti: {word_limit}, Ayarlanmış limit: {adjusted_word_limit}")
-        
-        # Kullanıcı seçimine göre API kullan
-        if text_api == 'openai' and openai_client:
-            try:
-                return generate_tale_text_with_openai(character_name, character_type, setting, theme, adjusted_word_limit, character_description)
-            except Exception as e:
-                logger.warning(f"OpenAI ile masal metni oluşturulamadı, Gemini denenecek: {str(e)}")
-                # OpenAI ile başarısız olursa Gemini'ye devam et
-        
-        # Gemini API ile devam et
-        logger.info("Gemini API ile masal metni oluşturuluyor...")
-        
-        # Desteklenen modelleri kullan
-        logger.info("Gemini modeli kullanılıyor...")
-        
-        # İlk tercih edilen model
-        try:
-            model = genai.GenerativeModel("models/gemini-2.0-flash-001")
-            logger.info("models/gemini-2.0-flash-001 modeli başarıyla yüklendi")
-        except Exception as e1:
-            logger.warning(f"models/gemini-2.0-flash-001 modeli yüklenemedi: {str(e1)}")
-            
-            # İkinci tercih edilen model
-            try:
-                model = genai.GenerativeModel("models/gemini-2.0-flash-lite-001")
-                logger.info("models/gemini-2.0-flash-lite-001 modeli başarıyla yüklendi")
-            except Exception as e2:
-                logger.warning(f"models/gemini-2.0-flash-lite-001 modeli yüklenemedi: {str(e2)}")
-                
-                # Son çare olarak bilinen çalışan modeli dene
-                try:
-                    model = genai.GenerativeModel("models/gemini-1.5-pro")
-                    logger.info("models/gemini-1.5-pro modeli başarıyla yüklendi")
-                except Exception as e3:
-                    logger.error(f"Hiçbir Gemini modeli yüklenemedi: {str(e3)}")
-                    if not openai_client:
-                        raise ValueError("Hem Gemini hem de OpenAI API kullanılamıyor. Lütfen API anahtarlarını kontrol edin.")
-                    else:
-                        # Buraya düşerse, OpenAI zaten denenmiş ve başarısız olmuş demektir
-                        raise ValueError("Metin oluşturma için hiçbir API kullanılamıyor.")
-        
-        prompt = f"""
-        GÖREV: Tam olarak {adjusted_word_limit} kelimeden oluşan bir çocuk masalı yaz.
+def build_text_character_description(character_attributes):
+    """Masal metni promptu için karakterin fiziksel özelliklerini açıklar"""
+    if not character_attributes:
+        return ""
 
-        ÖNEMLİ TALİMATLAR:
-        1. Hikaye TAM OLARAK {adjusted_word_limit} kelime içermeli
-        2. Hikaye şunları içermeli:
-           - Ana karakter: {character_name} adında bir {character_type}
-           - {character_description}
-           - Ortam: {setting}
-           - Tema: {theme}
-        3. Çocuk dostu ve eğitici olmalı (7-10 yaş)
-        4. Basit Türkçe kullan
-        5. Kelime sayımını üç kez kontrol et
-        6. Başlık EKLEME
-        7. Ne bir kelime fazla, ne bir kelime eksik olmalı
-
-        ÇOK ÖNEMLİ:
-        - Kelime sayısını metnin kendisinde belirtme (yani metinde "Bu hikaye {adjusted_word_limit} kelimedir" gibi ifadeler kullanma)
-        - Asla "Unutmayın bu masal tam olarak X kelime içeriyor" veya benzeri ifadeler ekleme
-        - Sadece masal içeriğini yaz, başka açıklama ekleme
-        """
-        
-        response = model.generate_content(prompt)
-        tale_text = response.text.strip()
-        
-        # Kelime sayısı kontrolü
-        words = tale_text.split()
-        word_count = len(words)
-        logger.info(f"Model tarafından üretilen kelime sayısı: {word_count}")
-        
-        if word_count > adjusted_word_limit * 1.2:  # %20 tolerans
-            logger.info(f"Kelime sayısı fazla, {adjusted_word_limit} kelimeye kısaltılıyor...")
-            tale_text = ' '.join(words[:adjusted_word_limit])
-        elif word_count < adjusted_word_limit * 0.8:  # Kelime sayısı %20'den fazla az ise
-            logger.warning(f"Kelime sayısı çok az ({word_count}), istenen: {adjusted_word_limit}. Yeniden deneniyor...")
-            
-            # Daha sıkı kontrollerle bir retry prompt oluşturalım
-            retry_prompt = f"""
-            GÖREV: Tam olarak {adjusted_word_limit} kelimeden oluşan bir çocuk masalı yaz.
-
-            ÖNEMLİ TALİMATLAR (DİKKATLİCE UYGULANACAK):
-            1. Hikaye TAM OLARAK {adjusted_word_limit} kelime içermeli - kelime sayacı kullanarak ÜÇ KEZ sayımı doğrula
-            2. Hikaye şunları içermeli:
-               - Ana karakter: {character_name} adında bir {character_type}
-               - {character_description}
-               - Ortam: {setting}
-               - Tema: {theme}
-            3. Çocuk dostu ve eğitici olmalı (7-10 yaş)
-            4. Basit Türkçe kullan
-            5. Başlık EKLEME
-            6. Kelime sayısını metnin içinde belirtme (yani "bu masal X kelimedir" gibi cümleler kullanma)
-            7. Masal {adjusted_word_limit} KELİMEDEN NE BİR FAZLA NE BİR EKSİK olmalı
-            8. Sadece masal metnini ver, açıklama veya not ekleme
-            9. Asla "Unutmayın bu masal tam olarak X kelime içeriyor" veya benzeri ifadeler ekleme
-            """
-            
-            try:
-                logger.info("Gemini ile yeniden deneme yapılıyor...")
-                retry_response = model.generate_content(retry_prompt)
-                retry_text = retry_response.text.strip()
-                
-                # Yeniden deneme sonucunu kontrol et
-                retry_word_count = len(retry_text.split())
-                logger.info(f"Yeniden deneme sonucu kelime sayısı: {retry_word_count}")
-                
-                if abs(retry_word_count - adjusted_word_limit) < abs(word_count - adjusted_word_limit):
-                    logger.info(f"Yeniden deneme daha iyi sonuç verdi. Önceki: {word_count}, Yeni: {retry_word_count}, Hedef: {adjusted_word_limit}")
-                    return retry_text
-                else:
-                    logger.info(f"Yeniden deneme daha iyi sonuç vermedi. Önceki: {word_count}, Yeni: {retry_word_count}, Hedef: {adjusted_word_limit}")
-            except Exception as retry_error:
-                logger.error(f"Yeniden deneme sırasında hata: {str(retry_error)}")
-                logger.debug(f"Önceki sonuç kullanılıyor (kelime sayısı: {word_count})")
-        
-        return tale_text
+    description_parts = []
+    age = character_attributes.get('character_age')
+    gender = character_attributes.get('character_gender')
+    hair_color = character_attributes.get('character_hair_color')
+    hair_type = character_attributes.get('character_hair_type')
+    skin_color = character_attributes.get('character_skin_color')
     
-    except Exception as e:
-        logger.error(f"Masal metni oluşturulurken hata: {str(e)}")
-        logger.error(traceback.format_exc())
-        return f"Masal oluşturulamadı. Hata: {str(e)}"
-        
-def generate_tale_text_with_openai(character_name, character_type, setting, theme, word_limit, character_description=""):
-    """OpenAI API kullanarak masal metni oluşturur"""
-    logger.info("OpenAI API ile masal metni oluşturuluyor...")
+    if age:
+        description_parts.append(f"{age} yaşında")
+    if gender:
+        description_parts.append(f"{gender}")
+    if hair_color and hair_type:
+        description_parts.append(f"{hair_type} {hair_color} saçlı")
+    elif hair_color:
+        description_parts.append(f"{hair_color} saçlı")
+    elif hair_type:
+        description_parts.append(f"{hair_type} saçlı")
+    if skin_color:
+        description_parts.append(f"{skin_color} tenli")
     
-    prompt = f"""
+    if not description_parts:
+        return ""
+
+    character_description = f"Fiziksel özellikler: {', '.join(description_parts)}. "
+    logger.info(f"Karakter detayları: {character_description}")
+    return character_description
+
+def adjust_word_limit(word_limit):
+    """Kelime limitini 1.4 ile çarpar - daha gerçekçi sayılara ulaşmak için"""
+    adjusted_word_limit = int(word_limit * 1.4)
+    logger.info(f"Orijinal kelime limiti: {word_limit}, Ayarlanmış limit: {adjusted_word_limit}")
+    return adjusted_word_limit
+
+def build_tale_prompt(character_name, character_type, setting, theme, word_limit, character_description=""):
+    """OpenAI ve Gemini için ortak masal promptunu oluşturur"""
+    return f"""
     GÖREV: Tam olarak {word_limit} kelimeden oluşan bir çocuk masalı yaz.
 
     ÖNEMLİ TALİMATLAR:
@@ -1077,55 +1577,267 @@ def generate_tale_text_with_openai(character_name, character_type, setting, them
     - Asla "Unutmayın bu masal tam olarak X kelime içeriyor" veya benzeri ifadeler ekleme
     - Sadece masal içeriğini yaz, başka açıklama ekleme
     """
+
+def get_gemini_text_model():
+    """Kayıt defterindeki en iyi durumdaki Gemini modelini (isim, model) olarak döndürür"""
+    best = gemini_models.get()
+    if not best:
+        if any(entry['loaded'] for entry in gemini_models.status()):
+            raise CircuitOpenError("Tüm Gemini modellerinin devresi açık")
+        logger.error("Hiçbir Gemini modeli yüklenemedi")
+        raise ValueError("Hiçbir Gemini modeli yüklenemedi")
     
+    logger.info(f"Gemini modeli kullanılıyor: {best[0]}")
+    return best
+
+def generate_with_gemini(prompt, abort=None, **kwargs):
+    """Sağlıklı Gemini modellerini tercih sırasıyla dener ve (model, yanıt) döndürür; abort kesilirse sıradaki model denenmez"""
+    candidates = gemini_models.candidates() or [get_gemini_text_model()]
+    last_error = None
+    
+    for index, (model_name, model) in enumerate(candidates):
+        if abort and abort.is_set():
+            raise RequestAborted()
+        try:
+            with gemini_models.guard(model_name), provider_call('llm_text', 'gemini'):
+                response = model.generate_content(prompt, **kwargs)
+            return model, response
+        except Exception as e:
+            last_error = e
+            logger.warning(f"{model_name} modeli yanıt veremedi, sıradaki model denenecek: {str(e)}")
+            if index + 1 < len(candidates):
+                provider_fallbacks.inc(source=model_name, target=candidates[index + 1][0])
+    
+    raise last_error
+
+def tale_text_cache_key(character_name, character_type, setting, theme, word_limit, text_api, character_attributes, provider=None):
+    """
+    Metin önbelleği anahtarını sağlayıcı ve modele göre oluşturur.
+
+    provider verilmezse isteğe ilk cevap verecek sağlayıcı (zincirin başı)
+    kullanılır; üretilen metin ise onu gerçekten üreten sağlayıcının anahtarıyla
+    yazılır, böylece yedek sağlayıcının metni birincilin anahtarına düşmez.
+    """
+    if provider is None:
+        chain = text_providers.chain(text_api)
+        provider = chain[0] if chain else None
+    provider_name, model_name = (provider.name, provider.model_name()) if provider else (None, None)
+    return TaleTextCache.make_key(provider_name, model_name, character_name, character_type, setting, theme, word_limit, character_attributes)
+
+def cache_tale_text(request, tale_text, character_name, character_type, setting, theme, word_limit, text_api, character_attributes):
+    """Üretilen metni, onu üreten sağlayıcının (request.produced_by) anahtarıyla önbelleğe yazar"""
+    if not tale_text_cache or not tale_text or request.produced_by is None:
+        return
+    cache_key = tale_text_cache_key(character_name, character_type, setting, theme, word_limit, text_api, character_attributes, provider=request.produced_by)
+    tale_text_cache.put(cache_key, tale_text)
+
+def generate_tale_text(character_name, character_type, setting, theme, word_limit, text_api='openai', character_attributes=None, raise_errors=False):
+    """
+    Gemini API veya OpenAI API kullanarak masal metni oluşturur, varsa önbelleği kullanır.
+    
+    Hata olursa hata mesajını metin olarak döndürür; raise_errors True ise
+    (ör. masal işinin aşaması başarısız sayılsın diye) istisna fırlatır.
+    """
+    if tale_text_cache:
+        cache_key = tale_text_cache_key(character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+        cached_text = tale_text_cache.get(cache_key)
+        if cached_text:
+            logger.info(f"Masal metni önbellekten alındı ({cache_key[:12]})")
+            return cached_text
+    
+    request = build_text_request(character_name, character_type, setting, theme, word_limit, character_attributes)
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",  # Daha yeni ve gelişmiş bir model kullan
-            messages=[
-                {"role": "system", "content": "Sen çocuklar için masal yazan bir yazarsın. Eğitici, eğlenceli ve çocuk dostu masallar yazarsın."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=min(4000, word_limit * 10),  # Kelime başına daha fazla token verelim ama limit koyalım
-            temperature=0.7,
-            presence_penalty=0.1,  # Tekrarları önlemek için hafif bir presence penalty ekleyelim
-            frequency_penalty=0.1  # Tekrarları önlemek için hafif bir frequency penalty ekleyelim
-        )
-        
-        tale_text = response.choices[0].message.content.strip()
-        
-        # Kelime sayısı kontrolü
-        words = tale_text.split()
-        word_count = len(words)
-        logger.info(f"OpenAI tarafından üretilen kelime sayısı: {word_count}")
+        tale_text = generate_tale_text_uncached(request, text_api)
+    except CircuitOpenError as e:
+        logger.warning(f"Masal metni oluşturulamadı: {str(e)}")
+        if raise_errors:
+            raise
+        return f"Masal oluşturulamadı. Hata: {str(e)}"
+    except Exception as e:
+        logger.error(f"Masal metni oluşturulurken hata: {str(e)}")
+        logger.error(traceback.format_exc())
+        if raise_errors:
+            raise
+        return f"Masal oluşturulamadı. Hata: {str(e)}"
+    
+    cache_tale_text(request, tale_text, character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+    return tale_text
+
+def build_text_request(character_name, character_type, setting, theme, word_limit, character_attributes=None):
+    """Metin sağlayıcılarına gönderilecek isteği hazırlar"""
+    # Karakter bilgilerini al
+    character_description = build_text_character_description(character_attributes)
+    
+    # Kelime limitini 1.4 ile çarp - daha gerçekçi sayılara ulaşmak için
+    adjusted_word_limit = adjust_word_limit(word_limit)
+    
+    prompt = build_tale_prompt(character_name, character_type, setting, theme, adjusted_word_limit, character_description)
+    return TextRequest(prompt, character_name, character_type, setting, theme, adjusted_word_limit, character_description)
+
+def provider_breaker(kind, provider):
+    """Sağlayıcının devre kesicisi (ör. text:openai, image:dalle)"""
+    return circuit_breakers.get(f"{kind}:{provider.name}")
+
+def provider_guard(kind, provider):
+    """Sağlayıcı çağrısını devre kesiciden geçirir; yarıştırılan sağlayıcılar kendi içinde korunur"""
+    if isinstance(provider, HedgedTextProvider):
+        return contextlib.nullcontext()
+    return provider_breaker(kind, provider).guard()
+
+def without_open_circuits(kind, chain):
+    """Devresi açık sağlayıcıları zincirden çıkarır; (kalanlar, atlananlar) döndürür"""
+    ready, skipped = [], []
+    for provider in chain:
+        (ready if provider_breaker(kind, provider).ready() else skipped).append(provider)
+    for provider in skipped:
+        circuit_short_circuits.inc(breaker=f"{kind}:{provider.name}")
+    return ready, skipped
+
+def text_provider_chain(text_api):
+    """Kullanıcının seçtiği metin sağlayıcısı önce, diğer kullanılabilir sağlayıcılar yedek olarak"""
+    chain = text_providers.chain(text_api)
+    if not chain:
+        raise ValueError("Metin oluşturma için hiçbir API kullanılamıyor. Lütfen API anahtarlarını kontrol edin.")
+    chain, skipped = without_open_circuits('text', chain)
+    if not chain:
+        raise CircuitOpenError(f"Tüm metin sağlayıcılarının devresi açık: {', '.join(provider.name for provider in skipped)}")
+    # Hedging açıksa ilk iki sağlayıcı yarıştırılır
+    return text_hedger.apply(chain)
+
+def record_fallback(chain, index, error, what):
+    """Sağlayıcı hatasını loglar; sırada başka sağlayıcı varsa geçişi sayar ve True döndürür"""
+    provider = chain[index]
+    if index + 1 < len(chain):
+        logger.warning(f"{provider.name} ile {what} oluşturulamadı, {chain[index + 1].name} denenecek: {str(error)}")
+        provider_fallbacks.inc(source=provider.name, target=chain[index + 1].name)
+        return True
+    logger.error(f"{provider.name} ile {what} oluşturulamadı: {str(error)}")
+    return False
+
+def generate_tale_text_uncached(request, text_api='openai'):
+    """
+    Seçilen metin sağlayıcısıyla masal metni oluşturur; başarısız olursa sıradakini dener, hepsi başarısız olursa istisna fırlatır.
+
+    Metni üreten sağlayıcı request.produced_by'a yazılır.
+    """
+    chain = text_provider_chain(text_api)
+    
+    for index, provider in enumerate(chain):
+        request.produced_by = None
+        try:
+            with provider_guard('text', provider), provider_call('text', provider.name):
+                tale_text = provider.generate(request)
+            # Yarıştırılan sağlayıcı kazananı kendisi yazar
+            request.produced_by = request.produced_by or provider
+            return tale_text
+        except Exception as e:
+            if not record_fallback(chain, index, e, 'masal metni'):
+                raise
+
+def correct_gemini_word_count(model, tale_text, character_name, character_type, setting, theme, adjusted_word_limit, character_description=""):
+    """Gemini metninin kelime sayısını kontrol eder; fazlaysa kısaltır, azsa yeniden dener"""
+    # Kelime sayısı kontrolü
+    words = tale_text.split()
+    word_count = len(words)
+    logger.info(f"Model tarafından üretilen kelime sayısı: {word_count}")
+    
+    if word_count > adjusted_word_limit * 1.2:  # %20 tolerans
+        logger.info(f"Kelime sayısı fazla, {adjusted_word_limit} kelimeye kısaltılıyor...")
+        tale_text = ' '.join(words[:adjusted_word_limit])
+    elif word_count < adjusted_word_limit * 0.8:  # Kelime sayısı %20'den fazla az ise
+        logger.warning(f"Kelime sayısı çok az ({word_count}), istenen: {adjusted_word_limit}. Yeniden deneniyor...")
+        
+        # Daha sıkı kontrollerle bir retry prompt oluşturalım
+        retry_prompt = f"""
+        GÖREV: Tam olarak {adjusted_word_limit} kelimeden oluşan bir çocuk masalı yaz.
+
+        ÖNEMLİ TALİMATLAR (DİKKATLİCE UYGULANACAK):
+        1. Hikaye TAM OLARAK {adjusted_word_limit} kelime içermeli - kelime sayacı kullanarak ÜÇ KEZ sayımı doğrula
+        2. Hikaye şunları içermeli:
+           - Ana karakter: {character_name} adında bir {character_type}
+           - {character_description}
+           - Ortam: {setting}
+           - Tema: {theme}
+        3. Çocuk dostu ve eğitici olmalı (7-10 yaş)
+        4. Basit Türkçe kullan
+        5. Başlık EKLEME
+        6. Kelime sayısını metnin içinde belirtme (yani "bu masal X kelimedir" gibi cümleler kullanma)
+        7. Masal {adjusted_word_limit} KELİMEDEN NE BİR FAZLA NE BİR EKSİK olmalı
+        8. Sadece masal metnini ver, açıklama veya not ekleme
+        9. Asla "Unutmayın bu masal tam olarak X kelime içeriyor" veya benzeri ifadeler ekleme
+        """
         
-        if word_count > word_limit * 1.2:  # %20 tolerans
-            logger.info(f"Kelime sayısı fazla, {word_limit} kelimeye kısaltılıyor...")
-            tale_text = ' '.join(words[:word_limit])
-        elif word_count < word_limit * 0.8:  # Kelime sayısı %20'den fazla az ise
-            logger.warning(f"Kelime sayısı çok az ({word_count}), istenen: {word_limit}. Yeniden deneniyor...")
-            
-            # Yeni bir prompt oluştur ve daha net şekilde kelime sayısını vurgula
-            retry_prompt = f"""
-            GÖREV: Tam olarak {word_limit} kelimeden oluşan bir çocuk masalı yaz.
-
-            ÖNEMLİ TALİMATLAR (DİKKATLİCE UYGULANACAK):
-            1. Hikaye TAM OLARAK {word_limit} kelime içermeli - kelime sayacı kullanarak ÜÇ KEZ sayımı doğrula
-            2. Hikaye şunları içermeli:
-               - Ana karakter: {character_name} adında bir {character_type}
-               - Ortam: {setting}
-               - Tema: {theme}
-            3. Çocuk dostu ve eğitici olmalı (7-10 yaş)
-            4. Basit Türkçe kullan
-            5. Başlık EKLEME
-            6. Kelime sayısını metnin içinde belirtme (yani "bu masal X kelimedir" gibi cümleler kullanma)
-            7. Masal {word_limit} KELİMEDEN NE BİR FAZLA NE BİR EKSİK olmalı
-            8. "Unutmayın bu masal tam olarak X kelime içeriyor" gibi ifadeler asla kullanma
+        try:
+            logger.info("Gemini ile yeniden deneme yapılıyor...")
+            with provider_call('word_count_retry', 'gemini'):
+                retry_response = model.generate_content(retry_prompt)
+            retry_text = retry_response.text.strip()
             
-            ÇOK ÖNEMLİ: Sadece masal metnini gönder. Başlık, açıklama veya kelime sayısı bildirimi ekleme.
-            """
+            # Yeniden deneme sonucunu kontrol et
+            retry_word_count = len(retry_text.split())
+            logger.info(f"Yeniden deneme sonucu kelime sayısı: {retry_word_count}")
             
-            try:
-                # Yeniden deneme - Daha iyi bir model kullan
+            if abs(retry_word_count - adjusted_word_limit) < abs(word_count - adjusted_word_limit):
+                logger.info(f"Yeniden deneme daha iyi sonuç verdi. Önceki: {word_count}, Yeni: {retry_word_count}, Hedef: {adjusted_word_limit}")
+                return retry_text
+            else:
+                logger.info(f"Yeniden deneme daha iyi sonuç vermedi. Önceki: {word_count}, Yeni: {retry_word_count}, Hedef: {adjusted_word_limit}")
+        except Exception as retry_error:
+            logger.error(f"Yeniden deneme sırasında hata: {str(retry_error)}")
+            logger.debug("Önceki sonuç kullanılıyor (kelime sayısı: %d)", word_count)
+    
+    return tale_text
+
+def openai_tale_request(prompt, word_limit):
+    """Masal metni için OpenAI chat completion parametrelerini döndürür"""
+    return dict(
+        model=OPENAI_TEXT_MODEL,
+        messages=[
+            {"role": "system", "content": "Sen çocuklar için masal yazan bir yazarsın. Eğitici, eğlenceli ve çocuk dostu masallar yazarsın."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=min(4000, word_limit * 10),  # Kelime başına daha fazla token verelim ama limit koyalım
+        temperature=0.7,
+        presence_penalty=0.1,  # Tekrarları önlemek için hafif bir presence penalty ekleyelim
+        frequency_penalty=0.1  # Tekrarları önlemek için hafif bir frequency penalty ekleyelim
+    )
+
+def correct_openai_word_count(tale_text, character_name, character_type, setting, theme, word_limit):
+    """OpenAI metninin kelime sayısını kontrol eder; fazlaysa kısaltır, azsa daha güçlü modelle yeniden dener"""
+    # Kelime sayısı kontrolü
+    words = tale_text.split()
+    word_count = len(words)
+    logger.info(f"OpenAI tarafından üretilen kelime sayısı: {word_count}")
+    
+    if word_count > word_limit * 1.2:  # %20 tolerans
+        logger.info(f"Kelime sayısı fazla, {word_limit} kelimeye kısaltılıyor...")
+        tale_text = ' '.join(words[:word_limit])
+    elif word_count < word_limit * 0.8:  # Kelime sayısı %20'den fazla az ise
+        logger.warning(f"Kelime sayısı çok az ({word_count}), istenen: {word_limit}. Yeniden deneniyor...")
+        
+        # Yeni bir prompt oluştur ve daha net şekilde kelime sayısını vurgula
+        retry_prompt = f"""
+        GÖREV: Tam olarak {word_limit} kelimeden oluşan bir çocuk masalı yaz.
+
+        ÖNEMLİ TALİMATLAR (DİKKATLİCE UYGULANACAK):
+        1. Hikaye TAM OLARAK {word_limit} kelime içermeli - kelime sayacı kullanarak ÜÇ KEZ sayımı doğrula
+        2. Hikaye şunları içermeli:
+           - Ana karakter: {character_name} adında bir {character_type}
+           - Ortam: {setting}
+           - Tema: {theme}
+        3. Çocuk dostu ve eğitici olmalı (7-10 yaş)
+        4. Basit Türkçe kullan
+        5. Başlık EKLEME
+        6. Kelime sayısını metnin içinde belirtme (yani "bu masal X kelimedir" gibi cümleler kullanma)
+        7. Masal {word_limit} KELİMEDEN NE BİR FAZLA NE BİR EKSİK olmalı
+        8. "Unutmayın bu masal tam olarak X kelime içeriyor" gibi ifadeler asla kullanma
+        
+        ÇOK ÖNEMLİ: Sadece masal metnini gönder. Başlık, açıklama veya kelime sayısı bildirimi ekleme.
+        """
+        
+        try:
+            # Yeniden deneme - Daha iyi bir model kullan
+            with provider_call('word_count_retry', 'openai'):
                 retry_response = openai_client.chat.completions.create(
                     model="gpt-4-turbo-2024-04-09",  # İlk deneme başarısız olursa daha güçlü modele geç
                     messages=[
@@ -1137,33 +1849,75 @@ def generate_tale_text_with_openai(character_name, character_type, setting, them
                     presence_penalty=0.2,
                     frequency_penalty=0.2
                 )
-                
-                # Yeni yanıtı kontrol et
-                retry_text = retry_response.choices[0].message.content.strip()
-                retry_words = retry_text.split()
-                retry_count = len(retry_words)
-                
-                logger.info(f"Yeniden deneme sonucu kelime sayısı: {retry_count}")
-                
-                # Eğer yeni deneme daha iyi sonuç verdiyse, onu kullan
-                if abs(retry_count - word_limit) < abs(word_count - word_limit):
-                    logger.info(f"Yeniden deneme daha iyi sonuç verdi, bu metin kullanılacak")
-                    tale_text = retry_text
-                    # Kelime sınırı kontrolü hala gerekli olabilir
-                    if retry_count > word_limit * 1.2:
-                        tale_text = ' '.join(retry_words[:word_limit])
-                else:
-                    logger.info(f"İlk deneme daha iyi sonuç verdi, orijinal metin kullanılacak")
-            except Exception as retry_e:
-                logger.error(f"Yeniden deneme sırasında hata: {str(retry_e)}")
-                # Hata durumunda orijinal metni kullan
-        
-        return tale_text
-        
-    except Exception as e:
-        logger.error(f"OpenAI ile masal metni oluşturulurken hata: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise
+            
+            # Yeni yanıtı kontrol et
+            retry_text = retry_response.choices[0].message.content.strip()
+            retry_words = retry_text.split()
+            retry_count = len(retry_words)
+            
+            logger.info(f"Yeniden deneme sonucu kelime sayısı: {retry_count}")
+            
+            # Eğer yeni deneme daha iyi sonuç verdiyse, onu kullan
+            if abs(retry_count - word_limit) < abs(word_count - word_limit):
+                logger.info("Yeniden deneme daha iyi sonuç verdi, bu metin kullanılacak")
+                tale_text = retry_text
+                # Kelime sınırı kontrolü hala gerekli olabilir
+                if retry_count > word_limit * 1.2:
+                    tale_text = ' '.join(retry_words[:word_limit])
+            else:
+                logger.info("İlk deneme daha iyi sonuç verdi, orijinal metin kullanılacak")
+        except Exception as retry_e:
+            logger.error(f"Yeniden deneme sırasında hata: {str(retry_e)}")
+            # Hata durumunda orijinal metni kullan
+    
+    return tale_text
+
+def stream_tale_text(character_name, character_type, setting, theme, word_limit, text_api='openai', character_attributes=None):
+    """
+    Masal metnini parça parça üretir.
+
+    ('delta', metin) olaylarını model ürettikçe, ('reset', None) olayını
+    bir sağlayıcının akışı yarıda kesilip sıradakine geçildiğinde ve son olarak
+    kelime sayısı düzeltilmiş metinle ('final', metin) olayını üretir.
+    Önbellekte hazır masal varsa tek parça halinde hemen gönderilir.
+    """
+    if tale_text_cache:
+        cache_key = tale_text_cache_key(character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+        cached_text = tale_text_cache.get(cache_key)
+        if cached_text:
+            logger.info(f"Masal metni önbellekten alındı ({cache_key[:12]})")
+            yield 'delta', cached_text
+            yield 'final', cached_text
+            return
+    
+    request = build_text_request(character_name, character_type, setting, theme, word_limit, character_attributes)
+    for event, text in stream_tale_text_uncached(request, text_api):
+        if event == 'final':
+            cache_tale_text(request, text, character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+        yield event, text
+
+def stream_tale_text_uncached(request, text_api='openai'):
+    """Masal metnini önbelleğe bakmadan sağlayıcıdan akış olarak üretir; metni üreten sağlayıcı request.produced_by'a yazılır"""
+    chain = text_provider_chain(text_api)
+    
+    for index, provider in enumerate(chain):
+        started = False
+        request.produced_by = None
+        try:
+            # Süre son parçaya kadar ölçülür (istemcinin beklediği süre dahil)
+            with provider_guard('text', provider), provider_call('text', provider.name):
+                for event, text in provider.stream(request):
+                    started = started or event == 'delta'
+                    if event == 'final':
+                        request.produced_by = request.produced_by or provider
+                    yield event, text
+            return
+        except Exception as e:
+            if not record_fallback(chain, index, e, 'masal metni'):
+                raise
+            if started:
+                # İstemci şimdiye kadar gelen parçaları silmeli
+                yield 'reset', None
 
 def split_text_into_sections(text, words_per_section):
     """Metni belirli kelime sayısına göre bölümlere ayırır"""
@@ -1176,111 +1930,191 @@ def split_text_into_sections(text, words_per_section):
     
     return sections
 
-def generate_image_for_section(section_text, image_api='dalle'):
-    """Bölüm metni için görsel oluşturur"""
+def image_provider_chain(image_api):
+    """
+    Kullanıcının seçtiği görsel sağlayıcısı önce, diğer kullanılabilir sağlayıcılar
+    yedek olarak; devresi açık olanlar atlanır. (zincir, atlananlar) döndürür.
+    """
+    chain, skipped = without_open_circuits('image', image_providers.chain(image_api))
+    if not chain:
+        logger.error("Hiçbir görsel sağlayıcısı kullanılamıyor")
+    return chain, skipped
+
+def count_placeholder(provider, reason):
+    """Placeholder görsele düşüldüyse nedenini sayar"""
+    if provider.name == PlaceholderImageProvider.name:
+        placeholder_images.inc(reason=reason or 'no_provider')
+
+def generate_image_for_section(section_text, image_api='dalle', priority='normal', cancel_event=None):
+    """
+    Bölüm metni için görsel oluşturur ve görsel baytlarını döndürür.
+    
+    Seçilen sağlayıcı başarısız olursa sıradaki denenir (varsayılan sırada en
+    sonda placeholder vardır); hiçbiri görsel üretemezse None döner.
+    """
+    chain, skipped = image_provider_chain(image_api)
+    reason = f"{skipped[0].name}_circuit_open" if skipped else None
+    for index, provider in enumerate(chain):
+        try:
+            with provider_guard('image', provider), provider_call('image', provider.name):
+                image_data = provider.generate(section_text, priority=priority, cancel_event=cancel_event)
+        except ImageRequestCancelled:
+            raise
+        except Exception as e:
+            reason = reason or f"{provider.name}_error"
+            record_fallback(chain, index, e, 'görsel')
+            continue
+        count_placeholder(provider, reason)
+        return image_data
+    return None
+
+class ImageRequestCancelled(Exception):
+    """Görsel isteği, sonucu artık beklenmediği için DALL-E'ye gitmeden iptal edildi"""
+
+def wait_for_dalle_flight(flight, label, cancel_event=None):
+    """Aynı görsel için süren DALL-E çağrısını bekler; o çağrı başarısız olduysa None döndürür"""
+    while True:
+        try:
+            error = flight.exception(timeout=0.5)
+        except TimeoutError:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImageRequestCancelled(f"DALL-E{label} isteği süren aynı isteği beklerken iptal edildi")
+            continue
+        if error is not None:
+            return None
+        logger.info(f"DALL-E{label} görseli süren aynı istekten alındı")
+        return flight.result()
+
+async def wait_for_dalle_flight_async(flight, label, cancel_event=None):
+    """wait_for_dalle_flight'ın async karşılığı; bekleyen iptal edilirse paylaşılan çağrı sürer"""
+    waiter = asyncio.shield(asyncio.wrap_future(flight))
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=0.5)
+        if done:
+            break
+        if cancel_event is not None and cancel_event.is_set():
+            waiter.cancel()
+            raise ImageRequestCancelled(f"DALL-E{label} isteği süren aynı isteği beklerken iptal edildi")
+    if waiter.exception() is not None:
+        return None
+    logger.info(f"DALL-E{label} görseli süren aynı istekten alındı")
+    return waiter.result()
+
+def request_dalle_image(prompt, style, priority='normal', label="", cancel_event=None):
+    """
+    Önbellekte yoksa DALL-E'den görsel ister ve ham görsel baytlarını döndürür.
+    
+    Aynı görsel için DALL-E çağrısı sürüyorsa (ör. ön plan isteği ile toplu
+    üretim veya iki sekme) yeni çağrı yapılmaz, süren çağrının sonucu beklenir.
+    """
+    cache_key = ImageCache.make_key(DALLE_MODEL, DALLE_SIZE, style, DALLE_QUALITY, prompt)
+    cached_image = image_cache.get(cache_key)
+    if cached_image is not None:
+        logger.info(f"DALL-E{label} görseli önbellekten alındı ({cache_key[:12]})")
+        return cached_image
+    
+    # Süren aynı çağrıya kuyrukta sıra beklemeden katıl
+    flight = dalle_flights.get(cache_key)
+    if flight is not None:
+        image_data = wait_for_dalle_flight(flight, label, cancel_event)
+        if image_data is not None:
+            return image_data
+    
+    # Paylaşılan hız sınırlayıcıdan sıra al (tüm worker süreçleri aynı kotayı kullanır)
+    if not dalle_rate_limiter.acquire(priority=priority, timeout=dalle_queue_timeout, cancel_event=cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ImageRequestCancelled(f"DALL-E{label} isteği kuyrukta iptal edildi")
+        raise TimeoutError("DALL-E kuyruğunda bekleme süresi aşıldı")
+    if cancel_event is not None and cancel_event.is_set():
+        raise ImageRequestCancelled(f"DALL-E{label} isteği gönderilmeden iptal edildi")
+    
+    # Kuyrukta beklerken başka bir istek aynı görseli üretmiş olabilir
+    if image_cache.contains(cache_key):
+        cached_image = image_cache.get(cache_key)
+        if cached_image is not None:
+            logger.info(f"DALL-E{label} görseli kuyrukta beklerken önbelleğe girdi ({cache_key[:12]})")
+            return cached_image
+    
+    flight, leader = dalle_flights.begin(cache_key)
+    if not leader:
+        image_data = wait_for_dalle_flight(flight, label, cancel_event)
+        if image_data is not None:
+            return image_data
+        # Paylaşılan çağrı başarısız oldu veya iptal edildi; kendi sıramızla dene
+        return call_dalle(prompt, style, cache_key, label)
     try:
-        # Sadece DALL-E kullan, OpenAI API anahtarı kontrol et
-        if openai_client:
-            logger.info("DALL-E API kullanılıyor...")
-            return generate_image_with_dalle(section_text)
-        else:
-            logger.warning("OpenAI API anahtarı yok, placeholder görüntü oluşturuluyor...")
-            return create_placeholder_image(section_text)
-    except Exception as e:
-        logger.error(f"Görsel oluşturma hatası: {e}")
-        logger.error(traceback.format_exc())
-        # Hata durumunda placeholder görüntü oluştur
-        return create_placeholder_image(section_text)
+        image_data = call_dalle(prompt, style, cache_key, label)
+    except BaseException as e:
+        dalle_flights.finish(cache_key, flight, error=e)
+        raise
+    dalle_flights.finish(cache_key, flight, image_data)
+    return image_data
+
+def call_dalle(prompt, style, cache_key, label=""):
+    """DALL-E'yi çağırır, görseli önbelleğe indirir ve baytlarını döndürür"""
+    with provider_call('dalle', 'openai'):
+        response = openai_client.images.generate(
+            model=DALLE_MODEL,
+            prompt=prompt,
+            size=DALLE_SIZE,
+            quality=DALLE_QUALITY,
+            n=1,
+            style=style  # "vivid" veya "natural" olabilir
+        )
+    
+    # Check for revised prompt
+    if hasattr(response.data[0], 'revised_prompt'):
+        logger.info(f"DALL-E{label} revised prompt: {response.data[0].revised_prompt[:100]}...")
+        prompt_logger.info(f"DALL-E{label} revised prompt: {response.data[0].revised_prompt}")
+    
+    image_url = response.data[0].url
+    logger.info(f"DALL-E{label} görsel URL'si oluşturuldu: {image_url[:50]}...")
+    
+    # Resmi doğrudan önbellek dosyasına indir (paylaşılan bağlantı havuzu, süre ve boyut sınırlı)
+    with provider_call('image_download', 'dalle_cdn'):
+        image_path = image_cache.put_from(cache_key, lambda path: http_fetcher.fetch_to_file(image_url, path))
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+# İçerik politikasına takılan promptlar yerine kullanılan genel ve güvenli prompt
+DALLE_SAFE_PROMPT = "Çocuk dostu, renkli, çizgi film tarzında: Güzel bir orman manzarası, ağaçlar ve çiçekler"
 
-def generate_image_with_dalle(prompt):
-    """OpenAI DALL-E API kullanarak görsel oluşturur"""
+def dalle_enhanced_prompt(prompt):
+    """Prompt'u çocuk dostu hale getirir ve görselde yazı olmamasını ister"""
+    return f"Turkish children's book style illustration with NO TEXT. Create a colorful, cartoon-style image with ABSOLUTELY NO words, text, or speech bubbles. The image must NOT contain any letters, alphabet characters, or written text: {prompt}"
+
+def generate_image_with_dalle(prompt, priority='normal', cancel_event=None):
+    """OpenAI DALL-E API kullanarak görsel oluşturur ve görsel baytlarını döndürür; yeniden denemeler de başarısız olursa istisna fırlatır"""
     try:
         # Prompt'u çocuk dostu hale getir ve yazı içermemesini sağla
-        enhanced_prompt = f"Turkish children's book style illustration with NO TEXT. Create a colorful, cartoon-style image with ABSOLUTELY NO words, text, or speech bubbles. The image must NOT contain any letters, alphabet characters, or written text: {prompt}"
+        enhanced_prompt = dalle_enhanced_prompt(prompt)
         logger.info(f"DALL-E prompt: {enhanced_prompt[:100]}...")
         # Prompt'u tamamen logla
         prompt_logger.info(f"DALL-E prompt: {enhanced_prompt}")
         
-        # Rate limit kontrolü için basit hız sınırlama
-        # En son DALL-E API çağrısı zamanını kontrol et
-        current_time = time.time()
-        if hasattr(generate_image_with_dalle, 'last_call_time'):
-            time_since_last_call = current_time - generate_image_with_dalle.last_call_time
-            # DALL-E'nin rate limiti dakikada 5 istek olduğu için en az 12 saniye bekleyelim
-            if time_since_last_call < 12:  # Saniye cinsinden bekleme süresi
-                wait_time = 12 - time_since_last_call
-                logger.info(f"DALL-E rate limit koruması: {wait_time:.2f} saniye bekleniyor...")
-                time.sleep(wait_time)
-        
-        # Bu çağrı zamanını kaydet
-        generate_image_with_dalle.last_call_time = time.time()
-        
-        response = openai_client.images.generate(
-            model="dall-e-3",
-            prompt=enhanced_prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1,
-            style="natural"  # "vivid" veya "natural" olabilir
-        )
-        
-        # Check for revised prompt
-        if hasattr(response.data[0], 'revised_prompt'):
-            logger.info(f"DALL-E revised prompt: {response.data[0].revised_prompt[:100]}...")
-            prompt_logger.info(f"DALL-E revised prompt: {response.data[0].revised_prompt}")
-        
-        image_url = response.data[0].url
-        logger.info(f"DALL-E görsel URL'si oluşturuldu: {image_url[:50]}...")
-        
-        # Resmi indir
-        image_response = requests.get(image_url)
-        image_data = image_response.content
-        
-        # Base64 formatına dönüştür
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        logger.info("DALL-E görsel başarıyla oluşturuldu ve Base64 formatına dönüştürüldü.")
-        return base64_image
+        image_data = request_dalle_image(enhanced_prompt, style="natural", priority=priority, cancel_event=cancel_event)
+        logger.info("DALL-E görsel başarıyla oluşturuldu.")
+        return image_data
     
+    except ImageRequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"OpenAI ile görsel oluşturma hatası: {e}")
         logger.error(traceback.format_exc())
         
-        # Farklı hata türlerine göre işlem yap
+        # Farklı hata türlerine göre işlem yap (istemci kullanıldığı için SDK zaten yüklü)
+        import openai
         if isinstance(e, openai.RateLimitError):
             try:
-                # Rate limit hatası - daha uzun süre bekle ve yeniden dene
-                wait_time = 30  # Rate limit için 30 saniye bekle 
-                logger.info(f"DALL-E rate limit hatası, {wait_time} saniye bekleniyor ve yeniden deneniyor...")
-                time.sleep(wait_time)
+                # Rate limit hatası - kovayı 30 saniye boşalt, diğer worker'lar da beklesin
+                wait_time = 30
+                logger.info(f"DALL-E rate limit hatası, {wait_time} saniyelik ceza sonrası öncelikli olarak yeniden deneniyor...")
+                dalle_rate_limiter.penalize(wait_time)
                 
-                # Yeniden dene
-                generate_image_with_dalle.last_call_time = time.time()  # Son çağrı zamanını güncelle
-                
-                response = openai_client.images.generate(
-                    model="dall-e-3",
-                    prompt=enhanced_prompt,
-                    size="1024x1024",
-                    quality="standard",
-                    n=1,
-                    style="natural"
-                )
-                
-                # Check for revised prompt
-                if hasattr(response.data[0], 'revised_prompt'):
-                    logger.info(f"DALL-E retry revised prompt: {response.data[0].revised_prompt[:100]}...")
-                    prompt_logger.info(f"DALL-E retry revised prompt: {response.data[0].revised_prompt}")
-                
-                image_url = response.data[0].url
-                logger.info(f"DALL-E görsel URL'si yeniden deneme sonrası oluşturuldu: {image_url[:50]}...")
-                
-                # Resmi indir
-                image_response = requests.get(image_url)
-                image_data = image_response.content
-                
-                # Base64 formatına dönüştür
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-                logger.info("DALL-E görsel başarıyla oluşturuldu ve Base64 formatına dönüştürüldü (yeniden deneme sonrası).")
-                return base64_image
+                # Yeniden dene - öncelikli şeritten sıra al
+                image_data = request_dalle_image(enhanced_prompt, style="natural", priority='high', label=" retry", cancel_event=cancel_event)
+                logger.info("DALL-E görsel başarıyla oluşturuldu (yeniden deneme sonrası).")
+                return image_data
                 
             except Exception as retry_error:
                 logger.error(f"DALL-E yeniden deneme hatası: {retry_error}")
@@ -1289,113 +2123,306 @@ def generate_image_with_dalle(prompt):
         elif isinstance(e, openai.BadRequestError):
             # İçerik politikası hatası veya diğer Bad Request hataları
             logger.warning(f"DALL-E içerik politikası hatası veya geçersiz istek: {str(e)}")
-            logger.info("İçerik politikası nedeniyle placeholder görüntü oluşturuluyor...")
             
             # İçerik verisi çok özel olabilir, daha genel bir prompt deneyelim
+            provider_fallbacks.inc(source='dalle', target='dalle_safe_prompt')
             try:
-                # Daha genel ve güvenli bir prompt oluştur
-                safe_prompt = "Çocuk dostu, renkli, çizgi film tarzında: Güzel bir orman manzarası, ağaçlar ve çiçekler"
-                
-                # Saniye kadar bekle - rate limit için
-                time.sleep(15)
-                
-                # Yeniden dene
-                generate_image_with_dalle.last_call_time = time.time()
-                
-                response = openai_client.images.generate(
-                    model="dall-e-3",
-                    prompt=safe_prompt,
-                    size="1024x1024",
-                    quality="standard",
-                    n=1,
-                    style="vivid"
-                )
-                
-                # Check for revised prompt
-                if hasattr(response.data[0], 'revised_prompt'):
-                    logger.info(f"DALL-E safe retry revised prompt: {response.data[0].revised_prompt[:100]}...")
-                    prompt_logger.info(f"DALL-E safe retry revised prompt: {response.data[0].revised_prompt}")
-                
-                image_url = response.data[0].url
-                logger.info(f"DALL-E güvenli prompt ile görsel URL'si oluşturuldu: {image_url[:50]}...")
-                
-                # Resmi indir
-                image_response = requests.get(image_url)
-                image_data = image_response.content
-                
-                # Base64 formatına dönüştür
-                base64_image = base64.b64encode(image_data).decode('utf-8')
+                # Yeniden dene - öncelikli şeritten sıra al (güvenli prompt genellikle önbellekten gelir)
+                image_data = request_dalle_image(DALLE_SAFE_PROMPT, style="vivid", priority='high', label=" safe retry", cancel_event=cancel_event)
                 logger.info("DALL-E görsel güvenli prompt ile oluşturuldu.")
-                return base64_image
+                return image_data
                 
             except Exception as safe_retry_error:
                 logger.error(f"Güvenli prompt ile yeniden deneme hatası: {safe_retry_error}")
         
-        # Hata durumunda placeholder görüntü oluştur
-        logger.info("DALL-E hatası nedeniyle placeholder görüntü oluşturuluyor...")
-        return create_placeholder_image(prompt)
+        # Yedek sağlayıcıya (ör. placeholder) geçilmesi için ilk hata iletilir
+        raise
 
 def generate_image_with_gemini(section_text):
-    """Gemini API kullanarak görsel oluşturur"""
+    """Gemini API kullanarak görsel oluşturur; yanıtta görsel yoksa istisna fırlatır"""
+    prompt = f"""
+    Lütfen aşağıdaki metne uygun, çocuk kitabı tarzında, renkli ve sevimli bir illüstrasyon oluştur:
+    
+    {section_text}
+    
+    İllüstrasyon 3-7 yaş arası çocuklar için uygun, canlı renkli ve detaylı olmalı.
+    Tarz olarak Disney/Pixar animasyon filmlerine benzer, sevimli karakterler içermeli.
+    Görsel yüksek çözünürlüklü ve net olmalı.
+    """
+    
+    # Kayıt defterindeki sağlıklı modellerden ilkini kullan
+    model, response = generate_with_gemini(prompt)
+    
+    # Yanıtı kontrol et ve görüntü verisini çıkar
+    for candidate in response.candidates:
+        for part in candidate.content.parts:
+            if hasattr(part, 'inline_data') and part.inline_data:
+                logger.info("Gemini görsel başarıyla oluşturuldu.")
+                return part.inline_data.data
+    
+    raise ValueError("Gemini yanıtında görsel yok")
+
+# --- Async sağlayıcı katmanı (ASYNC_PROVIDERS=1) ---
+# Aşağıdaki coroutine'ler provider_loop olay döngüsünde çalışır. Sağlayıcı
+# istekleri (AsyncOpenAI, Gemini generate_content_async, DALL-E kuyruğu)
+# beklerken iş parçacığı tutmaz; async karşılığı olmayan işler (gTTS, disk,
+# görsel dönüştürme, kelime sayısı düzeltme denemesi) asyncio.to_thread ile
+# döngünün sınırlı havuzunda çalışır.
+
+async def get_async_openai_client():
+    """Async OpenAI istemcisini döndürür; SDK ilk kez yüklenirken döngüyü bekletmez"""
+    if async_openai_client.loaded:
+        return async_openai_client.get()
+    return await asyncio.to_thread(async_openai_client.get)
+
+async def generate_with_gemini_async(prompt, **kwargs):
+    """generate_with_gemini'nin async karşılığı"""
+    # İlk çağrıda modeller oluşturulur (SDK yüklenir); döngü dışında yapılır
+    candidates = await asyncio.to_thread(gemini_models.candidates) or [get_gemini_text_model()]
+    last_error = None
+    
+    for index, (model_name, model) in enumerate(candidates):
+        try:
+            with gemini_models.guard(model_name), provider_call('llm_text', 'gemini'):
+                response = await model.generate_content_async(prompt, **kwargs)
+            return model, response
+        except Exception as e:
+            last_error = e
+            logger.warning(f"{model_name} modeli yanıt veremedi, sıradaki model denenecek: {str(e)}")
+            if index + 1 < len(candidates):
+                provider_fallbacks.inc(source=model_name, target=candidates[index + 1][0])
+    
+    raise last_error
+
+async def generate_tale_text_async(character_name, character_type, setting, theme, word_limit, text_api='openai', character_attributes=None, raise_errors=False):
+    """generate_tale_text'in async karşılığı; varsa önbelleği kullanır"""
+    if tale_text_cache:
+        cache_key = tale_text_cache_key(character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+        cached_text = tale_text_cache.get(cache_key)
+        if cached_text:
+            logger.info(f"Masal metni önbellekten alındı ({cache_key[:12]})")
+            return cached_text
+    
+    request = build_text_request(character_name, character_type, setting, theme, word_limit, character_attributes)
     try:
-        # İlk tercih edilen model
+        tale_text = await generate_tale_text_uncached_async(request, text_api)
+    except CircuitOpenError as e:
+        logger.warning(f"Masal metni oluşturulamadı: {str(e)}")
+        if raise_errors:
+            raise
+        return f"Masal oluşturulamadı. Hata: {str(e)}"
+    except Exception as e:
+        logger.error(f"Masal metni oluşturulurken hata: {str(e)}")
+        logger.error(traceback.format_exc())
+        if raise_errors:
+            raise
+        return f"Masal oluşturulamadı. Hata: {str(e)}"
+    
+    cache_tale_text(request, tale_text, character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+    return tale_text
+
+async def generate_tale_text_uncached_async(request, text_api='openai'):
+    """generate_tale_text_uncached'in async karşılığı"""
+    chain = text_provider_chain(text_api)
+    
+    for index, provider in enumerate(chain):
+        request.produced_by = None
         try:
-            model = genai.GenerativeModel("models/gemini-2.0-flash-001")
-            logger.info("Görsel için models/gemini-2.0-flash-001 modeli kullanılıyor")
-        except Exception as e1:
-            logger.warning(f"Görsel için models/gemini-2.0-flash-001 modeli yüklenemedi: {str(e1)}")
-            
-            # İkinci tercih edilen model
-            try:
-                model = genai.GenerativeModel("models/gemini-2.0-flash-lite-001")
-                logger.info("Görsel için models/gemini-2.0-flash-lite-001 modeli kullanılıyor")
-            except Exception as e2:
-                logger.warning(f"Görsel için models/gemini-2.0-flash-lite-001 modeli yüklenemedi: {str(e2)}")
-                
-                # Son çare olarak bilinen çalışan modeli dene
-                model = genai.GenerativeModel("models/gemini-1.5-pro")
-                logger.info("Görsel için models/gemini-1.5-pro modeli kullanılıyor")
-        
-        prompt = f"""
-        Lütfen aşağıdaki metne uygun, çocuk kitabı tarzında, renkli ve sevimli bir illüstrasyon oluştur:
-        
-        {section_text}
-        
-        İllüstrasyon 3-7 yaş arası çocuklar için uygun, canlı renkli ve detaylı olmalı.
-        Tarz olarak Disney/Pixar animasyon filmlerine benzer, sevimli karakterler içermeli.
-        Görsel yüksek çözünürlüklü ve net olmalı.
-        """
+            with provider_guard('text', provider), provider_call('text', provider.name):
+                tale_text = await provider.generate_async(request)
+            request.produced_by = request.produced_by or provider
+            return tale_text
+        except Exception as e:
+            if not record_fallback(chain, index, e, 'masal metni'):
+                raise
+
+async def request_dalle_image_async(prompt, style, priority='normal', label="", cancel_event=None):
+    """request_dalle_image'in async karşılığı; kuyrukta ve API yanıtında iş parçacığı tutmaz"""
+    cache_key = ImageCache.make_key(DALLE_MODEL, DALLE_SIZE, style, DALLE_QUALITY, prompt)
+    cached_image = image_cache.get(cache_key)
+    if cached_image is not None:
+        logger.info(f"DALL-E{label} görseli önbellekten alındı ({cache_key[:12]})")
+        return cached_image
+    
+    flight = dalle_flights.get(cache_key)
+    if flight is not None:
+        image_data = await wait_for_dalle_flight_async(flight, label, cancel_event)
+        if image_data is not None:
+            return image_data
+    
+    if not await dalle_rate_limiter.acquire_async(priority=priority, timeout=dalle_queue_timeout, cancel_event=cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ImageRequestCancelled(f"DALL-E{label} isteği kuyrukta iptal edildi")
+        raise TimeoutError("DALL-E kuyruğunda bekleme süresi aşıldı")
+    if cancel_event is not None and cancel_event.is_set():
+        raise ImageRequestCancelled(f"DALL-E{label} isteği gönderilmeden iptal edildi")
+    
+    # Kuyrukta beklerken başka bir istek aynı görseli üretmiş olabilir
+    if image_cache.contains(cache_key):
+        cached_image = image_cache.get(cache_key)
+        if cached_image is not None:
+            logger.info(f"DALL-E{label} görseli kuyrukta beklerken önbelleğe girdi ({cache_key[:12]})")
+            return cached_image
+    
+    flight, leader = dalle_flights.begin(cache_key)
+    if not leader:
+        image_data = await wait_for_dalle_flight_async(flight, label, cancel_event)
+        if image_data is not None:
+            return image_data
+        return await call_dalle_async(prompt, style, cache_key, label)
+    try:
+        image_data = await call_dalle_async(prompt, style, cache_key, label)
+    except BaseException as e:
+        dalle_flights.finish(cache_key, flight, error=e)
+        raise
+    dalle_flights.finish(cache_key, flight, image_data)
+    return image_data
+
+async def call_dalle_async(prompt, style, cache_key, label=""):
+    """call_dalle'nin async karşılığı"""
+    client = await get_async_openai_client()
+    with provider_call('dalle', 'openai'):
+        response = await client.images.generate(
+            model=DALLE_MODEL,
+            prompt=prompt,
+            size=DALLE_SIZE,
+            quality=DALLE_QUALITY,
+            n=1,
+            style=style
+        )
+    
+    if getattr(response.data[0], 'revised_prompt', None):
+        prompt_logger.info(f"DALL-E{label} revised prompt: {response.data[0].revised_prompt}")
+    
+    image_url = response.data[0].url
+    logger.info(f"DALL-E{label} görsel URL'si oluşturuldu: {image_url[:50]}...")
+    
+    # İndirme paylaşılan bağlantı havuzlu (eşzamanlı) indiriciyle yapılır
+    def download():
+        with provider_call('image_download', 'dalle_cdn'):
+            image_path = image_cache.put_from(cache_key, lambda path: http_fetcher.fetch_to_file(image_url, path))
+        with open(image_path, 'rb') as f:
+            return f.read()
+    
+    return await asyncio.to_thread(download)
+
+async def generate_image_with_dalle_async(prompt, priority='normal', cancel_event=None):
+    """generate_image_with_dalle'nin async karşılığı"""
+    enhanced_prompt = dalle_enhanced_prompt(prompt)
+    prompt_logger.info(f"DALL-E prompt: {enhanced_prompt}")
+    try:
+        image_data = await request_dalle_image_async(enhanced_prompt, style="natural", priority=priority, cancel_event=cancel_event)
+        logger.info("DALL-E görsel başarıyla oluşturuldu (async).")
+        return image_data
+    except ImageRequestCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"OpenAI ile görsel oluşturma hatası: {e}")
+        logger.error(traceback.format_exc())
         
-        response = model.generate_content(prompt)
+        import openai
+        retry = None
+        if isinstance(e, openai.RateLimitError):
+            logger.info("DALL-E rate limit hatası, 30 saniyelik ceza sonrası öncelikli olarak yeniden deneniyor...")
+            dalle_rate_limiter.penalize(30)
+            retry = (enhanced_prompt, "natural", " retry")
+        elif isinstance(e, openai.BadRequestError):
+            logger.warning(f"DALL-E içerik politikası hatası veya geçersiz istek: {str(e)}")
+            retry = (DALLE_SAFE_PROMPT, "vivid", " safe retry")
+            provider_fallbacks.inc(source='dalle', target='dalle_safe_prompt')
         
-        # Yanıtı kontrol et ve görüntü verisini çıkar
-        for candidate in response.candidates:
-            for part in candidate.content.parts:
-                if hasattr(part, 'inline_data') and part.inline_data:
-                    # Base64 kodlu görüntüyü döndür
-                    logger.info("Gemini görsel başarıyla oluşturuldu.")
-                    return part.inline_data.data
+        if retry:
+            try:
+                return await request_dalle_image_async(retry[0], style=retry[1], priority='high', label=retry[2], cancel_event=cancel_event)
+            except Exception as retry_error:
+                logger.error(f"DALL-E yeniden deneme hatası: {retry_error}")
         
-        # Eğer görüntü oluşturulamazsa, boş bir görüntü oluştur
-        logger.warning("Gemini görsel oluşturamadı, placeholder görüntü oluşturuluyor.")
-        return create_placeholder_image(section_text)
+        raise
+
+async def generate_image_for_section_async(section_text, image_api='dalle', priority='normal', cancel_event=None):
+    """generate_image_for_section'ın async karşılığı"""
+    chain, skipped = image_provider_chain(image_api)
+    reason = f"{skipped[0].name}_circuit_open" if skipped else None
+    for index, provider in enumerate(chain):
+        try:
+            with provider_guard('image', provider), provider_call('image', provider.name):
+                image_data = await provider.generate_async(section_text, priority=priority, cancel_event=cancel_event)
+        except ImageRequestCancelled:
+            raise
+        except Exception as e:
+            reason = reason or f"{provider.name}_error"
+            record_fallback(chain, index, e, 'görsel')
+            continue
+        count_placeholder(provider, reason)
+        return image_data
+    return None
+
+async def create_audio_async(text, lang='tr', slow=False):
+    """
+    Ses deposu üzerinden async seslendirme; ses anahtarını döndürür.
+
+    gTTS'in async istemcisi yoktur; sentez döngünün sınırlı havuzunda çalışır,
+    depoda hazır olan sesler için hiç iş parçacığı kullanılmaz.
+    """
+    audio_key = AudioStore.make_key(text, lang, slow)
+    if audio_store.exists(audio_key):
+        return audio_key
+    audio_key, _ = await asyncio.to_thread(audio_store.get_or_create, text, lang, slow, create_audio)
+    return audio_key
+
+async def first_page_media_async(sections, character_name, character_type, setting, theme, character_attributes, image_api):
+    """İlk sayfa görselini ve sesini birlikte üretir: (image_url, audio_url)"""
+    image_prompt = build_first_page_image_prompt(sections, character_name, character_type, setting, theme, character_attributes)
+    prompt_logger.info(f"Image prompt: {image_prompt}")
     
-    except Exception as e:
-        logger.error(f"Görsel oluşturma hatası: {e}")
-        logger.error(traceback.format_exc())
-        # Hata durumunda da placeholder görüntü oluştur
-        return create_placeholder_image(section_text)
+    async def first_audio():
+        if not sections:
+            return None
+        return f"/audio/{await create_audio_async(sections[0])}.mp3"
+    
+    image_data, audio_url = await asyncio.gather(
+        generate_image_for_section_async(image_prompt, image_api),
+        first_audio(),
+        return_exceptions=True
+    )
+    if isinstance(audio_url, BaseException):
+        logger.error(f"İlk sayfa sesi oluşturulamadı: {audio_url}")
+        audio_url = None
+    if isinstance(image_data, BaseException):
+        logger.error(f"İlk sayfa görseli oluşturulamadı: {image_data}")
+        image_data = None
+    if not image_data:
+        logger.warning("Görsel oluşturma başarısız, varsayılan görsel kullanılacak.")
+    
+    # Türev üretimi CPU işidir, döngü dışında çalışır
+    image_url = await asyncio.to_thread(publish_image, image_data)
+    return image_url, audio_url
+
+async def generate_tale_async(character_name, character_type, setting, theme, word_limit, image_api, text_api, character_attributes):
+    """/generate_tale yanıtını async katmanla üretir; metin sonrası görsel ve ses aynı anda beklenir"""
+    tale_text = await generate_tale_text_async(character_name, character_type, setting, theme, word_limit, text_api, character_attributes)
+    sections = split_text_into_sections(tale_text, 50)
+    image_url, audio_url = await first_page_media_async(
+        sections, character_name, character_type, setting, theme, character_attributes, image_api
+    )
+    return {
+        "tale_title": f"{character_name}'nin {setting} Macerası",
+        "tale_text": tale_text,
+        "image_url": image_url,
+        "audio_url": audio_url
+    }
 
 def create_placeholder_image(text):
     """Metinden daha çekici bir placeholder görüntü oluşturur"""
+    # Try dışında içe aktarılır; aşağıdaki basit görüntü yedeği de Image'ı kullanır
+    from PIL import Image, ImageDraw, ImageFont
+    
     try:
         # Boyutları ve arkaplan rengini belirle - açık mavi
         width, height = 1024, 1024
         image = Image.new('RGB', (width, height), color=(173, 216, 230))
         
         # Görsel iyileştirmeleri ekle - basit bir gökkuşağı arka plan
-        from PIL import ImageDraw, ImageFont
-        
         draw = ImageDraw.Draw(image)
         
         # Renkli çerçeve çiz
@@ -1460,13 +2487,12 @@ def create_placeholder_image(text):
             fill=(0, 0, 0)
         )
         
-        # Görüntüyü base64 formatına dönüştür
+        # Görüntüyü PNG baytlarına dönüştür
         buffer = io.BytesIO()
         image.save(buffer, format="PNG")
-        base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
         
         logger.info("Geliştirilmiş placeholder görüntü başarıyla oluşturuldu.")
-        return base64_image
+        return buffer.getvalue()
     except Exception as e:
         logger.error(f"Placeholder görüntü oluşturma hatası: {e}")
         logger.error(traceback.format_exc())
@@ -1476,12 +2502,268 @@ def create_placeholder_image(text):
             simple_image = Image.new('RGB', (1024, 1024), color=(240, 248, 255))
             buffer = io.BytesIO()
             simple_image.save(buffer, format="PNG")
-            base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            return base64_image
+            return buffer.getvalue()
         except:
             return None
 
 # Ses efekti fonksiyonu kaldırıldı
 
+# --- Sağlayıcılar ---
+# Rotalar sağlayıcılara doğrudan değil, aşağıdaki kayıt defterleri üzerinden
+# ulaşır. Deneme sırası TEXT_PROVIDERS, IMAGE_PROVIDERS ve SPEECH_PROVIDERS
+# ortam değişkenlerinden okunur; "paket.modül:Sınıf" girdileriyle yeni
+# sağlayıcılar eklenebilir (bkz. providers.py).
+
+def shutdown_http_response(response):
+    """
+    Başka bir iş parçacığında okunan httpx yanıtının soketini kapatır.
+
+    response.close() okumada bekleyen iş parçacığını uyandırmaz; soket
+    shutdown edilince bekleyen okuma hemen hata verir.
+    """
+    network_stream = response.extensions.get('network_stream')
+    sock = network_stream.get_extra_info('socket') if network_stream else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class OpenAITextProvider(TextProvider):
+    """OpenAI chat completions; kısa metinlerde daha güçlü modelle yeniden dener"""
+    name = 'openai'
+    
+    def is_available(self):
+        return openai_client is not None
+    
+    def model_name(self):
+        return OPENAI_TEXT_MODEL
+    
+    def generate(self, request):
+        if request.abort:
+            # Yarıştırılan istek akışla alınır: kaybederse bağlantı kapatılır ve üretim durur
+            for event, text in self.stream(request):
+                if event == 'final':
+                    return text
+        
+        logger.info("OpenAI API ile masal metni oluşturuluyor...")
+        try:
+            with provider_call('llm_text', 'openai'):
+                response = openai_client.chat.completions.create(**openai_tale_request(request.prompt, request.word_limit))
+            
+            tale_text = response.choices[0].message.content.strip()
+            
+            return correct_openai_word_count(tale_text, request.character_name, request.character_type, request.setting, request.theme, request.word_limit)
+        
+        except Exception as e:
+            logger.error(f"OpenAI ile masal metni oluşturulurken hata: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise
+    
+    def stream(self, request):
+        logger.info("OpenAI API ile masal metni akış olarak oluşturuluyor...")
+        chunks = []
+        abort = request.abort or AbortSignal()
+        with provider_call('llm_text', 'openai'), abort.checked():
+            stream = openai_client.chat.completions.create(stream=True, **openai_tale_request(request.prompt, request.word_limit))
+            # Akış yarıda bırakılırsa (ör. hedging'de kaybeden) bağlantı kapatılır; başka
+            # iş parçacığından kesildiğinde okumada bekleyen soket hemen kapatılır
+            with stream, abort.on_abort(lambda: shutdown_http_response(stream.response)):
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        yield 'delta', chunk.choices[0].delta.content
+        
+        # Kesilen istek kelime sayısı düzeltmesi için yeniden çağrı yapmaz
+        if abort.is_set():
+            raise RequestAborted()
+        tale_text = ''.join(chunks).strip()
+        yield 'final', correct_openai_word_count(tale_text, request.character_name, request.character_type, request.setting, request.theme, request.word_limit)
+    
+    async def generate_async(self, request):
+        logger.info("OpenAI API ile masal metni oluşturuluyor (async)...")
+        client = await get_async_openai_client()
+        with provider_call('llm_text', 'openai'):
+            response = await client.chat.completions.create(**openai_tale_request(request.prompt, request.word_limit))
+        tale_text = response.choices[0].message.content.strip()
+        # Kısa metinlerde yeniden deneme eşzamanlı istemciyle yapılır (seyrek yol)
+        return await asyncio.to_thread(
+            correct_openai_word_count, tale_text, request.character_name, request.character_type, request.setting, request.theme, request.word_limit
+        )
+
+class GeminiTextProvider(TextProvider):
+    """Gemini; model kayıt defterindeki sağlıklı modelleri sırayla dener"""
+    name = 'gemini'
+    
+    def is_available(self):
+        return gemini_models.configured
+    
+    def model_name(self):
+        best = gemini_models.get()
+        return best[0] if best else None
+    
+    def correct(self, model, tale_text, request):
+        return correct_gemini_word_count(
+            model, tale_text, request.character_name, request.character_type, request.setting, request.theme, request.word_limit, request.character_description
+        )
+    
+    def generate(self, request):
+        logger.info("Gemini API ile masal metni oluşturuluyor...")
+        # Sağlıklı modellerden ilkini kullan
+        model, response = generate_with_gemini(request.prompt, abort=request.abort)
+        # Kesilen istek kelime sayısı düzeltmesi için yeniden çağrı yapmaz
+        if request.abort and request.abort.is_set():
+            raise RequestAborted()
+        return self.correct(model, response.text.strip(), request)
+    
+    def stream(self, request):
+        logger.info("Gemini API ile masal metni akış olarak oluşturuluyor...")
+        model_name, model = get_gemini_text_model()
+        
+        chunks = []
+        with gemini_models.guard(model_name), provider_call('llm_text', 'gemini'):
+            for chunk in model.generate_content(request.prompt, stream=True):
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield 'delta', chunk.text
+        
+        yield 'final', self.correct(model, ''.join(chunks).strip(), request)
+    
+    async def generate_async(self, request):
+        logger.info("Gemini API ile masal metni oluşturuluyor (async)...")
+        model, response = await generate_with_gemini_async(request.prompt)
+        return await asyncio.to_thread(self.correct, model, response.text.strip(), request)
+
+class DalleImageProvider(ImageProvider):
+    """OpenAI DALL-E; paylaşılan hız sınırlayıcı ve görsel önbelleği üzerinden çalışır"""
+    name = 'dalle'
+    
+    def is_available(self):
+        return openai_client is not None
+    
+    def generate(self, prompt, priority='normal', cancel_event=None):
+        return generate_image_with_dalle(prompt, priority, cancel_event)
+    
+    async def generate_async(self, prompt, priority='normal', cancel_event=None):
+        return await generate_image_with_dalle_async(prompt, priority, cancel_event)
+
+class GeminiImageProvider(ImageProvider):
+    """Gemini görsel üretimi (image_api=gemini)"""
+    name = 'gemini'
+    
+    def is_available(self):
+        return gemini_models.configured
+    
+    def generate(self, prompt, priority='normal', cancel_event=None):
+        return generate_image_with_gemini(prompt)
+
+class PlaceholderImageProvider(ImageProvider):
+    """Yerel olarak çizilen yer tutucu görsel; varsayılan sırada son çaredir"""
+    name = 'placeholder'
+    
+    def generate(self, prompt, priority='normal', cancel_event=None):
+        image_data = create_placeholder_image(prompt)
+        if not image_data:
+            raise ValueError("Placeholder görüntü oluşturulamadı")
+        return image_data
+
+class GTTSSpeechProvider(SpeechProvider):
+    """Google Translate TTS (gTTS); uzun metinleri kendi içinde parçalar"""
+    name = 'gtts'
+    
+    def is_available(self):
+        return is_installed('gtts')
+    
+    def synthesize(self, text, lang='tr', slow=False):
+        tts = gTTS(text=text, lang=lang, slow=slow)
+        
+        # Belleğe yaz
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        return buffer.getvalue()
+
+def provider_list(env_name, default):
+    """Virgülle ayrılmış sağlayıcı sırasını ortam değişkeninden okur"""
+    return os.getenv(env_name, default).split(',')
+
+text_providers = ProviderRegistry('metin', TextProvider)
+text_providers.register(OpenAITextProvider())
+text_providers.register(GeminiTextProvider())
+text_providers.configure(provider_list("TEXT_PROVIDERS", "openai,gemini"))
+
+image_providers = ProviderRegistry('görsel', ImageProvider)
+image_providers.register(DalleImageProvider())
+image_providers.register(GeminiImageProvider())
+image_providers.register(PlaceholderImageProvider())
+image_providers.configure(provider_list("IMAGE_PROVIDERS", "dalle,placeholder"))
+
+speech_providers = ProviderRegistry('ses', SpeechProvider)
+speech_providers.register(GTTSSpeechProvider())
+speech_providers.configure(provider_list("SPEECH_PROVIDERS", "gtts"))
+
+# Metin hedging (TEXT_HEDGE_AFTER, varsayılan kapalı): birincil sağlayıcı bu süre
+# içinde ilk parçayı veya sonucu üretmezse istek ikincisine de gönderilir.
+# Sabit saniye ("4.5") veya ölçülen ilk yanıt süresinden yüzdelik ("p95") olabilir.
+text_hedger = TextHedger(
+    os.getenv("TEXT_HEDGE_AFTER", ""),
+    max_ratio=float(os.getenv("TEXT_HEDGE_MAX_RATIO", 0.1)),
+    min_samples=int(os.getenv("TEXT_HEDGE_MIN_SAMPLES", 20)),
+    on_fallback=lambda source, target: provider_fallbacks.inc(source=source, target=target),
+    guard=lambda provider: provider_guard('text', provider)
+)
+if text_hedger.enabled:
+    logger.info(f"Metin hedging açık: eşik {os.getenv('TEXT_HEDGE_AFTER')}, en fazla %{text_hedger.max_ratio * 100:g} yedek istek")
+
+def collect_hedge_metrics():
+    """Hedging sayaçlarını ve yedek istek oranını metrik olarak döndürür"""
+    if not text_hedger.enabled:
+        return []
+    stats = text_hedger.stats()
+    return [
+        ('masal_text_hedge_requests_total', 'counter', "Hedging üzerinden geçen metin istekleri (sonuca göre)",
+         [({'outcome': outcome}, stats[outcome]) for outcome in ('primary_wins', 'secondary_wins', 'failed')]),
+        ('masal_text_hedged_total', 'counter', "İkincil sağlayıcıya yedek istek gönderilen metin istekleri",
+         [({}, stats['hedged'])]),
+        ('masal_text_hedge_budget_skips_total', 'counter', "Bütçe dolduğu için gönderilmeyen yedek istekler",
+         [({}, stats['budget_skips'])]),
+        ('masal_text_hedge_ratio', 'gauge', "Son isteklerde yedek istek oranı",
+         [({}, stats['recent_hedge_rate'])]),
+    ]
+
+metrics.add_collector(collect_hedge_metrics)
+
+def provider_capabilities():
+    """Yapılandırılmış sağlayıcılara göre kullanılabilir yetenekleri döndürür (SDK yüklemeden)"""
+    return {
+        'text': text_providers.describe(),
+        'image': image_providers.describe(),
+        'audio': speech_providers.describe(),
+        'word': is_installed('docx')
+    }
+
+capabilities = provider_capabilities()
+logger.info(f"Kullanılabilir yetenekler: {json.dumps(capabilities)}")
+if not any(capabilities['text'].values()):
+    logger.error("Hiçbir metin sağlayıcısı yapılandırılmadı! .env dosyasına GOOGLE_API_KEY veya OPENAI_API_KEY ekleyin.")
+
+def create_app():
+    """
+    Flask uygulamasını oluşturur.
+
+    Sağlayıcı istemcileri, önbellekler ve iş havuzları modül düzeyinde süreç
+    başına bir kez kurulur; fabrika yalnızca uygulamayı ve rotaları bağlar.
+    Üretimde gunicorn bu fabrikayı kullanır (bkz. gunicorn.conf.py).
+    """
+    flask_app = Flask(__name__)
+    # Tüm kaynaklardan gelen isteklere izin ver
+    CORS(flask_app, resources={r"/*": {"origins": "*"}})
+    flask_app.register_blueprint(bp)
+    logger.info("Flask uygulaması ve CORS yapılandırıldı.")
+    return flask_app
+
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8500, debug=True)
+    # Geliştirme sunucusu; üretim için: gunicorn -c gunicorn.conf.py
+    debug = os.getenv("FLASK_DEBUG", "0") == "1"
+    app.run(host='0.0.0.0', port=int(os.getenv("PORT", 8500)), debug=debug, threaded=True)
@@ -0,0 +1,52 @@
+"""
+Sağlayıcı çağrıları için arka planda çalışan tek bir asyncio olay döngüsü.
+
+Flask görünümleri ve masal işleri eşzamanlıdır; async sağlayıcı katmanı
+(AsyncOpenAI, Gemini generate_content_async) bu döngüde çalışır. Böylece
+aynı anda yüzlerce sağlayıcı isteği tek bir iş parçacığında bekler. Async
+karşılığı olmayan işler (gTTS, disk yazma, görsel dönüştürme) döngünün
+sınırlı varsayılan havuzunda asyncio.to_thread ile çalışır.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("masal_app")
+
+
+class AsyncLoopThread:
+    """Kendi iş parçacığında çalışan olay döngüsü; eşzamanlı koddan coroutine çalıştırır"""
+
+    def __init__(self, name="async-providers", blocking_workers=8):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=blocking_workers, thread_name_prefix=f"{name}-blocking")
+        )
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        logger.info(f"Async sağlayıcı döngüsü başlatıldı (engelleyen iş havuzu: {blocking_workers})")
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Coroutine'i döngüde başlatır; concurrent.futures.Future döndürür"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Coroutine'i döngüde çalıştırır ve sonucunu bekler"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self):
+        """Döngüyü durdurur (süreç kapanırken)"""
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
@@ -0,0 +1,130 @@
+"""
+Sayfa seslendirmeleri için özet anahtarlı disk deposu.
+
+Anahtar (metin, dil, yavaş okuma) üçlüsünün SHA-256 özetidir ve aynı
+zamanda güçlü ETag olarak kullanılır. Aynı sayfa metni için gTTS yalnızca
+bir kez çalıştırılır; eşzamanlı istekler aynı sentezi bekler. Toplam boyut
+sınırı aşılınca en uzun süredir kullanılmayan dosyalar, boyut sınırın
+%90'ına inene kadar silinir (LRU, bellekteki kullanım sırasına göre; bkz.
+lru_files).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from lru_files import LruFileIndex
+
+logger = logging.getLogger("masal_app")
+
+
+class AudioStore:
+    """MP3 dosyalarını içerik özetiyle saklayan, boyut sınırlı ve tekrar sentezi önleyen depo"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # anahtar -> [kilit, bekleyen sayısı]; son bekleyen çıkınca silinir
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+        self._files = LruFileIndex(directory, '.mp3', max_bytes)
+
+    @staticmethod
+    def make_key(text, lang, slow):
+        payload = json.dumps([text, lang, bool(slow)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.mp3')
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def locate(self, key):
+        """Dosya varsa yolunu döndürür ve LRU için son kullanım zamanını günceller, yoksa None"""
+        path = self.path(key)
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        self._files.touch(path)
+        return path
+
+    def put(self, key, data):
+        """Ses verisini atomik olarak yazar ve gerekirse eski dosyaları tahliye eder"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        # Sınır aşıldıysa eski dosyalar silinir; az önce yazılan dosya korunur
+        evicted = self._files.add(path, len(data))
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+            logger.info(f"Ses deposu tahliye sonrası boyut: {self._files.total_bytes} bytes")
+        return path
+
+    def get_or_create(self, text, lang, slow, synthesize):
+        """
+        Ses dosyası yoksa synthesize(text, lang, slow) ile oluşturur.
+
+        (anahtar, dosya yolu) döndürür. Aynı anahtar için eşzamanlı gelen
+        istekler tek bir sentezi bekler.
+        """
+        key = self.make_key(text, lang, slow)
+        path = self.path(key)
+        if self.locate(key):
+            with self._lock:
+                self.hits += 1
+            return key, path
+
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                if self.locate(key):
+                    with self._lock:
+                        self.hits += 1
+                    return key, path
+
+                with self._lock:
+                    self.misses += 1
+                self.put(key, synthesize(text, lang, slow))
+                logger.info(f"Ses dosyası depoya eklendi: {key[:12]}")
+                return key, path
+        finally:
+            # Kilit, bekleyen kalmayınca bırakılır; sentez başarısız olsa da
+            # bekleyenler ve yeni gelenler aynı kilidi paylaşır
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self._files.total_bytes,
+                'max_bytes': self.max_bytes
+            }
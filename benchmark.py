@@ -0,0 +1,399 @@
+"""
+Çevrimdışı yük testi ve gecikme ölçümü
+
+Uygulamayı (varsayılan olarak gunicorn ile) yerel sahte OpenAI, Gemini,
+görsel CDN'i ve TTS sunucusuna bağlı olarak ayrı bir süreçte başlatır,
+uç noktaları belirli eşzamanlılık seviyelerinde çağırır ve her uç nokta /
+seviye için p50/p95/p99 gecikme ve iş hacmini JSON olarak yazar. Sağlayıcı
+gecikmeleri ve hata oranları ayarlanabilir; API anahtarı gerekmez, ağa çıkmaz.
+
+Masallar, önbellekler ve SQLite dosyaları geçici bir çalışma dizininde tutulur;
+depodaki static/tales ve cache/ dizinlerine dokunulmaz.
+
+Kullanım:
+    python benchmark.py [--concurrency 1,8,32] [--requests 20] [--llm-latency 0.5]
+                        [--output benchmarks/latest.json] [--compare benchmarks/baseline.json]
+    python benchmark.py --endpoints list_tales,load_tale --server flask --env HTTP_PER_HOST_LIMIT=16
+"""
+
+import argparse
+import base64
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ('generate_tale', 'generate_page_image', 'generate_audio', 'save_tale', 'list_tales', 'load_tale')
+PERCENTILES = (50, 95, 99)
+
+
+def create_benchmark_app():
+    """gunicorn için: gTTS isteklerini sahte sağlayıcıya yönlendirip uygulamayı oluşturur"""
+    from fake_providers import patch_gtts
+    patch_gtts(os.environ['BENCH_TTS_URL'])
+    import app
+    return app.create_app()
+
+
+def serve_flask(port):
+    """--server flask için geliştirme sunucusu (iş parçacıklı)"""
+    from fake_providers import patch_gtts
+    patch_gtts(os.environ['BENCH_TTS_URL'])
+    import app
+    app.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, pct):
+    """En yakın sıra yöntemiyle yüzdelik"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class AppServer:
+    """Uygulamayı sahte sağlayıcılara bağlı olarak alt süreçte çalıştırır"""
+
+    def __init__(self, providers_url, server='gunicorn', extra_env=None):
+        self.workdir = tempfile.mkdtemp(prefix="masal_bench_")
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        state = lambda name: os.path.join(self.workdir, name)
+        self.env = dict(
+            os.environ,
+            PYTHONPATH=APP_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+            NO_PROXY='127.0.0.1,localhost',
+            OPENAI_API_KEY='benchmark',
+            GOOGLE_API_KEY='benchmark',
+            OPENAI_BASE_URL=f"{providers_url}/v1",
+            GEMINI_API_ENDPOINT=providers_url,
+            BENCH_TTS_URL=providers_url,
+            GEMINI_WARMUP='0',
+            PREFETCH='0',
+            # Ölçülen şey uygulamanın kendisi; DALL-E kotası darboğaz olmasın
+            DALLE_RATE_PER_MINUTE='1000000',
+            DALLE_RATE_BURST='1000',
+            DALLE_RATE_LIMIT_DB=state('rate_limits.sqlite3'),
+            IMAGE_CACHE_DIR=state('images'),
+            GENERATED_IMAGE_DIR=state('generated'),
+            AUDIO_STORE_DIR=state('audio'),
+            TALE_INDEX_DB=state('tale_index.sqlite3'),
+            TALES_DIR=state('tales'),
+            HOST='127.0.0.1',
+            PORT=str(self.port),
+        )
+        self.env.update(extra_env or {})
+
+        if server == 'gunicorn':
+            command = [
+                sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+                '--chdir', self.workdir, '--pythonpath', APP_DIR, 'benchmark:create_benchmark_app()'
+            ]
+        else:
+            command = [sys.executable, '-c', f"import benchmark; benchmark.serve_flask({self.port})"]
+        self.log_path = state('server.log')
+        self._log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(command, cwd=self.workdir, env=self.env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if requests.get(f"{self.url}/readyz", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        with open(self.log_path, 'rb') as f:
+            tail = f.read()[-3000:].decode('utf-8', 'replace')
+        raise RuntimeError(f"Uygulama hazır olmadı:\n{tail}")
+
+    def stop(self, keep_workdir=False):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+        if not keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class Scenarios:
+    """
+    Uç nokta başına istek üreticileri.
+
+    Üretim istekleri çalıştırma boyunca benzersiz girdiyle gönderilir (görsel ve
+    ses önbelleği isabeti olmaz); i yalnızca kaydedilmiş masallar arasında dolaşmak içindir.
+    """
+
+    def __init__(self, base_url, text_api, word_limit, run_id):
+        self.base_url = base_url
+        self.text_api = text_api
+        self.word_limit = word_limit
+        self.run_id = run_id
+        self.image_urls = []
+        self.tale_ids = []
+        self._serial = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def generate_tale(self, session, i):
+        return session.post(f"{self.base_url}/generate_tale", data={
+            'character_name': f"Kahraman{next(self._serial)}", 'character_type': 'kedi', 'setting': 'orman', 'theme': 'dostluk',
+            'word_limit': str(self.word_limit), 'text_api': self.text_api, 'image_api': 'dalle'
+        }, timeout=300)
+
+    def generate_page_image(self, session, i):
+        serial = next(self._serial)
+        response = session.post(f"{self.base_url}/generate_page_image", json={
+            'page_text': f"{self.run_id} sayfa {serial}: küçük kedi ormanda parlak bir taş buldu",
+            'character_name': 'Pamuk', 'character_type': 'kedi', 'setting': 'orman', 'page_number': serial
+        }, timeout=300)
+        if response.ok:
+            with self._lock:
+                self.image_urls.append(response.json()['image_url'])
+        return response
+
+    def generate_audio(self, session, i):
+        serial = next(self._serial)
+        return session.post(f"{self.base_url}/generate_audio", json={
+            'text': f"{self.run_id} {serial}. sayfa. Küçük kedi Pamuk ormanda yürürken parlak bir taş buldu ve arkadaşlarına gösterdi.",
+            'page': serial, 'lang': 'tr'
+        }, timeout=300)
+
+    def save_tale(self, session, i):
+        tale_id = f"bench{self.run_id}_{next(self._serial)}"
+        image = self.image_urls[i % len(self.image_urls)] if self.image_urls else ''
+        response = session.post(f"{self.base_url}/save_tale", json={
+            'id': tale_id, 'title': f"Benchmark masalı {i}", 'text': 'Bir varmış bir yokmuş.',
+            'characterName': 'Pamuk', 'characterType': 'kedi', 'setting': 'orman', 'theme': 'dostluk',
+            'image': image,
+            'pages': [{'text': f"Sayfa {page}", 'image': image} for page in range(3)],
+            'audios': {'0': {'blob': base64.b64encode(b'ID3' + bytes(6000)).decode('ascii')}}
+        }, timeout=300)
+        if response.ok:
+            with self._lock:
+                self.tale_ids.append(tale_id)
+        return response
+
+    def list_tales(self, session, i):
+        return session.get(f"{self.base_url}/list_tales", params={'type': 'all'}, timeout=60)
+
+    def load_tale(self, session, i):
+        tale_id = self.tale_ids[i % len(self.tale_ids)] if self.tale_ids else 'missing'
+        return session.get(f"{self.base_url}/load_tale/{tale_id}", timeout=60)
+
+
+def run_level(request_fn, concurrency, total):
+    """total isteği concurrency iş parçacığıyla gönderir; gecikme istatistiklerini döndürür"""
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = request_fn(session, i)
+            response.content
+            failed = None if response.ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            failed = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if failed:
+                errors.append(failed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        'requests': total,
+        'errors': len(errors),
+        'throughput_rps': round(total / wall, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1),
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 1)
+    if errors:
+        result['error_kinds'] = sorted(set(errors))
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args):
+    from fake_providers import FakeProviders, ProviderProfile
+
+    profiles = {
+        'openai_text': ProviderProfile(args.llm_latency, args.jitter, args.error_rate),
+        'gemini': ProviderProfile(args.llm_latency, args.jitter, args.error_rate),
+        'openai_image': ProviderProfile(args.image_latency, args.jitter, args.error_rate),
+        'cdn': ProviderProfile(args.cdn_latency, args.jitter, args.error_rate),
+        'tts': ProviderProfile(args.tts_latency, args.jitter, args.error_rate),
+    }
+    providers = FakeProviders(profiles=profiles, seed=args.seed).start()
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    server = AppServer(providers.url, server=args.server, extra_env=extra_env)
+    run_id = datetime.datetime.now().strftime("%H%M%S")
+    scenarios = Scenarios(server.url, args.text_api, args.word_limit, run_id)
+    results = {}
+    try:
+        server.wait_ready()
+        for endpoint in args.endpoints:
+            request_fn = getattr(scenarios, endpoint)
+            # İlk istek (SDK yükleme, bağlantı kurma) ölçüme katılmaz
+            run_level(request_fn, 1, 1)
+            results[endpoint] = {}
+            for concurrency in args.concurrency:
+                providers.reset_stats()
+                level = run_level(request_fn, concurrency, args.requests)
+                level['provider_calls'] = {
+                    name: stats for name, stats in providers.stats().items() if stats['calls']
+                }
+                results[endpoint][str(concurrency)] = level
+                print(
+                    f"{endpoint:<20} c={concurrency:<3} p50={level['p50_ms']:>9.1f} ms  p95={level['p95_ms']:>9.1f} ms  "
+                    f"p99={level['p99_ms']:>9.1f} ms  {level['throughput_rps']:>7.2f} istek/sn  hata={level['errors']}",
+                    flush=True
+                )
+    finally:
+        server.stop(keep_workdir=args.keep_workdir)
+        providers.stop()
+        if args.keep_workdir:
+            print(f"Çalışma dizini: {server.workdir}")
+
+    return {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'server': args.server,
+            'requests_per_level': args.requests,
+            'concurrency': args.concurrency,
+            'text_api': args.text_api,
+            'word_limit': args.word_limit,
+            'providers': {name: profile.to_dict() for name, profile in profiles.items()},
+            'env': extra_env,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """İki sonucu karşılaştırır; eşik yüzdesini aşan gerilemelerin listesini döndürür"""
+    regressions = []
+    for endpoint, levels in current['results'].items():
+        for concurrency, new in levels.items():
+            old = baseline.get('results', {}).get(endpoint, {}).get(concurrency)
+            if not old:
+                continue
+            parts = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+                change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                parts.append(f"{key} {old[key]} → {new[key]} ({change:+.1f}%)")
+                worse = -change if key == 'throughput_rps' else change
+                if key != 'p50_ms' and worse > threshold:
+                    regressions.append(f"{endpoint} c={concurrency} {key} {change:+.1f}%")
+            print(f"{endpoint:<20} c={concurrency:<3} " + ", ".join(parts))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sahte sağlayıcılarla çevrimdışı yük testi ve gecikme ölçümü")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                        help="Virgülle ayrılmış uç noktalar (sıra önemli: load_tale, save_tale'den sonra gelmeli). Varsayılan: tümü")
+    parser.add_argument('--concurrency', default='1,8,32', help="Eşzamanlılık seviyeleri (varsayılan 1,8,32)")
+    parser.add_argument('--requests', type=int, default=20, help="Her uç nokta ve seviye için istek sayısı (varsayılan 20)")
+    parser.add_argument('--server', choices=('gunicorn', 'flask'), default='gunicorn')
+    parser.add_argument('--text-api', choices=('openai', 'gemini'), default='openai')
+    parser.add_argument('--word-limit', type=int, default=100)
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="Sahte LLM gecikmesi, sn (varsayılan 0.5)")
+    parser.add_argument('--image-latency', type=float, default=1.0, help="Sahte DALL-E gecikmesi, sn (varsayılan 1.0)")
+    parser.add_argument('--cdn-latency', type=float, default=0.05, help="Sahte CDN gecikmesi, sn (varsayılan 0.05)")
+    parser.add_argument('--tts-latency', type=float, default=0.2, help="gTTS parça başına sahte gecikme, sn (varsayılan 0.2)")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Gecikme sapma oranı (varsayılan ±%%20)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Sağlayıcı hata oranı, 0-1 (varsayılan 0)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Uygulama sürecine ek ortam değişkeni (tekrarlanabilir)")
+    parser.add_argument('--output', default=os.path.join(APP_DIR, 'benchmarks', 'latest.json'),
+                        help="Sonuç JSON dosyası (varsayılan benchmarks/latest.json)")
+    parser.add_argument('--compare', help="Karşılaştırılacak temel JSON (ör. benchmarks/baseline.json)")
+    parser.add_argument('--threshold', type=float, default=15.0,
+                        help="p95/p99 artışı veya iş hacmi düşüşü için gerileme eşiği, %% (varsayılan 15)")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Gerileme varsa çıkış kodu 1")
+    parser.add_argument('--keep-workdir', action='store_true', help="Geçici çalışma dizinini (sunucu logu dahil) silme")
+    args = parser.parse_args(argv)
+
+    args.endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Bilinmeyen uç nokta: {', '.join(unknown)}")
+    args.concurrency = [int(level) for level in args.concurrency.split(',')]
+    if any('=' not in item for item in args.env):
+        parser.error("--env KEY=VALUE biçiminde olmalı")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Sonuçlar yazıldı: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nKarşılaştırma ({baseline['meta'].get('git_commit')} → {report['meta']['git_commit']}):")
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n%{args.threshold:g} eşiğini aşan gerilemeler:\n  " + "\n  ".join(regressions))
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Sağlayıcı ve model başına devre kesiciler.
+
+Bir sağlayıcı art arda failure_threshold kez hata verirse devre açılır ve
+reset_timeout saniye boyunca çağrı yapılmadan reddedilir; istek hemen
+yedek sağlayıcıya (veya placeholder'a) geçer. Süre dolunca devre yarı
+açık duruma geçer ve tek bir isteğin deneme olarak gitmesine izin verilir:
+başarılı olursa devre kapanır, başarısız olursa bekleme süresi
+max_reset_timeout'a kadar ikiye katlanarak devre yeniden açılır.
+
+İsteğin kendisinden kaynaklanan hatalar (ör. içerik politikası) ve iptaller
+is_failure ile ayıklanır; bunlar devreyi ne açar ne de kapatır.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger("masal_app")
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Devre açık olduğu için çağrı sağlayıcıya gitmeden reddedildi"""
+
+
+class CircuitBreaker:
+    """Tek bir sağlayıcı veya modelin devre kesicisi"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, max_reset_timeout=300, is_failure=None, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.is_failure = is_failure or (lambda error: True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._open_timeout = reset_timeout
+        self._opened_at = None
+        self._probe_started_at = None
+        self._last_error = None
+        self._counters = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _probe_free(self, now):
+        """Yarı açık durumda deneme isteği yoksa veya takılı kaldıysa (kilit altında çağrılır)"""
+        return self._probe_started_at is None or now - self._probe_started_at >= self._open_timeout
+
+    def _can_call(self, now):
+        if self._state == CLOSED:
+            return True
+        if self._state == OPEN:
+            return now - self._opened_at >= self._open_timeout
+        return self._probe_free(now)
+
+    def ready(self):
+        """Çağrı yapılabilir mi (deneme hakkını almadan); sağlayıcı zincirinden eleme için"""
+        with self._lock:
+            return self._can_call(self._clock())
+
+    def allow(self):
+        """Çağrı yapılabiliyorsa True döndürür; yarı açık durumda deneme hakkını alır"""
+        with self._lock:
+            now = self._clock()
+            if not self._can_call(now):
+                self._counters['rejected'] += 1
+                return False
+            if self._state == OPEN:
+                self._state = HALF_OPEN
+                logger.info(f"Devre yarı açık, deneme isteği gönderiliyor: {self.name}")
+            if self._state == HALF_OPEN:
+                self._probe_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._counters['successes'] += 1
+            self._failures = 0
+            self._last_error = None
+            if self._state != CLOSED:
+                logger.info(f"Devre kapandı, sağlayıcı yeniden kullanılıyor: {self.name}")
+            self._state = CLOSED
+            self._open_timeout = self.reset_timeout
+            self._probe_started_at = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._counters['failures'] += 1
+            self._failures += 1
+            self._last_error = str(error) if error is not None else None
+            if self._state == HALF_OPEN:
+                # Deneme başarısız: bekleme süresini artırarak yeniden aç
+                self._open_timeout = min(self._open_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Sonucu sağlayıcı sağlığı hakkında bilgi vermeyen çağrının deneme hakkını bırakır"""
+        with self._lock:
+            self._probe_started_at = None
+
+    def _open(self):
+        """Devreyi açar (kilit altında çağrılır)"""
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probe_started_at = None
+        self._counters['opened'] += 1
+        logger.warning(
+            f"Devre açıldı: {self.name} ({self._failures} ardışık hata, {self._open_timeout:g} sn sonra denenecek): {self._last_error}"
+        )
+
+    @contextlib.contextmanager
+    def guard(self):
+        """
+        Bloğu devre kesici üzerinden çalıştırır: devre açıksa CircuitOpenError
+        fırlatır, sonuca göre başarı veya hata kaydeder.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} devresi açık")
+        try:
+            yield
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self.release()
+            raise
+        except BaseException:
+            # İptal (GeneratorExit, CancelledError): sonuç bilinmiyor
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def to_dict(self):
+        with self._lock:
+            info = dict(self._counters)
+            info.update(
+                state=self._state,
+                consecutive_failures=self._failures,
+                open_timeout=self._open_timeout,
+                last_error=self._last_error
+            )
+            return info
+
+
+class BreakerBoard:
+    """İsimle erişilen devre kesiciler; hepsi aynı ayarlarla, ilk kullanımda oluşturulur"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+            return breaker
+
+    def status(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.to_dict() for breaker in breakers}
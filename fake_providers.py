@@ -0,0 +1,231 @@
+"""
+Yük testi için yerel sahte sağlayıcı sunucusu.
+
+Tek bir HTTP sunucusu OpenAI (chat completions, images), Gemini REST
+(generateContent), DALL-E görsellerinin indirildiği CDN ve gTTS'in kullandığı
+Google Translate uç noktalarını taklit eder. Her sağlayıcı için gecikme,
+sapma ve hata oranı ayarlanabilir; böylece uygulamanın kendi ek yükü ve
+eşzamanlılık altındaki davranışı gerçek API'lere çıkmadan ölçülebilir.
+
+Uygulama bu sunucuya şu ayarlarla bağlanır:
+    OPENAI_BASE_URL=<url>/v1
+    GEMINI_API_ENDPOINT=<url>
+    gTTS için patch_gtts(<url>) (gTTS'in uç nokta ayarı yoktur)
+"""
+
+import base64
+import hashlib
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "bir", "gün", "küçük", "kedi", "ormanda", "yürürken", "parlak", "bir", "taş", "buldu",
+    "arkadaşları", "ile", "birlikte", "nehrin", "kenarına", "gitti", "ve", "güneş", "batarken", "eve", "döndü"
+)
+WORD_LIMIT_PATTERN = re.compile(r'(\d+) kelime')
+
+
+class ProviderProfile:
+    """Bir sağlayıcının yapay gecikmesi (saniye), ± sapma oranı ve hata oranı"""
+
+    def __init__(self, latency=0.0, jitter=0.2, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self, rng):
+        if self.latency <= 0:
+            return 0.0
+        return max(0.0, rng.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter)))
+
+    def to_dict(self):
+        return {'latency': self.latency, 'jitter': self.jitter, 'error_rate': self.error_rate}
+
+
+def render_fake_image(size=1024):
+    """DALL-E çıktısına benzer boyutta (gürültülü) bir PNG üretir"""
+    from PIL import Image
+
+    noise = Image.effect_noise((size, size), 48)
+    gradient = Image.linear_gradient('L').resize((size, size))
+    image = Image.merge('RGB', (noise, gradient, gradient.transpose(Image.Transpose.ROTATE_90)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def patch_gtts(base_url):
+    """gTTS isteklerini https://translate.google.<tld>/ yerine base_url'e yönlendirir"""
+    import gtts.tts
+
+    gtts.tts._translate_url = lambda tld="com", path="": f"{base_url.rstrip('/')}/{path}"
+
+
+def fake_tale_text(prompt, serial):
+    """Promptta istenen kelime sayısında, her çağrıda farklı bir masal metni"""
+    match = WORD_LIMIT_PATTERN.search(prompt)
+    word_count = int(match.group(1)) if match else 200
+    words = [f"masal{serial}"] + [WORDS[i % len(WORDS)] for i in range(word_count - 1)]
+    return ' '.join(words)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeProviders/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _simulate(self, provider):
+        """Gecikmeyi uygular; hata üretilecekse True döner"""
+        fake = self.server.fake
+        profile = fake.profiles[provider]
+        with fake.lock:
+            delay = profile.delay(fake.rng)
+            failed = fake.rng.random() < profile.error_rate
+            fake.calls[provider] += 1
+            if failed:
+                fake.errors[provider] += 1
+        time.sleep(delay)
+        if failed:
+            self._send(500, {'error': {'message': 'fake provider error', 'type': 'server_error', 'code': 500}})
+        return failed
+
+    def do_GET(self):
+        if self.path.startswith('/cdn/'):
+            if not self._simulate('cdn'):
+                self._send(200, self.server.fake.image_bytes, 'image/png')
+            return
+        self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split('?')[0]
+        if path == '/v1/chat/completions':
+            self._chat_completion(json.loads(body))
+        elif path == '/v1/images/generations':
+            self._image_generation(json.loads(body))
+        elif path.startswith('/v1beta/models/') and path.endswith(':generateContent'):
+            self._gemini_generate(json.loads(body))
+        elif path.startswith('/v1beta/models/') and path.endswith(':streamGenerateContent'):
+            self._gemini_generate(json.loads(body), stream=True)
+        elif path == '/_/TranslateWebserverUi/data/batchexecute':
+            self._tts(body)
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _chat_completion(self, request):
+        if self._simulate('openai_text'):
+            return
+        prompt = request['messages'][-1]['content']
+        text = fake_tale_text(prompt, next(self.server.fake.serial))
+        if request.get('stream'):
+            chunks = [
+                {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': request['model'],
+                 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': word + ' '}, 'finish_reason': None}]}
+                for word in text.split()
+            ]
+            payload = ''.join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            self._send(200, payload.encode('utf-8'), 'text/event-stream')
+            return
+        self._send(200, {
+            'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': request['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(text.split()), 'total_tokens': 0}
+        })
+
+    def _image_generation(self, request):
+        if self._simulate('openai_image'):
+            return
+        digest = hashlib.sha256(request['prompt'].encode('utf-8')).hexdigest()[:16]
+        self._send(200, {
+            'created': int(time.time()),
+            'data': [{'url': f"{self.server.fake.url}/cdn/{digest}.png", 'revised_prompt': request['prompt']}]
+        })
+
+    def _gemini_generate(self, request, stream=False):
+        if self._simulate('gemini'):
+            return
+        prompt = ' '.join(part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', []))
+        text = fake_tale_text(prompt, next(self.server.fake.serial))
+        if stream:
+            # REST akışı yanıt nesnelerinden oluşan bir JSON dizisidir
+            chunks = [
+                {'candidates': [{'content': {'parts': [{'text': word + ' '}], 'role': 'model'}, 'index': 0}]}
+                for word in text.split()
+            ]
+            self._send(200, json.dumps(chunks).encode('utf-8'))
+            return
+        self._send(200, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {'promptTokenCount': 1, 'candidatesTokenCount': 1, 'totalTokenCount': 2}
+        })
+
+    def _tts(self, body):
+        if self._simulate('tts'):
+            return
+        # gTTS yanıttaki jQ1olc satırından base64 MP3 verisini okur
+        audio = base64.b64encode(self.server.fake.audio_bytes).decode('ascii')
+        line = '[["wrb.fr","jQ1olc","[\\"%s\\"]",null,null,null,"generic"]]' % audio
+        self._send(200, (")]}'\n\n" + line + "\n").encode('utf-8'), 'application/json; charset=utf-8')
+
+
+class FakeProviders:
+    """Arka plan iş parçacığında çalışan sahte sağlayıcı sunucusu"""
+
+    PROVIDERS = ('openai_text', 'openai_image', 'gemini', 'cdn', 'tts')
+
+    def __init__(self, profiles=None, host='127.0.0.1', port=0, image_size=1024, audio_bytes=12000, seed=None):
+        self.profiles = {name: ProviderProfile() for name in self.PROVIDERS}
+        self.profiles.update(profiles or {})
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.serial = itertools.count(1)
+        self.calls = dict.fromkeys(self.PROVIDERS, 0)
+        self.errors = dict.fromkeys(self.PROVIDERS, 0)
+        self.image_bytes = render_fake_image(image_size)
+        # gTTS parça başına ~100 karakter gönderir; yaklaşık 6 sn'lik MP3 boyutu
+        self.audio_bytes = b'ID3' + bytes(self.rng.getrandbits(8) for _ in range(audio_bytes))
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 256
+        self._server.fake = self
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-providers", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {name: {'calls': self.calls[name], 'errors': self.errors[name]} for name in self.PROVIDERS}
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = dict.fromkeys(self.PROVIDERS, 0)
+            self.errors = dict.fromkeys(self.PROVIDERS, 0)
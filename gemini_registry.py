@@ -0,0 +1,188 @@
+"""
+Süreç genelinde paylaşılan Gemini model kayıt defteri.
+
+Model nesneleri ilk kullanımda (veya ısınma sırasında) bir kez oluşturulur;
+SDK bu ana kadar yüklenmez. Her modele kısa bir ısınma isteği gönderilir ve
+sağlıklı olan modeller hatırlanır. İstekler
+tercih sırasına göre ilk sağlıklı modele doğrudan gider; son isteği hata
+veren modeller sıranın sonuna alınır. Her modelin bir devre kesicisi
+vardır: art arda hata veren modelin devresi açılır ve model bekleme süresi
+dolup tek bir deneme isteği başarılı olana kadar hiç çağrılmaz.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+from circuit_breaker import CLOSED, CircuitBreaker
+
+logger = logging.getLogger("masal_app")
+
+# Tercih sırasına göre Gemini modelleri
+GEMINI_MODEL_CHAIN = (
+    "models/gemini-2.0-flash-001",
+    "models/gemini-2.0-flash-lite-001",
+    "models/gemini-1.5-pro",
+)
+
+
+class GeminiModelEntry:
+    """Tek bir modelin nesnesi ve sağlık bilgisi"""
+
+    def __init__(self, name, breaker):
+        self.name = name
+        self.model = None
+        self.healthy = False
+        self.last_error = None
+        self.probe_latency = None
+        self.breaker = breaker
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'loaded': self.model is not None,
+            'healthy': self.healthy,
+            'last_error': self.last_error,
+            'probe_latency': self.probe_latency,
+            'circuit': self.breaker.state
+        }
+
+
+class GeminiModelRegistry:
+    """Hazır Gemini model nesnelerini ve sağlık durumlarını tutar"""
+
+    def __init__(self, model_names=GEMINI_MODEL_CHAIN, model_factory=None, retry_interval=60, probe_prompt="Merhaba", breakers=None):
+        """breakers verilmezse her model ilk hatada retry_interval saniyeliğine devre dışı kalır"""
+        self.retry_interval = retry_interval
+        self.probe_prompt = probe_prompt
+        self._model_factory = model_factory
+        self._entries = [
+            GeminiModelEntry(name, breakers.get(f"model:{name}") if breakers else CircuitBreaker(name, failure_threshold=1, reset_timeout=retry_interval))
+            for name in model_names
+        ]
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._built = False
+
+    @property
+    def configured(self):
+        """Kayıt defterinde denenecek model var mı (API anahtarı yoksa boş oluşturulur)"""
+        return bool(self._entries)
+
+    def build(self):
+        """Model nesnelerini oluşturur; oluşturulamayanlar sağlıksız işaretlenir"""
+        factory = self._model_factory
+        if factory is None:
+            import google.generativeai as genai
+            factory = genai.GenerativeModel
+
+        for entry in self._entries:
+            try:
+                entry.model = factory(entry.name)
+                entry.healthy = True
+                logger.info(f"{entry.name} modeli başarıyla yüklendi")
+            except Exception as e:
+                entry.healthy = False
+                entry.last_error = str(e)
+                logger.warning(f"{entry.name} modeli yüklenemedi: {str(e)}")
+        self._built = True
+        return self
+
+    def _ensure_built(self):
+        """Modeller henüz oluşturulmadıysa ilk kullanımda oluşturur"""
+        if self._built or not self._entries:
+            return
+        with self._build_lock:
+            if not self._built:
+                self.build()
+
+    def warm_up(self):
+        """Her modele kısa bir deneme isteği göndererek sağlık durumunu belirler"""
+        self._ensure_built()
+        for entry in self._entries:
+            if entry.model is None:
+                continue
+            started = time.time()
+            try:
+                entry.model.generate_content(self.probe_prompt, generation_config={"max_output_tokens": 1})
+                entry.probe_latency = round(time.time() - started, 3)
+                self.report_success(entry.name)
+                logger.info(f"{entry.name} ısınma isteği başarılı ({entry.probe_latency} sn)")
+            except Exception as e:
+                self.report_failure(entry.name, e)
+                logger.warning(f"{entry.name} ısınma isteği başarısız: {str(e)}")
+
+    def start_warm_up(self):
+        """Isınma isteklerini uygulama başlangıcını bekletmeden arka planda çalıştırır"""
+        thread = threading.Thread(target=self.warm_up, name="gemini-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def candidates(self):
+        """
+        Denenecek modelleri sırayla döndürür: önce sağlıklılar, sonra son isteği
+        hata verenler, en sonda deneme zamanı gelmiş açık devreli modeller.
+        """
+        self._ensure_built()
+        with self._lock:
+            loaded = [entry for entry in self._entries if entry.model is not None]
+        callable_entries = [entry for entry in loaded if entry.breaker.ready()]
+        callable_entries.sort(key=lambda entry: (entry.breaker.state != CLOSED, not entry.healthy))
+        return [(entry.name, entry.model) for entry in callable_entries]
+
+    def get(self):
+        """En iyi durumdaki modeli (isim, model) olarak döndürür, hiç yoksa (tüm devreler açıksa) None"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else None
+
+    @contextlib.contextmanager
+    def guard(self, name):
+        """
+        Model çağrısını modelin devre kesicisi üzerinden çalıştırır: devre açıksa
+        CircuitOpenError fırlatır, sonucu sağlık durumuna işler.
+        """
+        entry = self._find(name)
+        with entry.breaker.guard():
+            try:
+                yield
+            except Exception as e:
+                self._set_health(entry, e)
+                raise
+            self._set_health(entry, None)
+
+    def report_success(self, name):
+        entry = self._find(name)
+        if entry:
+            self._set_health(entry, None)
+            entry.breaker.record_success()
+
+    def report_failure(self, name, error):
+        entry = self._find(name)
+        if entry:
+            self._set_health(entry, error)
+            if entry.breaker.is_failure(error):
+                entry.breaker.record_failure(error)
+
+    def status(self):
+        with self._lock:
+            return [entry.to_dict() for entry in self._entries]
+
+    def _set_health(self, entry, error):
+        """Son çağrının sonucunu kaydeder; hata yoksa model sağlıklı sayılır"""
+        with self._lock:
+            if error is None:
+                if not entry.healthy:
+                    logger.info(f"{entry.name} modeli yeniden sağlıklı olarak işaretlendi")
+                entry.healthy = True
+                entry.last_error = None
+            else:
+                entry.healthy = False
+                entry.last_error = str(error)
+
+    def _find(self, name):
+        for entry in self._entries:
+            if entry.name == name:
+                return entry
+        return None
+
@@ -0,0 +1,64 @@
+"""
+Masal üretim sunucusu yapılandırması.
+
+Kullanım:
+    gunicorn -c gunicorn.conf.py
+
+İsteklerin çoğu sağlayıcı yanıtı (Gemini/OpenAI metni, DALL-E, gTTS) bekleyerek
+geçer; bu yüzden varsayılan worker türü iş parçacıklı "gthread"tir. Bir istek
+dakikalarca sürebildiğinden worker zaman aşımı uzundur.
+
+Masal işleri (/tale_jobs) ve ön üretim grupları süreç belleğinde tutulur; iş
+durumu sorguları işi başlatan sürece gitmelidir. Bu nedenle varsayılan tek
+süreç + çok iş parçacığıdır. DALL-E hız sınırı ve masal indeksi SQLite üzerinden
+süreçler arasında paylaşılır; birden fazla süreç (WEB_CONCURRENCY) ancak
+yapışkan oturumlu (sticky) bir yük dengeleyici arkasında kullanılmalıdır.
+"""
+
+import os
+import signal
+
+wsgi_app = "app:create_app()"
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8500')}"
+
+# gthread (varsayılan) veya gevent (pip install gevent)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+# gthread: süreç başına eşzamanlı istek sayısı
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+# gevent: süreç başına eşzamanlı bağlantı sayısı
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 200))
+
+# Masal metni + görsel kuyruğu (DALLE_QUEUE_TIMEOUT) birkaç dakika sürebilir
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+# SIGTERM sonrası süren isteklerin ve masal işlerinin tamamlanması için süre
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Bellek sızıntılarına karşı isteğe bağlı periyodik worker yenileme (0: kapalı)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", None)
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    """SIGTERM geldiğinde gunicorn çıkışından önce uygulamayı kapanış moduna alır"""
+    import app as masal_app
+
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        masal_app.begin_draining()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    """Worker kapanırken çalışan masal işlerinin bitmesini bekler"""
+    import app as masal_app
+
+    # Ana süreç graceful_timeout sonunda worker'ı öldürür; biraz pay bırakılır
+    masal_app.shutdown_background_work(timeout=max(graceful_timeout - 5, 1))
@@ -0,0 +1,369 @@
+"""
+Metin isteklerinde hedging: yavaş birincil sağlayıcıya karşı yedek istek.
+
+Birincil sağlayıcı eşik süresi içinde ilk parçayı (akışta) veya sonucu
+üretmezse aynı istek ikincil sağlayıcıya da gönderilir ve iki istek
+yarışır. Kazanan, akışlı yanıtta ilk parçayı, tek parça yanıtta ilk
+kabul edilebilir metni üreten sağlayıcıdır. Diğer istek iptal edilir:
+async katmanda görev hemen iptal edilir. Eşzamanlı yarışta her yarışçı kendi
+iş parçacığında çalışır ve isteğin AbortSignal'i kesilir; sağlayıcı bir
+geri çağrı kaydettiyse (OpenAI akışı) okumada bekleyen bağlantı hemen
+kapatılır, kaydetmediyse akış bir sonraki parçada bırakılır. Takılı kalan
+kaybedenler paylaşılan bir havuzu doldurmadığı için yeni birincil istekleri
+geciktirmez. Birincil eşikten önce hata verirse yedek beklemeden başlatılır.
+
+Akış beklemeyen çağıranlar (generate) için yarışçılar sağlayıcının kendi
+generate yolunu kullanır; böylece Gemini'nin model yedeklemesi gibi
+davranışlar hedging açıkken de aynı kalır. Sağlayıcılar generate'te de
+isteğin AbortSignal'ine uyar: OpenAI yarıştırılan isteği akışla alıp
+kaybettiğinde bağlantıyı kapatır, Gemini sıradaki modeli ve kelime sayısı
+düzeltmesini denemez.
+
+Eşik sabit saniye ("4.5") veya birincilin son ilk yanıt sürelerinden bir
+yüzdelik ("p95") olabilir. Yüzdelikte yeterli ölçüm birikene kadar yedek
+istek gönderilmez. Ek maliyet ayrıca sınırlıdır: son `window` istekte en
+fazla max_ratio oranında yedek istek gönderilir. Oran görülen istek sayısına
+(en az min_budget_requests) göre hesaplanır ve yedek istek başladığı anda
+sayılır; böylece soğuk başlangıçta ve eşzamanlı isteklerde sınır aşılmaz.
+
+guard verilirse (sağlayıcı -> context manager) her yarışçının çağrısı onun
+içinde çalışır; devre kesici böylece yarıştırılan sağlayıcıları da ayrı ayrı
+izler ve devresi açık olan yarışçı hemen hata vermiş sayılır.
+"""
+
+import asyncio
+import collections
+import contextlib
+import copy
+import logging
+import math
+import queue
+import threading
+import time
+
+from providers import AbortSignal, RequestAborted, TextProvider
+
+logger = logging.getLogger("masal_app")
+
+
+def parse_hedge_after(value):
+    """
+    Eşik ayarını çözer: boş veya 0 -> None (kapalı), "p95" -> ('quantile', 0.95),
+    "4.5" -> ('fixed', 4.5)
+    """
+    value = (value or '').strip().lower()
+    if not value:
+        return None
+    if value.startswith('p'):
+        quantile = float(value[1:]) / 100
+        if not 0 < quantile < 1:
+            raise ValueError(f"Geçersiz yüzdelik: {value}")
+        return ('quantile', quantile)
+    seconds = float(value)
+    return ('fixed', seconds) if seconds > 0 else None
+
+
+class TextHedger:
+    """Metin sağlayıcılarını eşik aşıldığında yarıştırır; yedekleme oranını ve kazananları sayar"""
+
+    def __init__(self, hedge_after, max_ratio=0.1, window=200, min_samples=20, min_budget_requests=20, on_fallback=None, guard=None):
+        self.threshold = parse_hedge_after(hedge_after)
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_budget_requests = min_budget_requests
+        self.on_fallback = on_fallback
+        self.guard = guard or (lambda provider: contextlib.nullcontext())
+        self._lock = threading.Lock()
+        # Çalışan yarışçıların iptal sinyalleri (kapanışta kesilir)
+        self._active = set()
+        # Son isteklerde yedek gönderildi mi (bütçe) ve sağlayıcı başına ilk yanıt süreleri (eşik)
+        self._recent = collections.deque(maxlen=window)
+        # Sürmekte olan istekler ve yedekleri (bitince _recent'e geçer)
+        self._running = 0
+        self._running_hedges = 0
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._counters = {
+            'requests': 0, 'hedged': 0, 'primary_wins': 0, 'secondary_wins': 0,
+            'fallbacks': 0, 'budget_skips': 0, 'failed': 0
+        }
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def apply(self, chain):
+        """Etkinse zincirin ilk iki sağlayıcısını tek bir yarıştırılan sağlayıcıyla değiştirir"""
+        if not self.enabled or len(chain) < 2:
+            return chain
+        return [HedgedTextProvider(self, chain[0], chain[1])] + list(chain[2:])
+
+    def hedge_delay(self, provider_name):
+        """Birincil sağlayıcı için yedek isteğin gönderileceği süre; None ise yedek gönderilmez"""
+        kind, value = self.threshold
+        if kind == 'fixed':
+            return value
+        with self._lock:
+            samples = sorted(self._latencies[provider_name])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[max(0, math.ceil(value * len(samples)) - 1)]
+
+    def _record_latency(self, provider_name, seconds):
+        with self._lock:
+            self._latencies[provider_name].append(seconds)
+
+    def _begin(self):
+        with self._lock:
+            self._running += 1
+
+    def _try_hedge(self):
+        """Bütçe izin veriyorsa yedek isteği sayar ve True döndürür"""
+        with self._lock:
+            # Süren istekler ve yedekleri de sayılır; az istek görülmüşken oran en az min_budget_requests üzerinden hesaplanır
+            seen = max(len(self._recent) + self._running, self.min_budget_requests)
+            if sum(self._recent) + self._running_hedges + 1 > self.max_ratio * seen:
+                self._counters['budget_skips'] += 1
+                return False
+            self._running_hedges += 1
+            self._counters['hedged'] += 1
+            return True
+
+    def _finish(self, hedged, outcome):
+        with self._lock:
+            self._running -= 1
+            self._running_hedges -= hedged
+            self._recent.append(hedged)
+            self._counters['requests'] += 1
+            self._counters[outcome] += 1
+
+    def _fallback(self, primary, secondary, error):
+        logger.warning(f"{primary.name} ile masal metni oluşturulamadı, {secondary.name} denenecek: {str(error)}")
+        with self._lock:
+            self._counters['fallbacks'] += 1
+        if self.on_fallback:
+            self.on_fallback(primary.name, secondary.name)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            recent = list(self._recent)
+            names = list(self._latencies)
+        stats['hedge_rate'] = round(stats['hedged'] / stats['requests'], 4) if stats['requests'] else 0.0
+        stats['recent_hedge_rate'] = round(sum(recent) / len(recent), 4) if recent else 0.0
+        stats['thresholds'] = {name: self.hedge_delay(name) for name in names} if self.enabled else {}
+        return stats
+
+    def shutdown(self):
+        """Çalışan yarışçıları keser; iş parçacıkları daemon olduğu için beklenmez"""
+        with self._lock:
+            active = list(self._active)
+        for abort in active:
+            abort.abort()
+
+    def _run_racer(self, provider, request, commit_on_first, events):
+        """Sağlayıcının olaylarını kendi iş parçacığında okur; iptal edilirse akışı bırakır"""
+        abort = request.abort
+        with self._lock:
+            self._active.add(abort)
+        try:
+            with self.guard(provider), abort.checked():
+                stream = provider.stream(request) if commit_on_first else _generate_events(provider, request)
+                try:
+                    while not abort.is_set():
+                        try:
+                            event, payload = next(stream)
+                        except StopIteration:
+                            break
+                        events.put((provider.name, event, payload))
+                        if event == 'final':
+                            break
+                    else:
+                        raise RequestAborted()
+                finally:
+                    stream.close()
+        except RequestAborted:
+            return
+        except Exception as e:
+            events.put((provider.name, 'error', e))
+            return
+        finally:
+            with self._lock:
+                self._active.discard(abort)
+        events.put((provider.name, 'done', None))
+
+    def race(self, primary, secondary, request, commit_on_first):
+        """
+        İki sağlayıcıyı yarıştırır ve kazananın olaylarını üretir.
+
+        commit_on_first True ise akışlar yarışır ve ilk parçayı üreten kazanır;
+        değilse sağlayıcıların generate çağrıları yarışır, ilk sonucu veren
+        kazanır ve yalnızca 'final' olayı üretilir.
+        """
+        events = queue.Queue()
+        cancels = {}
+        started_at = {}
+
+        def start(provider):
+            # Her yarışçı kendi iptal sinyaliyle ve paylaşılan bir havuz yerine kendi iş parçacığında çalışır
+            racer_request = copy.copy(request)
+            racer_request.abort = cancels[provider.name] = AbortSignal()
+            started_at[provider.name] = time.monotonic()
+            threading.Thread(
+                target=self._run_racer, args=(provider, racer_request, commit_on_first, events),
+                name=f"text-hedge-{provider.name}", daemon=True
+            ).start()
+
+        self._begin()
+        start(primary)
+        delay = self.hedge_delay(primary.name)
+        hedged = False
+        responded = set()
+        pending = {primary.name}
+        winner = None
+        last_error = None
+        outcome = 'failed'
+        try:
+            while True:
+                timeout = None
+                if delay is not None and secondary.name not in cancels and primary.name not in responded:
+                    timeout = max(0.0, started_at[primary.name] + delay - time.monotonic())
+                try:
+                    name, event, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    if self._try_hedge():
+                        hedged = True
+                        logger.info(f"{primary.name} {delay:.2f} sn içinde yanıt vermedi, {secondary.name} ile yarıştırılıyor")
+                        start(secondary)
+                        pending.add(secondary.name)
+                    else:
+                        delay = None
+                    continue
+
+                if event in ('error', 'done'):
+                    pending.discard(name)
+                    last_error = payload if event == 'error' else ValueError(f"{name} akışı sonuç üretmeden bitti")
+                    if name == winner:
+                        raise last_error
+                    if name == primary.name and secondary.name not in cancels:
+                        self._fallback(primary, secondary, last_error)
+                        start(secondary)
+                        pending.add(secondary.name)
+                    elif not pending:
+                        raise last_error
+                    continue
+
+                if name not in responded:
+                    responded.add(name)
+                    self._record_latency(name, time.monotonic() - started_at[name])
+                if winner is None and (commit_on_first or event == 'final'):
+                    winner = name
+                    outcome = 'primary_wins' if name == primary.name else 'secondary_wins'
+                    request.produced_by = primary if name == primary.name else secondary
+                    for other, abort in cancels.items():
+                        if other != name:
+                            abort.abort()
+                            if other not in responded:
+                                # Yanıt vermeden iptal edilen isteğin süresi en az bu kadardır
+                                self._record_latency(other, time.monotonic() - started_at[other])
+                            if hedged:
+                                logger.info(f"Yarışı {name} kazandı, {other} iptal edildi")
+                if name == winner:
+                    yield event, payload
+                    if event == 'final':
+                        return
+        finally:
+            for abort in cancels.values():
+                abort.abort()
+            self._finish(hedged, outcome)
+
+    async def race_async(self, primary, secondary, request):
+        """race'in async karşılığı: generate_async çağrılarını yarıştırır, kaybedeni hemen iptal eder"""
+        started_at = {}
+        tasks = {}
+
+        async def guarded(provider):
+            with self.guard(provider):
+                return await provider.generate_async(request)
+
+        def start(provider):
+            started_at[provider.name] = time.monotonic()
+            tasks[asyncio.ensure_future(guarded(provider))] = provider
+
+        self._begin()
+        start(primary)
+        delay = self.hedge_delay(primary.name)
+        hedged = False
+        last_error = None
+        outcome = 'failed'
+        try:
+            while tasks:
+                timeout = None
+                if delay is not None and secondary.name not in started_at:
+                    timeout = max(0.0, started_at[primary.name] + delay - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._try_hedge():
+                        hedged = True
+                        logger.info(f"{primary.name} {delay:.2f} sn içinde yanıt vermedi, {secondary.name} ile yarıştırılıyor (async)")
+                        start(secondary)
+                    else:
+                        delay = None
+                    continue
+
+                for task in done:
+                    provider = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        if provider is primary and secondary.name not in started_at:
+                            self._fallback(primary, secondary, e)
+                            start(secondary)
+                        continue
+                    outcome = 'primary_wins' if provider is primary else 'secondary_wins'
+                    request.produced_by = provider
+                    now = time.monotonic()
+                    self._record_latency(provider.name, now - started_at[provider.name])
+                    for other in tasks.values():
+                        # İptal edilen isteğin süresi en az bu kadardır
+                        self._record_latency(other.name, now - started_at[other.name])
+                        logger.info(f"Yarışı {provider.name} kazandı, {other.name} iptal edildi (async)")
+                    return result
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._finish(hedged, outcome)
+
+
+def _generate_events(provider, request):
+    """generate sonucunu tek 'final' olayı olarak üretir"""
+    yield 'final', provider.generate(request)
+
+
+class HedgedTextProvider(TextProvider):
+    """İki metin sağlayıcısının yarıştırılmış hali; sağlayıcı zincirinde ikisinin yerini alır"""
+
+    def __init__(self, hedger, primary, secondary):
+        self.hedger = hedger
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"{primary.name}+{secondary.name}"
+
+    def is_available(self):
+        return self.primary.is_available() and self.secondary.is_available()
+
+    def model_name(self):
+        return self.primary.model_name()
+
+    def generate(self, request):
+        for event, text in self.hedger.race(self.primary, self.secondary, request, commit_on_first=False):
+            if event == 'final':
+                return text
+        raise ValueError("Yarıştırılan sağlayıcılar sonuç üretmedi")
+
+    def stream(self, request):
+        yield from self.hedger.race(self.primary, self.secondary, request, commit_on_first=True)
+
+    async def generate_async(self, request):
+        return await self.hedger.race_async(self.primary, self.secondary, request)
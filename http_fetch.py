@@ -0,0 +1,125 @@
+"""
+Uzak adreslerden bayt indirmek için paylaşılan HTTP bileşeni.
+
+Tek bir requests.Session üzerinden bağlantı havuzu ve keep-alive kullanılır;
+böylece aynı CDN'e giden ardışık indirmeler TLS el sıkışmasını tekrar etmez.
+Her sunucu için eşzamanlı indirme sayısı sınırlıdır, bağlantı/okuma süre
+sınırları ve toplam süre sınırı vardır, yanıt boyutu üst sınırı aşılırsa
+indirme kesilir. İndirmeler bellekte veya doğrudan diske akıtılarak yapılabilir.
+requests ve oturum ilk indirmede oluşturulur; uygulama açılışında yüklenmez.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("masal_app")
+
+
+class FetchError(IOError):
+    """İndirme başarısız oldu (HTTP hatası, süre aşımı veya boyut sınırı)"""
+
+
+class HttpFetcher:
+    """Bağlantı havuzlu, sunucu başına sınırlı, süre ve boyut korumalı indirici"""
+
+    def __init__(self, pool_size=20, per_host_limit=4, connect_timeout=5, read_timeout=30,
+                 total_timeout=120, max_bytes=20 * 1024 * 1024, chunk_size=64 * 1024):
+        self.per_host_limit = per_host_limit
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.pool_size = pool_size
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        """Bağlantı havuzlu paylaşılan oturum; requests ilk kullanımda yüklenir"""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _stream(self, url, max_bytes):
+        """Yanıt gövdesini parça parça üretir; sınırlar aşılırsa FetchError yükseltir"""
+        import requests
+
+        max_bytes = max_bytes or self.max_bytes
+        started = time.monotonic()
+        with self._host_semaphore(url):
+            try:
+                response = self.session.get(
+                    url, stream=True, timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except requests.RequestException as e:
+                raise FetchError(f"İndirme başarısız ({url[:60]}): {e}") from e
+
+            with response:
+                if response.status_code >= 400:
+                    raise FetchError(f"İndirme başarısız ({url[:60]}): HTTP {response.status_code}")
+
+                content_length = response.headers.get('Content-Length')
+                if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                    raise FetchError(f"Yanıt çok büyük ({content_length} bytes): {url[:60]}")
+
+                received = 0
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        received += len(chunk)
+                        if received > max_bytes:
+                            raise FetchError(f"Yanıt {max_bytes} bytes sınırını aştı: {url[:60]}")
+                        if time.monotonic() - started > self.total_timeout:
+                            raise FetchError(f"İndirme {self.total_timeout} sn içinde bitmedi: {url[:60]}")
+                        yield chunk
+                except requests.RequestException as e:
+                    raise FetchError(f"İndirme yarıda kaldı ({url[:60]}): {e}") from e
+
+    def fetch(self, url, max_bytes=None):
+        """Adresin içeriğini bayt olarak döndürür"""
+        return b''.join(self._stream(url, max_bytes))
+
+    def fetch_to_file(self, url, path, max_bytes=None):
+        """
+        İçeriği belleğe almadan dosyaya akıtır.
+
+        Önce aynı dizinde geçici dosyaya yazılır, tamamlanınca atomik olarak
+        yerine taşınır; yarım indirme hedef yolda hiçbir zaman görünmez.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in self._stream(url, max_bytes):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return size
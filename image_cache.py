@@ -0,0 +1,208 @@
+"""
+Üretilen illüstrasyonlar için içerik adresli disk önbelleği.
+
+Anahtar; model, boyut, stil, kalite ve sağlayıcıya giden son promptun
+SHA-256 özetidir. Aynı prompt tekrar istendiğinde (yeniden denemeler,
+yeniden oluşturulan sayfalar, sabit güvenli prompt) görsel diskten
+milisaniyeler içinde döner. Toplam boyut sınırı aşılınca en uzun süredir
+kullanılmayan dosyalar, boyut sınırın %90'ına inene kadar silinir (LRU,
+bellekteki kullanım sırasına göre; bkz. lru_files).
+
+Aynı sınıf, anahtarı görsel baytlarının kendi özeti olan teslim deposu
+olarak da kullanılır (put_content); bu görseller /images/<özet> adresinden
+değişmez önbellek başlıklarıyla sunulur.
+
+InFlightRequests, önbellekte henüz olmayan bir anahtar için süren üretimi
+aynı anahtarı isteyenlerle paylaştırır; aynı görsel için sağlayıcıya iki
+kez ödeme yapılmaz.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from lru_files import LruFileIndex
+
+logger = logging.getLogger("masal_app")
+
+
+class ImageCache:
+    """Boyut sınırlı, LRU tahliyeli, isabet/ıskalama sayan görsel önbelleği"""
+
+    def __init__(self, directory, max_bytes, extension='.png'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._files = LruFileIndex(directory, extension, max_bytes)
+        logger.info(f"Görsel önbelleği hazır: {directory} ({self._files.total_bytes} bytes)")
+
+    @staticmethod
+    def make_key(model, size, style, quality, prompt):
+        """Görsel isteğinin parametrelerinden önbellek anahtarı oluşturur"""
+        payload = json.dumps([model, size, style, quality, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_key(data):
+        """Görsel baytlarının kendisinden içerik adresi oluşturur"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_valid_key(key):
+        return len(key) == 64 and all(c in '0123456789abcdef' for c in key)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.extension)
+
+    def contains(self, key):
+        """İsabet/ıskalama saymadan kaydın var olup olmadığını döndürür"""
+        return os.path.exists(self._path(key))
+
+    def locate(self, key):
+        """Kayıt varsa dosya yolunu döndürür (dosyayı belleğe okumadan), yoksa None"""
+        path = self._path(key)
+        try:
+            # LRU için son kullanım zamanını güncelle
+            os.utime(path, None)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._files.touch(path)
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get(self, key):
+        """Önbellekte varsa görsel baytlarını döndürür, yoksa None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # LRU için son kullanım zamanını güncelle
+            os.utime(path, None)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._files.touch(path)
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Görseli atomik olarak yazar ve gerekirse eski kayıtları tahliye eder"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._added(path, len(data))
+
+    def put_from(self, key, write_file):
+        """
+        Kaydı write_file(yol) ile doğrudan önbellek dosyasına yazdırır (ör. indirmeyi diske akıtmak için).
+
+        write_file dosyayı atomik olarak oluşturmalı ve yazılan bayt sayısını döndürmelidir.
+        Dosyanın yolunu döndürür.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._added(path, write_file(path))
+        return path
+
+    def put_content(self, data):
+        """Görseli kendi özetiyle saklar ve anahtarı döndürür"""
+        key = self.content_key(data)
+        if not os.path.exists(self._path(key)):
+            self.put(key, data)
+        else:
+            os.utime(self._path(key), None)
+            self._files.touch(self._path(key))
+        return key
+
+    def _added(self, path, size):
+        """Yazılan kaydı LRU dizinine ekler; sınır aşıldıysa eski kayıtlar tahliye edilir"""
+        evicted = self._files.add(path, size)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+            logger.info(f"Görsel önbelleği tahliye sonrası boyut: {self._files.total_bytes} bytes")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self._files.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class InFlightRequests:
+    """Anahtar başına süren üretimler; aynı anahtarı isteyenler üretimi yapan isteğin sonucunu bekler"""
+
+    def __init__(self):
+        self.joined = 0
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def get(self, key):
+        """Anahtar için süren üretimin Future'ı, yoksa None"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.joined += 1
+            return future
+
+    def begin(self, key):
+        """
+        Üretimi üstlenmeye çalışır: (future, True) döndürürse üretim çağırana
+        aittir ve sonucu finish ile bildirmelidir; (future, False) ise başka
+        bir istek aynı anahtarı üretiyordur ve future onun sonucudur.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.joined += 1
+                return future, False
+            future = self._futures[key] = Future()
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        """Üretimi bitirir ve bekleyenlere sonucu (veya hatayı) iletir"""
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error if isinstance(error, Exception) else RuntimeError("Üretim yarıda kesildi"))
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._futures), 'joined': self.joined}
@@ -0,0 +1,101 @@
+"""
+Görsel dönüştürme ve çok çözünürlüklü türev üretimi.
+
+DALL-E'den gelen 1-3 MB'lık PNG görseller; geçmiş küçük resimleri (thumb),
+masal okuyucu (reader) ve Word çıktısı (print) için farklı genişliklerde
+WebP ve progresif JPEG türevlerine dönüştürülür. Her kullanım yeri kendi
+ihtiyacına uygun boyutu seçer.
+
+Pillow başlangıçta değil, ilk dönüştürmede yüklenir (bkz. lazy_imports).
+"""
+
+import io
+import logging
+
+logger = logging.getLogger("masal_app")
+
+# Türev adı -> hedef genişlik (piksel)
+VARIANT_WIDTHS = {
+    'thumb': 256,
+    'reader': 768,
+    'print': 1024,
+}
+
+# Uzantı -> (Pillow formatı, kayıt seçenekleri, MIME tipi)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}, 'image/webp'),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}, 'image/jpeg'),
+}
+
+
+def is_valid_variant(variant, fmt):
+    return variant in VARIANT_WIDTHS and fmt in VARIANT_FORMATS
+
+
+def variant_mimetype(fmt):
+    return VARIANT_FORMATS[fmt][2]
+
+
+def _resize(image, variant):
+    from PIL import Image
+
+    width = VARIANT_WIDTHS[variant]
+    # Küçük görselleri büyütme
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, fmt):
+    from PIL import Image
+
+    pil_format, options, _ = VARIANT_FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # Saydam alanları beyaz zemine oturt
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode in ('RGBA', 'LA'):
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_variant(image_data, variant, fmt):
+    """Tek bir türevi (ör. 'print', 'jpg') üretir ve baytlarını döndürür"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.load()
+        return _encode(_resize(image, variant), fmt)
+
+
+def render_variants(image_data, outputs=None):
+    """
+    İstenen türevleri görseli bir kez açarak üretir; {(türev, uzantı): bayt} döndürür.
+
+    outputs verilmezse tüm (türev, uzantı) çiftleri üretilir.
+    """
+    from PIL import Image
+
+    if outputs is None:
+        outputs = [(variant, fmt) for variant in VARIANT_WIDTHS for fmt in VARIANT_FORMATS]
+    results = {}
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.load()
+        for variant in VARIANT_WIDTHS:
+            formats = [fmt for output_variant, fmt in outputs if output_variant == variant]
+            if not formats:
+                continue
+            resized = _resize(image, variant)
+            for fmt in formats:
+                results[(variant, fmt)] = _encode(resized, fmt)
+
+    logger.debug(
+        f"Görsel türevleri üretildi: {len(image_data)} bytes -> "
+        + ", ".join(f"{variant}.{fmt}={len(data)}" for (variant, fmt), data in results.items())
+    )
+    return results
@@ -0,0 +1,55 @@
+"""
+Ağır sağlayıcı SDK'larının ilk kullanımda yüklenmesi.
+
+google.generativeai ve openai tek başlarına içe aktarılırken yarım saniyeden
+fazla sürer, gtts ve python-docx da onlarca milisaniye tutar. Uygulama bu
+modülleri başlangıçta değil, ilgili sağlayıcı ilk kez kullanıldığında yükler;
+böylece worker yeniden başlatmaları ve yeni örneklerin açılması hızlanır.
+"""
+
+import importlib
+import importlib.util
+import threading
+
+
+def is_installed(module_name):
+    """Modülün kurulu olup olmadığını modülü yüklemeden kontrol eder"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_callable(module_name, attr_name):
+    """Çağrıldığında modülü yükleyip module.attr_name(*args, **kwargs) sonucunu döndürür"""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), attr_name)(*args, **kwargs)
+
+    call.__name__ = attr_name
+    call.__doc__ = f"{module_name}.{attr_name} (ilk çağrıda yüklenir)"
+    return call
+
+
+class LazyClient:
+    """İlk öznitelik erişiminde factory() ile oluşturulan istemci vekili"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
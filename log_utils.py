@@ -0,0 +1,124 @@
+"""
+İstek yolunu yavaşlatmayan loglama yardımcıları.
+
+İstek iş parçacığı log kaydını yalnızca bir kuyruğa bırakır
+(DeferredQueueHandler); mesajın biçimlendirilmesi, dosyalara ve konsola
+yazılması QueueListener iş parçacığında yapılır. Biçimlendiriciler büyük
+argümanları (base64 görseller, tüm istek gövdesi) mesaja eklemeden önce
+kırpar; böylece tek bir log satırı megabaytlarca yer kaplayamaz.
+"""
+
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+
+# LogRecord'un kendi alanları; bunların dışındakiler extra={...} ile eklenmiş alanlardır
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def truncate(value, max_chars):
+    """Değeri metne çevirir ve max_chars karakterden uzunsa kırpar"""
+    if isinstance(value, (bytes, bytearray)):
+        text = f"<{len(value)} bytes>" if len(value) > max_chars else repr(bytes(value))
+    else:
+        text = value if isinstance(value, str) else str(value)
+    if len(text) > max_chars:
+        return f"{text[:max_chars]}…(+{len(text) - max_chars} karakter)"
+    return text
+
+
+def _truncated_message(record, max_chars):
+    """
+    Argümanları tek tek kırparak mesajı oluşturur.
+
+    Argümansız mesajlar (f-string ile hazırlanmış) bütün olarak kırpılır.
+    """
+    msg = str(record.msg)
+    args = record.args
+    if not args:
+        return truncate(msg, max_chars)
+
+    if isinstance(args, dict):
+        args = {key: truncate(value, max_chars) for key, value in args.items()}
+    else:
+        args = tuple(
+            value if isinstance(value, (int, float)) else truncate(value, max_chars)
+            for value in args
+        )
+    try:
+        return msg % args
+    except (TypeError, ValueError):
+        return f"{msg} {args}"
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Klasik metin biçimi; mesaj ve argümanlar max_chars ile sınırlıdır"""
+
+    def __init__(self, fmt=None, datefmt=None, max_chars=4000):
+        super().__init__(fmt, datefmt)
+        self.max_chars = max_chars
+
+    def format(self, record):
+        record.message = _truncated_message(record, self.max_chars)
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        text = self._style.format(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            text = f"{text}\n{record.exc_text}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Her kaydı tek satırlık JSON olarak yazar; extra alanlar da kırpılarak eklenir"""
+
+    def __init__(self, max_chars=4000):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': _truncated_message(record, self.max_chars),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else truncate(value, self.max_chars)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Kaydı biçimlendirmeden kuyruğa bırakır.
+
+    Standart QueueHandler mesajı çağıran iş parçacığında biçimlendirir; aynı
+    süreç içindeki kuyrukta buna gerek yoktur, biçimlendirme dinleyicide yapılır.
+    Yalnızca istisna metni burada oluşturulur (traceback nesnesi kuyrukta
+    yaşamasın diye). Mesaj argümanları sonradan biçimlendirildiğinden,
+    loglandıktan sonra değiştirilen nesneler argüman olarak verilmemelidir.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def start_queue_listener(target_logger, handlers, log_queue=None):
+    """Logger'ın çıktısını kuyruk üzerinden handlers'a yönlendirir; dinleyiciyi döndürür"""
+    log_queue = log_queue or queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    target_logger.addHandler(DeferredQueueHandler(log_queue))
+    listener.start()
+    return listener
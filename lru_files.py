@@ -0,0 +1,106 @@
+"""
+Disk önbellekleri için bellekte tutulan LRU dosya dizini.
+
+Dosyaların boyutları ve son kullanım sırası bellekte izlenir; tahliye
+her yazmada dizini yeniden taramaz. Sınır aşılınca boyut, sınırın altına
+(low_water oranına) inene kadar en uzun süredir kullanılmayan dosyalar
+silinir; böylece sınırdaki önbellekte her yeni yazma tekrar tahliye
+başlatmaz. Diğer süreçlerin (gunicorn işçileri) yazdıkları dosyaları da
+saymak için dizin en fazla rescan_interval saniyede bir, tahliye sırasında
+yeniden taranır. Kullanım sırası dosya değiştirilme zamanına da yazılır
+(os.utime), yeniden başlatmada ve taramada sıra korunur.
+"""
+
+import collections
+import os
+import threading
+import time
+
+
+class LruFileIndex:
+    """Bir dizindeki önbellek dosyalarının boyutu ve kullanım sırası"""
+
+    def __init__(self, directory, extension, max_bytes, low_water=0.9, rescan_interval=300):
+        self.directory = directory
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        # yol -> boyut; baştaki en uzun süredir kullanılmayan
+        self._files = collections.OrderedDict()
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        with self._lock:
+            self._rescan()
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes
+
+    def _scan(self):
+        """Dizindeki dosyaları (yol, mtime, boyut) olarak listeler"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(self.extension):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _rescan(self):
+        self._files = collections.OrderedDict(
+            (path, size) for path, _, size in sorted(self._scan(), key=lambda entry: entry[1])
+        )
+        self._total_bytes = sum(self._files.values())
+        self._scanned_at = time.monotonic()
+
+    def touch(self, path):
+        """Dosyayı en son kullanılan yapar; başka bir sürecin yazdığı dosya ise dizine ekler"""
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+                return
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        self.add(path, size)
+
+    def add(self, path, size):
+        """
+        Yazılan dosyayı kaydeder; sınır aşıldıysa eski dosyaları low_water
+        oranına inene kadar siler. Silinen dosya sayısını döndürür.
+        """
+        with self._lock:
+            self._total_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            if self._total_bytes <= self.max_bytes:
+                return 0
+            return self._evict(keep=path)
+
+    def _evict(self, keep):
+        if time.monotonic() - self._scanned_at >= self.rescan_interval:
+            self._rescan()
+            if keep in self._files:
+                self._files.move_to_end(keep)
+        target = self.max_bytes * self.low_water
+        evicted = 0
+        for path in list(self._files):
+            if self._total_bytes <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= self._files.pop(path)
+        return evicted
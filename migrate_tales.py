@@ -0,0 +1,79 @@
+"""
+Düz masal deposunu masal başına dizin düzenine taşıma aracı
+
+static/tales/all/<id>.json, <id>_image.jpg ... dosyalarını
+static/tales/all/<önek>/<id>/ dizinlerine taşır ve masal indeksini günceller.
+Uygulama çalışırken kullanılabilir: okuma tarafı her iki düzeni birlikte görür.
+Yarıda kalırsa tekrar çalıştırmak yeterlidir; taşınmış dosyalar atlanır.
+Kimliği dizin adı olamayan eski masallar taşınmaz, atlandı olarak raporlanır
+ve çıkış kodunu etkilemez.
+
+Kullanım:
+    python migrate_tales.py [--workers 8] [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import tale_store
+from tale_index import TaleIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger("masal_app")
+
+
+def migrate(root, index, workers, dry_run=False):
+    groups = tale_store.legacy_groups(root)
+    logger.info(f"Eski düzende {len(groups)} masal bulundu ({sum(len(files) for files in groups.values())} dosya)")
+    skipped = sorted(tale_id for tale_id in groups if not tale_store.is_valid_tale_id(tale_id))
+    for tale_id in skipped:
+        logger.warning(f"Geçersiz masal kimliği, taşınmadan atlandı: {tale_id!r} ({len(groups.pop(tale_id))} dosya)")
+    if dry_run or not groups:
+        return len(groups), 0
+
+    def migrate_one(tale_id, files):
+        moved = tale_store.migrate_tale(root, tale_id, files)
+        index.refresh(root, tale_id)
+        return moved
+
+    started = time.time()
+    migrated = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(migrate_one, tale_id, files): tale_id
+            for tale_id, files in groups.items()
+        }
+        for future in as_completed(futures):
+            tale_id = futures[future]
+            try:
+                future.result()
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Masal taşınamadı ({tale_id}): {e}")
+            if (migrated + failed) % 500 == 0:
+                logger.info(f"İlerleme: {migrated + failed}/{len(groups)}")
+
+    logger.info(f"{migrated} masal taşındı, {failed} hata, {len(skipped)} atlandı, süre: {time.time() - started:.1f} sn")
+    return migrated, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Masalları masal başına dizin düzenine taşır")
+    parser.add_argument("--workers", type=int, default=8, help="Paralel taşıma sayısı")
+    parser.add_argument("--dry-run", action="store_true", help="Yalnızca taşınacak masalları say")
+    args = parser.parse_args()
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    index = TaleIndex(os.getenv("TALE_INDEX_DB", os.path.join(app_dir, 'cache', 'tale_index.sqlite3')))
+
+    _, failed = migrate(tale_store.TALES_DIR, index, args.workers, args.dry_run)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
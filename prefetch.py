@@ -0,0 +1,117 @@
+"""
+Sonraki sayfalar için sunucu tarafı spekülatif ön üretim.
+
+Okuyucu bir sayfanın sesini istediğinde, sonraki bir iki sayfanın sesi
+arka planda üretilip ses deposuna yazılır; sayfa çevrildiğinde istek
+depodan döner. (Sayfa görselleri zaten masal oluşturulurken tek bir toplu
+istekle üretilir.)
+
+İşler masal bazında gruplanır. Grup açıkça iptal edildiğinde veya
+idle_timeout saniye boyunca o masal için istek gelmediğinde (masal terk
+edildi) henüz başlamamış işler atlanır, bekleyen işlerin iptal olayı
+tetiklenir. Havuz küçüktür; ön plandaki isteklerin önüne geçmez.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("masal_app")
+
+
+class _Group:
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.last_seen = time.time()
+        self.pending = set()
+
+
+class Prefetcher:
+    """Masal gruplu, tekrarsız ve iptal edilebilir arka plan ön üretim kuyruğu"""
+
+    def __init__(self, max_workers=2, idle_timeout=300):
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._groups = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._counters = {'scheduled': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'duplicates': 0}
+
+    def _expire_idle(self, now):
+        """Uzun süredir istek gelmeyen masalların işlerini iptal eder (kilit altında çağrılır)"""
+        for group_id, group in list(self._groups.items()):
+            if now - group.last_seen > self.idle_timeout:
+                group.cancel_event.set()
+                del self._groups[group_id]
+                logger.info(f"Ön üretim grubu terk edildiği için iptal edildi: {group_id}")
+
+    def touch(self, group_id):
+        """Masal için ön plan isteği geldiğini kaydeder"""
+        now = time.time()
+        with self._lock:
+            self._expire_idle(now)
+            group = self._groups.setdefault(group_id, _Group())
+            group.last_seen = now
+            return group
+
+    def schedule(self, group_id, task_key, func):
+        """
+        func(cancel_event) işini arka planda çalıştırır.
+
+        Aynı task_key için bekleyen veya çalışan bir iş varsa yeni iş eklenmez.
+        İş başlamadan grup iptal edilirse hiç çalıştırılmaz.
+        """
+        group = self.touch(group_id)
+        with self._lock:
+            if task_key in self._in_flight:
+                self._counters['duplicates'] += 1
+                return False
+            self._in_flight.add(task_key)
+            group.pending.add(task_key)
+            self._counters['scheduled'] += 1
+
+        def run():
+            try:
+                if group.cancel_event.is_set():
+                    outcome = 'cancelled'
+                    return
+                func(group.cancel_event)
+                outcome = 'cancelled' if group.cancel_event.is_set() else 'completed'
+            except Exception as e:
+                outcome = 'cancelled' if group.cancel_event.is_set() else 'failed'
+                if outcome == 'failed':
+                    logger.warning(f"Ön üretim işi başarısız ({task_key[:40]}): {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(task_key)
+                    group.pending.discard(task_key)
+                    self._counters[outcome] += 1
+
+        self._executor.submit(run)
+        return True
+
+    def cancel(self, group_id):
+        """Masalın bekleyen ön üretim işlerini iptal eder; iptal edilen iş sayısını döndürür"""
+        with self._lock:
+            group = self._groups.pop(group_id, None)
+            if group is None:
+                return 0
+            group.cancel_event.set()
+            return len(group.pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'in_flight': len(self._in_flight),
+                'groups': len(self._groups)
+            }
+
+    def shutdown(self):
+        """Tüm grupları iptal eder ve havuzu kapatır (süreç kapanırken)"""
+        with self._lock:
+            for group in self._groups.values():
+                group.cancel_event.set()
+            self._groups.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
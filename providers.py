@@ -0,0 +1,218 @@
+"""
+Metin, görsel ve ses sağlayıcıları için ortak arayüzler ve kayıt defteri.
+
+Her sağlayıcı türünün (TextProvider, ImageProvider, SpeechProvider) bir
+kayıt defteri vardır. Hangi sağlayıcıların hangi sırayla deneneceği ortam
+değişkeninden okunur (ör. TEXT_PROVIDERS=openai,gemini); istekte seçilen
+sağlayıcı (text_api, image_api) önce denenir, hata olursa sıradaki
+kullanılabilir sağlayıcıya geçilir. Listede "paket.modül:Sınıf" biçimindeki
+girdiler içe aktarılıp argümansız oluşturularak kaydedilir; böylece yeni
+bir arka uç veya yerel bir test sağlayıcısı rotalara dokunmadan eklenir.
+"""
+
+import asyncio
+import contextlib
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger("masal_app")
+
+
+class TextRequest:
+    """Masal metni isteği; word_limit modele gönderilen (düzeltilmiş) kelime sayısıdır"""
+
+    def __init__(self, prompt, character_name, character_type, setting, theme, word_limit, character_description=""):
+        self.prompt = prompt
+        self.character_name = character_name
+        self.character_type = character_type
+        self.setting = setting
+        self.theme = theme
+        self.word_limit = word_limit
+        self.character_description = character_description
+        # Yarıştırılan (hedging) isteklerde kaybedeni kesmek için AbortSignal
+        self.abort = None
+        # Metni üreten sağlayıcı (yarışta kazanan); önbellek anahtarı buna göre seçilir
+        self.produced_by = None
+
+
+class RequestAborted(BaseException):
+    """AbortSignal ile kesilen istek; devre kesici ve hata sayaçları bunu hata saymaz"""
+
+
+class AbortSignal:
+    """
+    Başka bir iş parçacığından kesilebilen isteğin iptal sinyali.
+
+    Sağlayıcı on_abort ile bekleyen bağlantıyı kapatan bir geri çağrı
+    kaydeder; bağlantının close'u okumada bekleyen iş parçacığını
+    uyandırmadığı için iptal ancak bu geri çağrıyla hemen etkili olur.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._callbacks = []
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def abort(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            # Kilit altında çağrılır: blok bittikten sonra (bağlantı havuza döndüğünde) geri çağrı çalışmaz
+            for callback in self._callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.warning(f"İstek iptal edilirken hata: {e}")
+
+    @contextlib.contextmanager
+    def on_abort(self, callback):
+        """Blok süresince iptalde callback çağrılır; sinyal zaten kesilmişse hemen çağrılır"""
+        with self._lock:
+            aborted = self._event.is_set()
+            if not aborted:
+                self._callbacks.append(callback)
+        if aborted:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+    @contextlib.contextmanager
+    def checked(self):
+        """İptalden sonra bloktan çıkan hatayı (kapatılan bağlantı) RequestAborted olarak fırlatır"""
+        try:
+            yield
+        except Exception:
+            if self.is_set():
+                raise RequestAborted() from None
+            raise
+
+
+class Provider:
+    """Tüm sağlayıcıların ortak tabanı"""
+
+    name = None
+
+    def is_available(self):
+        """Sağlayıcı yapılandırılmış mı (API anahtarı, kurulu SDK); SDK yüklemeden cevap vermeli"""
+        return True
+
+
+class TextProvider(Provider):
+    """Masal metni üretir; kelime sayısı düzeltmesi sağlayıcının sorumluluğundadır"""
+
+    def model_name(self):
+        """Metin önbelleği anahtarına giren model adı"""
+        return None
+
+    def generate(self, request):
+        raise NotImplementedError
+
+    def stream(self, request):
+        """
+        ('delta', parça) olaylarını ve en sonda ('final', metin) olayını üretir.
+
+        Akış desteği olmayan sağlayıcılar için metin tek parça halinde gönderilir.
+        """
+        text = self.generate(request)
+        yield 'delta', text
+        yield 'final', text
+
+    async def generate_async(self, request):
+        """Async karşılığı olmayan sağlayıcılar döngünün iş havuzunda çalışır"""
+        return await asyncio.to_thread(self.generate, request)
+
+
+class ImageProvider(Provider):
+    """Prompt'tan görsel baytları üretir; başarısız olursa istisna fırlatır"""
+
+    def generate(self, prompt, priority='normal', cancel_event=None):
+        raise NotImplementedError
+
+    async def generate_async(self, prompt, priority='normal', cancel_event=None):
+        return await asyncio.to_thread(self.generate, prompt, priority, cancel_event)
+
+
+class SpeechProvider(Provider):
+    """Metinden MP3 verisi üretir"""
+
+    def synthesize(self, text, lang='tr', slow=False):
+        raise NotImplementedError
+
+
+def load_provider(spec):
+    """"paket.modül:Sınıf" biçimindeki sağlayıcıyı içe aktarıp oluşturur"""
+    module_name, _, attr_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attr_name)()
+
+
+class ProviderRegistry:
+    """Bir sağlayıcı türünün kayıtlı sağlayıcıları ve deneme sırası"""
+
+    def __init__(self, kind, base_class):
+        self.kind = kind
+        self.base_class = base_class
+        self._providers = {}
+        self.order = []
+
+    def register(self, provider):
+        if not isinstance(provider, self.base_class):
+            raise TypeError(f"{provider!r} bir {self.base_class.__name__} değil")
+        self._providers[provider.name] = provider
+        return provider
+
+    def get(self, name):
+        return self._providers.get(name)
+
+    def names(self):
+        return list(self._providers)
+
+    def configure(self, order):
+        """
+        Deneme sırasını ayarlar; ':' içeren girdiler yüklenip kaydedilir.
+
+        Bilinmeyen veya yüklenemeyen girdiler loglanıp atlanır.
+        """
+        names = []
+        for entry in (item.strip() for item in order if item.strip()):
+            if ':' in entry:
+                try:
+                    entry = self.register(load_provider(entry)).name
+                except Exception as e:
+                    logger.error(f"{self.kind} sağlayıcısı yüklenemedi ({entry}): {e}")
+                    continue
+            if entry not in self._providers:
+                logger.error(f"Bilinmeyen {self.kind} sağlayıcısı: {entry}")
+                continue
+            if entry not in names:
+                names.append(entry)
+        self.order = names
+        return self
+
+    def available(self):
+        """Sıradaki kullanılabilir sağlayıcılar"""
+        return [self._providers[name] for name in self.order if self._providers[name].is_available()]
+
+    def chain(self, preferred=None):
+        """
+        Denenecek sağlayıcılar: istenen sağlayıcı (kayıtlı ve kullanılabilirse) önce,
+        ardından yapılandırılmış sıradaki diğer kullanılabilir sağlayıcılar. Sırada
+        olmayan (ortam değişkeniyle kapatılmış) sağlayıcı istense de kullanılmaz.
+        """
+        providers = self.available()
+        first = self._providers.get(preferred)
+        if first in providers:
+            providers = [first] + [provider for provider in providers if provider is not first]
+        return providers
+
+    def describe(self):
+        """/capabilities için: kayıtlı sağlayıcı adı -> sırada ve kullanılabilir mi"""
+        return {name: name in self.order and provider.is_available() for name, provider in self._providers.items()}
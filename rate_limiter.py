@@ -0,0 +1,264 @@
+"""
+Süreçler arası paylaşılan token bucket hız sınırlayıcı.
+
+Kova durumu ve bekleme kuyruğu bir SQLite dosyasında tutulur; böylece aynı
+makinedeki tüm worker süreçleri ve thread'leri tek bir kotayı paylaşır.
+Bekleyen istekler öncelik şeridine (high/normal/low) ve geliş sırasına göre
+adil şekilde sıraya girer. Sabit süreli uyku yoktur: her bekleyen, sırasının
+ve tokenın ne zaman hazır olacağını hesaplayıp yalnızca o kadar bekler.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("masal_app")
+
+PRIORITIES = {
+    'high': 0,
+    'normal': 1,
+    'low': 2,
+}
+
+
+class TokenBucketLimiter:
+    """SQLite üzerinde kalıcı, FIFO kuyruklu ve öncelik şeritli token bucket"""
+
+    def __init__(self, db_path, name, rate_per_minute=5, capacity=1, ticket_ttl=120, max_wait_step=1.0):
+        self.db_path = db_path
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.ticket_ttl = ticket_ttl
+        self.max_wait_step = max_wait_step
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, bucket TEXT NOT NULL,"
+            " priority INTEGER NOT NULL, enqueued_at REAL NOT NULL, heartbeat REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tickets_order ON tickets (bucket, priority, id)")
+        conn.execute(
+            "INSERT OR IGNORE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+            (self.name, float(self.capacity), time.time())
+        )
+
+    def _refill(self, conn, now):
+        tokens, updated_at = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        tokens = min(float(self.capacity), tokens + max(0.0, now - updated_at) * self.rate)
+        conn.execute("UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name))
+        return tokens
+
+    def _enqueue(self, priority):
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT INTO tickets (bucket, priority, enqueued_at, heartbeat) VALUES (?, ?, ?, ?)",
+            (self.name, PRIORITIES[priority], now, now)
+        )
+        return cursor.lastrowid
+
+    def _dequeue(self, ticket):
+        self._connection().execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+        self._notify()
+
+    def _try_take(self, ticket, priority):
+        """Sıra bu bilette ve token varsa tüketir; 0 ya da tahmini bekleme süresini döndürür"""
+        conn = self._connection()
+        now = time.time()
+        level = PRIORITIES[priority]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Çöken süreçlerden kalan biletleri temizle; bu bilet hâlâ bekleniyor
+            conn.execute(
+                "DELETE FROM tickets WHERE bucket = ? AND heartbeat < ? AND id != ?",
+                (self.name, now - self.ticket_ttl, ticket)
+            )
+            updated = conn.execute("UPDATE tickets SET heartbeat = ? WHERE id = ?", (now, ticket)).rowcount
+            if not updated:
+                # Süreç ticket_ttl'den uzun durakladıysa bilet başka bir süreçte
+                # temizlenmiş olabilir; aynı kimlikle (sırası korunarak) geri eklenir
+                conn.execute(
+                    "INSERT INTO tickets (id, bucket, priority, enqueued_at, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                    (ticket, self.name, level, now, now)
+                )
+            tokens = self._refill(conn, now)
+
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM tickets WHERE bucket = ? AND (priority < ? OR (priority = ? AND id < ?))",
+                (self.name, level, level, ticket)
+            ).fetchone()[0]
+
+            if ahead == 0 and tokens >= 1.0:
+                conn.execute("UPDATE buckets SET tokens = ? WHERE name = ?", (tokens - 1.0, self.name))
+                conn.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+                conn.execute("COMMIT")
+                return 0.0
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Öndeki her bilet bir token tüketecek; bu bilete sıra gelene kadarki süre
+        return max(0.0, (ahead + 1.0 - tokens) / self.rate)
+
+    def _notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _poll(self, ticket, priority, deadline, cancel_event):
+        """
+        acquire ve acquire_async'in ortak adımı (SQLite'a dokunur, bloklayabilir).
+
+        Token alınırsa (True, None), zaman aşımı veya iptalde (False, None),
+        aksi halde (False, beklenecek süre) döndürür.
+        """
+        wait = self._try_take(ticket, priority)
+        if wait == 0:
+            return True, None
+
+        if cancel_event is not None and cancel_event.is_set():
+            return False, None
+
+        step = min(wait, self.max_wait_step)
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.warning(f"{self.name} hız sınırı kuyruğunda zaman aşımı ({priority})")
+                return False, None
+            step = min(step, remaining)
+        return False, step
+
+    def acquire(self, priority='normal', timeout=None, cancel_event=None):
+        """
+        Sırası geldiğinde bir token alır.
+
+        Token alınırsa True, zaman aşımı veya iptal durumunda False döner.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Geçersiz öncelik: {priority}")
+
+        deadline = time.time() + timeout if timeout is not None else None
+        ticket = self._enqueue(priority)
+        taken = False
+        try:
+            while True:
+                taken, step = self._poll(ticket, priority, deadline, cancel_event)
+                if step is None:
+                    return taken
+
+                # Aynı süreçte bir bilet kuyruktan çıktığında erken uyan
+                with self._wakeup:
+                    self._wakeup.wait(step)
+        finally:
+            if not taken:
+                self._dequeue(ticket)
+
+    async def acquire_async(self, priority='normal', timeout=None, cancel_event=None):
+        """
+        acquire ile aynı kuyruk; beklerken iş parçacığı yerine olay döngüsünü bırakır.
+
+        SQLite adımları (BEGIN IMMEDIATE ve 30 sn'lik meşgul bekleme süresi)
+        olay döngüsünü durdurmamak için iş parçacığı havuzunda çalışır. Async
+        bekleyenler aynı süreçteki bildirimle erken uyanamaz, en fazla
+        max_wait_step saniyede bir sıralarını yeniden kontrol ederler.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Geçersiz öncelik: {priority}")
+
+        deadline = time.time() + timeout if timeout is not None else None
+        ticket = await asyncio.to_thread(self._enqueue, priority)
+        taken = False
+        try:
+            while True:
+                taken, step = await asyncio.to_thread(self._poll, ticket, priority, deadline, cancel_event)
+                if step is None:
+                    return taken
+                await asyncio.sleep(step)
+        finally:
+            if not taken:
+                await asyncio.to_thread(self._dequeue, ticket)
+
+    def try_acquire(self):
+        """Kuyrukta bekleyen yoksa ve token varsa hemen alır; beklemez"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = self._refill(conn, now)
+            waiting = conn.execute(
+                "SELECT COUNT(*) FROM tickets WHERE bucket = ? AND heartbeat >= ?",
+                (self.name, now - self.ticket_ttl)
+            ).fetchone()[0]
+            if waiting == 0 and tokens >= 1.0:
+                conn.execute("UPDATE buckets SET tokens = ? WHERE name = ?", (tokens - 1.0, self.name))
+                conn.execute("COMMIT")
+                return True
+            conn.execute("COMMIT")
+            return False
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def penalize(self, seconds):
+        """Sağlayıcıdan 429 gelince kovayı boşaltıp verilen süre kadar yeni token verilmesini geciktirir"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = self._refill(conn, now)
+            tokens = min(tokens, 0.0) - seconds * self.rate
+            conn.execute("UPDATE buckets SET tokens = ? WHERE name = ?", (tokens, self.name))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"{self.name} hız sınırı kovası {seconds} saniye için boşaltıldı")
+
+    def status(self):
+        conn = self._connection()
+        now = time.time()
+        tokens, updated_at = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        tokens = min(float(self.capacity), tokens + max(0.0, now - updated_at) * self.rate)
+        lanes = {
+            name: conn.execute(
+                "SELECT COUNT(*) FROM tickets WHERE bucket = ? AND priority = ?", (self.name, level)
+            ).fetchone()[0]
+            for name, level in PRIORITIES.items()
+        }
+        return {
+            'name': self.name,
+            'tokens': round(tokens, 3),
+            'capacity': self.capacity,
+            'rate_per_minute': round(self.rate * 60, 3),
+            'waiting': lanes
+        }
@@ -34,6 +34,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const MAX_HISTORY = 5;
     const MAX_FAVORITES = 5;
     const WORDS_PER_PAGE = 50;
+    const TALE_JOB_POLL_INTERVAL = 1000; // Masal işi durum sorgulama aralığı (ms)
+    const PREFETCH_AHEAD = 2; // Sunucunun arka planda hazırlayacağı sonraki sayfa sayısı
+    let prefetchGroupId = null; // Açık masalın sunucu tarafı ön üretim grubu
     
     // Debug fonksiyonları
     window.debugMode = false;
@@ -138,6 +141,24 @@ document.addEventListener('DOMContentLoaded', function() {
     themeToggleBtn.addEventListener('click', toggleTheme);
     themeToggleTale.addEventListener('click', toggleTheme);
     
+    // Açık masalın bekleyen sunucu tarafı ön üretimlerini iptal et
+    function cancelPrefetchGroup() {
+        if (!prefetchGroupId) {
+            return;
+        }
+        const payload = new Blob([JSON.stringify({ tale_id: prefetchGroupId })], { type: 'application/json' });
+        navigator.sendBeacon('/prefetch/cancel', payload);
+        prefetchGroupId = null;
+    }
+    
+    // Yeni açılan masal için ön üretim grubu başlat (öncekini iptal ederek)
+    function startPrefetchGroup() {
+        cancelPrefetchGroup();
+        prefetchGroupId = `${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+    }
+    
+    window.addEventListener('pagehide', cancelPrefetchGroup);
+    
     // Sayfa geçişleri
     function showSettingsPage() {
         log('Ayarlar sayfasına geçiliyor...');
@@ -324,6 +345,56 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // Masal oluşturma işini başlat ve metin ile ilk görsel hazır olana kadar durumunu sorgula
+    async function runTaleJob(formData) {
+        const startResponse = await fetch('/tale_jobs', {
+            method: 'POST',
+            body: formData
+        });
+        
+        if (!startResponse.ok) {
+            const errorText = await startResponse.text();
+            log('API yanıtı hatalı', {
+                status: startResponse.status,
+                statusText: startResponse.statusText,
+                errorText: errorText
+            });
+            throw new Error(`API yanıtı başarısız (${startResponse.status}): ${errorText}`);
+        }
+        
+        const { job_id } = await startResponse.json();
+        log(`Masal işi oluşturuldu: ${job_id}`);
+        
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, TALE_JOB_POLL_INTERVAL));
+            
+            const statusResponse = await fetch(`/tale_jobs/${job_id}`);
+            if (!statusResponse.ok) {
+                throw new Error(`Masal işi durumu alınamadı (${statusResponse.status})`);
+            }
+            
+            const job = await statusResponse.json();
+            const textStage = job.stages.text;
+            const imageStage = job.stages.image;
+            
+            if (job.status === 'error' || textStage.status === 'error') {
+                throw new Error(job.error || textStage.error || 'Masal oluşturulamadı');
+            }
+            
+            if (textStage.status === 'loading') {
+                updateProgressStatus('text', 'loading');
+            }
+            
+            // Metin ve ilk sayfa görseli hazır olduğunda sonucu döndür
+            if (textStage.status === 'complete' && ['complete', 'error', 'skipped'].includes(imageStage.status)) {
+                return {
+                    ...job.result,
+                    image_url: job.result.image_url || 'static/img/default-tale.jpg'
+                };
+            }
+        }
+    }
+    
     // Form gönderildiğinde AJAX ile işlem yapma
     generateForm.addEventListener('submit', async function(e) {
         e.preventDefault();
@@ -411,25 +482,8 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // API isteği gönder
             showDebug(); // Debug konsolunu göster
-            log('Fetch isteği gönderiliyor: /generate_tale');
-            const response = await fetch('/generate_tale', {
-                method: 'POST',
-                body: formData
-            });
-            
-            // Yanıt kontrolü
-            if (!response.ok) {
-                const errorText = await response.text();
-                log('API yanıtı hatalı', {
-                    status: response.status,
-                    statusText: response.statusText,
-                    errorText: errorText
-                });
-                throw new Error(`API yanıtı başarısız (${response.status}): ${errorText}`);
-            }
-            
-            // Yanıtı JSON olarak işle
-            const data = await response.json();
+            log('Masal işi başlatılıyor: /tale_jobs');
+            const data = await runTaleJob(formData);
             log('API yanıtı alındı', data);
             
             // Veri kontrolü
@@ -482,32 +536,27 @@ document.addEventListener('DOMContentLoaded', function() {
                     loaded: true
                 };
                 
-                // Diğer sayfalar için resimler oluşturalım (1. indeksten başlayarak)
+                // Diğer sayfaların resimlerini tek istekte oluşturalım (1. indeksten başlayarak)
                 if (talePages.length > 1) {
+                    const pageIndexes = [];
                     for (let i = 1; i < talePages.length; i++) {
-                        // Her sayfa için resim oluşturma promise'ini ekle
-                        imagePromises.push(
-                            new Promise((resolve) => {
-                                setTimeout(() => {
-                                    console.log(`Sayfa ${i+1} resmi için API çağrısı yapılıyor...`);
-                                    // generateImageForPage fonksiyonunu modifiye edelim
-                                    generateImageForPage(i, talePages[i], data.tale_title, {
-                                        character_name: characterName,
-                                        character_type: characterType, 
-                                        setting: setting,
-                                        image_api: imageApi,
-                                        character_age: document.getElementById('character-age')?.value || '',
-                                        character_gender: document.getElementById('character-gender')?.value || '',
-                                        character_hair_color: document.getElementById('character-hair-color')?.value || '',
-                                        character_hair_type: document.getElementById('character-hair-type')?.value || '',
-                                        character_skin_color: document.getElementById('character-skin-color')?.value || ''
-                                    })
-                                    .then(() => resolve())
-                                    .catch(() => resolve()); // Hata olsa da devam et
-                                }, i * 2000); // Her bir sayfa için 2 saniye gecikme 
-                            })
-                        );
+                        pageIndexes.push(i);
                     }
+                    console.log(`Sayfa 2-${talePages.length} resimleri için toplu API çağrısı yapılıyor...`);
+                    imagePromises.push(
+                        generateImagesForPages(pageIndexes, data.tale_title, {
+                            character_name: characterName,
+                            character_type: characterType, 
+                            setting: setting,
+                            image_api: imageApi,
+                            character_age: document.getElementById('character-age')?.value || '',
+                            character_gender: document.getElementById('character-gender')?.value || '',
+                            character_hair_color: document.getElementById('character-hair-color')?.value || '',
+                            character_hair_type: document.getElementById('character-hair-type')?.value || '',
+                            character_skin_color: document.getElementById('character-skin-color')?.value || ''
+                        })
+                        .catch(() => {}) // Hata olsa da devam et
+                    );
                 } else {
                     // Tek sayfa var, görsel oluşturma tamamlandı
                     updateProgressStatus('image', 'complete');
@@ -770,6 +819,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Sayfaları temizle
         talePages = [];
         taleImages = [];
+        startPrefetchGroup();
         
         log(`Toplam ${words.length} kelime, ${totalPages} sayfa oluşturulacak`);
         
@@ -867,6 +917,75 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Birden çok sayfanın görsellerini tek istekte oluşturma
+    // Sunucu her görseli hazır olur olmaz bir NDJSON satırı olarak gönderir
+    async function generateImagesForPages(pageIndexes, title, characterInfo) {
+        const requestData = {
+            ...characterInfo,
+            image_api: characterInfo.image_api || 'dalle',
+            pages: pageIndexes.map(pageIndex => ({
+                page_number: pageIndex + 1,
+                page_text: talePages[pageIndex]
+            }))
+        };
+        
+        const handleLine = (line) => {
+            if (!line.trim()) {
+                return;
+            }
+            const result = JSON.parse(line);
+            if (result.done) {
+                log(`Toplu görsel üretimi bitti: ${result.pages} sayfa, ${result.unique_prompts} farklı prompt, ${result.failed} hata`);
+                return;
+            }
+            
+            const pageIndex = result.page_number - 1;
+            if (result.image_url) {
+                console.log(`Sayfa ${result.page_number} için görsel başarıyla oluşturuldu`);
+                taleImages[pageIndex] = {
+                    page: pageIndex,
+                    url: result.image_url,
+                    alt: `${title} - Sayfa ${result.page_number}`,
+                    loaded: true
+                };
+                
+                // Eğer şu anda gösterilen sayfa bu ise, görseli güncelle
+                if (currentPage === pageIndex) {
+                    displayPage(currentPage);
+                }
+            } else {
+                // Hata durumunda varsayılan resim kullanılmaya devam eder
+                console.warn(`Sayfa ${result.page_number} için görsel oluşturulamadı: ${result.error}`);
+            }
+        };
+        
+        const response = await fetch('/generate_page_images', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(requestData)
+        });
+        if (!response.ok) {
+            throw new Error(`Toplu görsel isteği başarısız: ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer);
+    }
+    
     // Sayfa navigasyon butonlarını güncelle
     function updatePageNavigation() {
         document.getElementById('current-page').textContent = currentPage + 1;
@@ -1568,6 +1687,10 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({
                 tale_text: fullText,
                 images: taleImages.map(img => {
+                    // Sunucudaki görseller adresleriyle gönderilir, sunucu kendi deposundan okur
+                    if (img.url && img.url.startsWith('/images/')) {
+                        return img.url;
+                    }
                     // Base64 görüntü verisi çıkarılıyor
                     if (img.url && img.url.startsWith('data:image/')) {
                         // data:image/jpeg;base64,/9j/... formatından sadece base64 kısmını al
@@ -1767,7 +1890,13 @@ document.addEventListener('DOMContentLoaded', function() {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ text: text, page: currentPage })
+            body: JSON.stringify({
+                text: text,
+                page: currentPage,
+                // Sunucu sonraki sayfaların seslerini arka planda hazırlasın
+                tale_id: prefetchGroupId,
+                next_texts: talePages.slice(currentPage + 1, currentPage + 1 + PREFETCH_AHEAD)
+            })
         })
         .then(response => {
             if (!response.ok) {
@@ -2614,6 +2743,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Sayfaları yükle
             talePages = serverTale.pages.map(page => page.text);
             totalPages = talePages.length;
+            startPrefetchGroup();
             
             // Sayfa görsellerini yükle
             taleImages = serverTale.pages.map((page, index) => {
@@ -0,0 +1,179 @@
+"""
+Kaydedilmiş masallar için SQLite meta veri indeksi.
+
+Masal listesi her istekte tüm JSON dosyalarını okuyup her masal için ayrıca
+dosya taramak yerine bu indeksten tek bir sorguyla alınır. İndeks
+save_tale ve clear_tales tarafından güncellenir; boşsa diskteki masallardan
+yeniden oluşturulur.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+import tale_store
+
+logger = logging.getLogger("masal_app")
+
+COLUMNS = (
+    'id', 'title', 'date', 'character_name', 'character_type', 'type',
+    'is_favorite', 'has_image', 'thumb_url', 'page_count', 'audio_count', 'page_image_count'
+)
+UPSERT_SQL = f"INSERT OR REPLACE INTO tales ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+class TaleIndex:
+    """Masal türü, tarihi, favori işareti ve dosya sayılarını tutan indeks"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tales ("
+            " id TEXT PRIMARY KEY, title TEXT NOT NULL, date TEXT NOT NULL,"
+            " character_name TEXT NOT NULL, character_type TEXT NOT NULL, type TEXT NOT NULL,"
+            " is_favorite INTEGER NOT NULL, has_image INTEGER NOT NULL, thumb_url TEXT,"
+            " page_count INTEGER NOT NULL, audio_count INTEGER NOT NULL, page_image_count INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tales_type_date ON tales (type, date DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS tales_date ON tales (date DESC)")
+
+    @staticmethod
+    def _row(tale_info, has_image, thumb_url, page_count, audio_count, page_image_count):
+        tale_type = tale_info.get('type', 'history')
+        return (
+            str(tale_info['id']),
+            tale_info.get('title', 'Başlıksız Masal'),
+            tale_info.get('date', ''),
+            tale_info.get('characterName', ''),
+            tale_info.get('characterType', ''),
+            tale_type,
+            int(bool(tale_info.get('isFavorite', False)) or tale_type == 'favorites'),
+            int(bool(has_image)),
+            thumb_url,
+            page_count,
+            audio_count,
+            page_image_count
+        )
+
+    def upsert(self, tale_info, has_image=False, thumb_url=None, page_count=0, audio_count=0, page_image_count=0):
+        """Masalın indeks kaydını ekler veya günceller"""
+        self._connection().execute(
+            UPSERT_SQL, self._row(tale_info, has_image, thumb_url, page_count, audio_count, page_image_count)
+        )
+
+    def delete(self, tale_ids):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM tales WHERE id = ?", [(tale_id,) for tale_id in tale_ids])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._connection().execute("DELETE FROM tales")
+
+    def ids_by_type(self, tale_type):
+        rows = self._connection().execute("SELECT id FROM tales WHERE type = ?", (tale_type,)).fetchall()
+        return [row['id'] for row in rows]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM tales").fetchone()[0]
+
+    def list(self, tale_type='history', limit=5):
+        """En yeni masalları list_tales yanıt biçiminde döndürür ('all' tüm türler)"""
+        if tale_type == 'all':
+            rows = self._connection().execute(
+                "SELECT * FROM tales ORDER BY date DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT * FROM tales WHERE type = ? ORDER BY date DESC LIMIT ?", (tale_type, limit)
+            ).fetchall()
+
+        return [{
+            'id': row['id'],
+            'title': row['title'],
+            'date': row['date'],
+            'characterName': row['character_name'],
+            'characterType': row['character_type'],
+            'has_image': bool(row['has_image']),
+            'image_url': row['thumb_url'] if row['has_image'] else None,
+            'page_count': row['page_count'],
+            'has_audio': row['audio_count'] > 0,
+            'has_page_images': row['page_image_count'] > 0,
+            'type': row['type'],
+            'isFavorite': bool(row['is_favorite'])
+        } for row in rows]
+
+    def _row_from_disk(self, root, tale_id):
+        """Masalın indeks satırını diskteki dosyalarından oluşturur (masal yoksa None)"""
+        files = tale_store.tale_files(root, tale_id)
+        if tale_store.TALE_JSON not in files:
+            return None
+        with open(files[tale_store.TALE_JSON], 'r', encoding='utf-8') as f:
+            tale_info = json.load(f)
+        tale_info['id'] = tale_id
+        counts = tale_store.asset_counts(files)
+        return self._row(
+            tale_info,
+            has_image=counts['has_image'],
+            thumb_url=tale_store.image_url(root, files, 'image', 'thumb'),
+            page_count=counts['page_count'],
+            audio_count=counts['audio_count'],
+            page_image_count=counts['page_image_count']
+        )
+
+    def refresh(self, root, tale_id):
+        """Tek bir masalın kaydını diskten yeniler; masal artık yoksa kaydı siler"""
+        row = self._row_from_disk(root, tale_id)
+        if row is None:
+            self.delete([tale_id])
+        else:
+            self._connection().execute(UPSERT_SQL, row)
+
+    def rebuild(self, root):
+        """İndeksi kökteki tüm masallardan (her iki disk düzeni) yeniden oluşturur"""
+        rows = []
+        for tale_id in tale_store.iter_tale_ids(root):
+            try:
+                row = self._row_from_disk(root, tale_id)
+            except Exception as e:
+                logger.error(f"Masal indeksi: masal okunamadı ({tale_id}): {e}")
+                continue
+            if row is not None:
+                rows.append(row)
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM tales")
+            conn.executemany(UPSERT_SQL, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info(f"Masal indeksi yeniden oluşturuldu: {len(rows)} masal")
+        return len(rows)
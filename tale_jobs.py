@@ -0,0 +1,248 @@
+"""
+Masal oluşturma işleri için arka plan iş kuyruğu.
+
+HTTP isteği yalnızca bir iş (job) oluşturur ve hemen iş kimliğini döndürür.
+Metin, görsel ve ses aşamaları her biri kendi eşzamanlılık sınırına sahip
+iş havuzlarında çalıştırılır; istemci durum uç noktasını sorgulayarak
+aşama bazında ilerlemeyi takip eder. Aşama fonksiyonu bir coroutine ise
+havuz yerine async sağlayıcı döngüsünde, aşama başına bir semafor sınırıyla
+çalışır; beklerken iş parçacığı tutmaz.
+"""
+
+import asyncio
+import inspect
+
+import logging
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("masal_app")
+
+# Aşama durumları (frontend'deki updateProgressStatus değerleriyle uyumlu)
+STAGE_PENDING = 'pending'
+STAGE_LOADING = 'loading'
+STAGE_COMPLETE = 'complete'
+STAGE_ERROR = 'error'
+STAGE_SKIPPED = 'skipped'
+
+FINISHED_STATES = (STAGE_COMPLETE, STAGE_ERROR, STAGE_SKIPPED)
+
+
+class JobStage:
+    """Bir işin tek bir aşaması (ör. metin, görsel, ses)"""
+
+    def __init__(self, name, func, after=(), required=False):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.required = required
+        self.status = STAGE_PENDING
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        duration = None
+        if self.started_at and self.finished_at:
+            duration = round(self.finished_at - self.started_at, 3)
+        return {
+            'status': self.status,
+            'error': self.error,
+            'duration': duration
+        }
+
+
+class TaleJob:
+    """Aşamaları, ara sonuçları ve durum bilgisini tutan masal işi"""
+
+    def __init__(self, stages):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.finished_at = None
+        self.status = STAGE_PENDING
+        self.error = None
+        self.stages = {stage.name: stage for stage in stages}
+        # İstemciye dönen sonuçlar
+        self.result = {}
+        # Aşamalar arasında paylaşılan, istemciye gösterilmeyen veriler
+        self.context = {}
+
+    @property
+    def finished(self):
+        return self.status in (STAGE_COMPLETE, STAGE_ERROR)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+            'result': dict(self.result)
+        }
+
+
+class TaleJobManager:
+    """Aşama başına ayrı iş havuzlarıyla masal işlerini çalıştırır"""
+
+    def __init__(self, stage_limits, job_ttl=3600, max_jobs=500, loop_runner=None, async_stage_limits=None):
+        self.stage_limits = dict(stage_limits)
+        self.async_stage_limits = dict(async_stage_limits or stage_limits)
+        self._loop_runner = loop_runner
+        # Yalnızca olay döngüsü iş parçacığından erişilir
+        self._async_semaphores = {}
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"tale-{name}")
+            for name, limit in self.stage_limits.items()
+        }
+        logger.info(f"Masal iş kuyruğu hazır, aşama limitleri: {self.stage_limits}")
+
+    def submit(self, stages):
+        """Yeni bir iş oluşturur, bağımlılığı olmayan aşamaları başlatır ve işi döndürür"""
+        for stage in stages:
+            if stage.name not in self._executors:
+                raise ValueError(f"Bilinmeyen aşama: {stage.name}")
+            if inspect.iscoroutinefunction(stage.func) and self._loop_runner is None:
+                raise ValueError(f"'{stage.name}' async aşaması için olay döngüsü yapılandırılmadı")
+
+        job = TaleJob(stages)
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.id] = job
+            job.status = STAGE_LOADING
+
+        logger.info(f"Masal işi oluşturuldu: {job.id}")
+        self._schedule_ready(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self):
+        """Henüz sonlanmamış iş sayısı"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def shutdown(self, timeout=None):
+        """
+        Yeni aşama kabulünü durdurmadan çalışan işlerin bitmesini bekler.
+
+        Süreç kapanırken çağrılır; timeout saniye içinde bitmeyen işler
+        yarım kalır. Tüm işler bittiyse True döner.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.active_count():
+            if deadline is not None and time.time() >= deadline:
+                logger.warning(f"Kapanış: {self.active_count()} masal işi tamamlanamadan bırakıldı")
+                return False
+            time.sleep(0.2)
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        return True
+
+    def _schedule_ready(self, job):
+        """Bağımlılıkları tamamlanmış bekleyen aşamaları ilgili havuza gönderir"""
+        to_run = []
+        with self._lock:
+            for stage in job.stages.values():
+                if stage.status != STAGE_PENDING:
+                    continue
+                deps = [job.stages[name] for name in stage.after]
+                if any(dep.status in (STAGE_ERROR, STAGE_SKIPPED) for dep in deps):
+                    stage.status = STAGE_SKIPPED
+                    continue
+                if all(dep.status == STAGE_COMPLETE for dep in deps):
+                    stage.status = STAGE_LOADING
+                    to_run.append(stage)
+            self._update_job_status_locked(job)
+
+        for stage in to_run:
+            if inspect.iscoroutinefunction(stage.func):
+                self._loop_runner.submit(self._run_stage_async(job, stage))
+            else:
+                self._executors[stage.name].submit(self._run_stage, job, stage)
+
+    def _run_stage(self, job, stage):
+        stage.started_at = time.time()
+        logger.info(f"Masal işi {job.id}: '{stage.name}' aşaması başladı")
+        try:
+            self._stage_succeeded(job, stage, stage.func(job))
+        except Exception as e:
+            self._stage_failed(job, stage, e)
+        finally:
+            stage.finished_at = time.time()
+
+        self._schedule_ready(job)
+
+    async def _run_stage_async(self, job, stage):
+        semaphore = self._async_semaphores.get(stage.name)
+        if semaphore is None:
+            semaphore = self._async_semaphores[stage.name] = asyncio.Semaphore(self.async_stage_limits[stage.name])
+
+        async with semaphore:
+            stage.started_at = time.time()
+            logger.info(f"Masal işi {job.id}: '{stage.name}' aşaması başladı (async)")
+            try:
+                self._stage_succeeded(job, stage, await stage.func(job))
+            except Exception as e:
+                self._stage_failed(job, stage, e)
+            finally:
+                stage.finished_at = time.time()
+
+        self._schedule_ready(job)
+
+    def _stage_succeeded(self, job, stage, output):
+        with self._lock:
+            if output:
+                job.result.update(output)
+            stage.status = STAGE_COMPLETE
+        logger.info(f"Masal işi {job.id}: '{stage.name}' aşaması tamamlandı ({time.time() - stage.started_at:.2f} sn)")
+
+    def _stage_failed(self, job, stage, error):
+        with self._lock:
+            stage.status = STAGE_ERROR
+            stage.error = str(error)
+        logger.error(f"Masal işi {job.id}: '{stage.name}' aşamasında hata: {str(error)}")
+        logger.error(traceback.format_exc())
+
+    def _update_job_status_locked(self, job):
+        if job.finished:
+            return
+        if not all(stage.status in FINISHED_STATES for stage in job.stages.values()):
+            return
+
+        failed = [stage for stage in job.stages.values() if stage.required and stage.status != STAGE_COMPLETE]
+        if failed:
+            job.status = STAGE_ERROR
+            job.error = failed[0].error or f"'{failed[0].name}' aşaması tamamlanamadı"
+        else:
+            job.status = STAGE_COMPLETE
+        job.finished_at = time.time()
+        logger.info(f"Masal işi {job.id} sonlandı: {job.status}")
+
+    def _prune_locked(self):
+        """Süresi dolan veya limit aşımına neden olan bitmiş işleri temizler"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        if len(self._jobs) >= self.max_jobs:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.finished),
+                key=lambda job: job.finished_at
+            )
+            for job in finished[:len(self._jobs) - self.max_jobs + 1]:
+                del self._jobs[job.id]
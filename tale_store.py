@@ -0,0 +1,257 @@
+"""
+Kaydedilmiş masalların disk düzeni.
+
+Her masal kendi dizininde tutulur: static/tales/all/<özet önek>/<masal id>/
+(tale.json, image.jpg, page_0.txt, page_0_image.jpg, page_0_audio.mp3 ...).
+Önek, kimliğin SHA-256 özetinin ilk iki karakteridir; böylece hiçbir dizin
+çok büyümez ve bir masalı silmek tek bir rmtree'dir.
+
+Eski düz düzen (static/tales/all/<id>.json, <id>_image.jpg ...) okuma
+sırasında hâlâ desteklenir; migrate_tales.py eski masalları yeni düzene taşır.
+
+Dosya yolları sürecin çalışma dizinine değil uygulama dizinine göredir
+(TALES_DIR ile değiştirilebilir); tarayıcıya giden adresler her zaman
+TALES_URL önekiyle başlar ve tale_url / tale_path ile çevrilir.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: yalnızca süreç içi kilit
+    fcntl = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TALES_DIR = os.getenv("TALES_DIR", os.path.join(APP_DIR, 'static', 'tales', 'all'))
+TALES_URL = 'static/tales/all'
+TALE_JSON = 'tale.json'
+
+# Kimlikler dizin adı olarak kullanıldığından yalnızca güvenli karakterler
+TALE_ID_PATTERN = re.compile(r'^[\w\-]+$')
+
+# Eski düz düzendeki dosya adı -> (masal kimliği, yeni düzendeki dosya adı)
+LEGACY_FILE_PATTERN = re.compile(
+    r'^(?P<id>.+?)(?:\.json'
+    r'|_(?P<name>image(?:_\w+)?\.(?:jpg|webp)|page_\d+(?:\.txt|_image(?:_\w+)?\.(?:jpg|webp)|_audio\.mp3)))$'
+)
+
+PAGE_TEXT_PATTERN = re.compile(r'^page_(\d+)\.txt$')
+PAGE_IMAGE_PATTERN = re.compile(r'^page_\d+_image\.jpg$')
+PAGE_AUDIO_PATTERN = re.compile(r'^page_\d+_audio\.mp3$')
+
+# Aynı süreçteki eşzamanlı kayıtların dizin değişimini sıraya koyar; süreçler
+# (gunicorn worker'ları) arasında önek dizinindeki kilit dosyası kullanılır
+_commit_lock = threading.Lock()
+COMMIT_LOCK_FILE = '.commit.lock'
+
+# mkdtemp dizini 0700 açar; kaydedilen masal dizini statik dosya sunucusunun
+# okuyabileceği sabit bir izinle açılır (umask süreç genelinde olduğu için okunmaz)
+DIR_MODE = int(os.getenv("TALE_DIR_MODE", "755"), 8)
+
+
+def is_valid_tale_id(tale_id):
+    return bool(TALE_ID_PATTERN.match(str(tale_id)))
+
+
+def shard_prefix(tale_id):
+    return hashlib.sha256(str(tale_id).encode('utf-8')).hexdigest()[:2]
+
+
+def tale_dir(root, tale_id):
+    """Masalın yeni düzendeki dizini"""
+    if not is_valid_tale_id(tale_id):
+        raise ValueError(f"Geçersiz masal kimliği: {tale_id}")
+    return f"{root}/{shard_prefix(tale_id)}/{tale_id}"
+
+
+def tale_url(root, path):
+    """Kök altındaki dosya yolunu static/tales/all/... adresine çevirir"""
+    return f"{TALES_URL}/{os.path.relpath(path, root).replace(os.sep, '/')}"
+
+
+def tale_path(root, url):
+    """static/tales/all/... adresini kök altındaki dosya yoluna çevirir; adres kök dışını gösteriyorsa None"""
+    relative = url.lstrip('/')
+    if not relative.startswith(TALES_URL + '/'):
+        return None
+    root = os.path.abspath(root)
+    path = os.path.abspath(os.path.join(root, relative[len(TALES_URL) + 1:]))
+    return path if path.startswith(root + os.sep) else None
+
+
+def legacy_path(root, tale_id, name):
+    """Dosyanın eski düz düzendeki yolu"""
+    if name == TALE_JSON:
+        return f"{root}/{tale_id}.json"
+    return f"{root}/{tale_id}_{name}"
+
+
+def has_legacy(root, tale_id):
+    return os.path.exists(legacy_path(root, tale_id, TALE_JSON))
+
+
+def tale_files(root, tale_id):
+    """
+    Masalın dosyalarını {ad: yol} olarak döndürür.
+
+    Yeni düzendeki dizin okunur; eski düzende JSON varsa (taşınmamış veya
+    taşınması süren masal) kardeş dosyalar da eklenir. Yeni düzen önceliklidir.
+    """
+    files = {}
+    if has_legacy(root, tale_id):
+        for path in glob.glob(f"{glob.escape(root)}/{glob.escape(tale_id)}[._]*"):
+            match = LEGACY_FILE_PATTERN.match(os.path.basename(path))
+            if match and match.group('id') == tale_id:
+                files[match.group('name') or TALE_JSON] = path
+
+    # Eski düzende kimlik kuralına uymayan masallar olabilir; onların yeni dizini yoktur
+    if is_valid_tale_id(tale_id) and os.path.isdir(tale_dir(root, tale_id)):
+        for entry in os.scandir(tale_dir(root, tale_id)):
+            if entry.is_file():
+                files[entry.name] = entry.path
+    return files
+
+
+def image_path(files, base, variant):
+    """İstenen görsel türevinin, yoksa ana JPEG'in yolunu döndürür"""
+    return files.get(f"{base}_{variant}.webp") or files.get(f"{base}.jpg")
+
+
+def image_url(root, files, base, variant):
+    """image_path'in tarayıcı adresi; görsel yoksa None"""
+    path = image_path(files, base, variant)
+    return tale_url(root, path) if path else None
+
+
+def asset_counts(files):
+    return {
+        'has_image': 'image.jpg' in files,
+        'page_count': sum(1 for name in files if PAGE_TEXT_PATTERN.match(name)),
+        'page_image_count': sum(1 for name in files if PAGE_IMAGE_PATTERN.match(name)),
+        'audio_count': sum(1 for name in files if PAGE_AUDIO_PATTERN.match(name)),
+    }
+
+
+def remove_legacy(root, tale_id):
+    """Masalın eski düzendeki dosyalarını siler"""
+    if not has_legacy(root, tale_id):
+        return
+    for name, path in tale_files(root, tale_id).items():
+        if os.path.dirname(path) == root:
+            os.unlink(path)
+
+
+def delete_tale(root, tale_id):
+    """Masalı her iki düzenden de siler"""
+    remove_legacy(root, tale_id)
+    if is_valid_tale_id(tale_id):
+        shutil.rmtree(tale_dir(root, tale_id), ignore_errors=True)
+
+
+def iter_tale_ids(root):
+    """Kökteki tüm masal kimliklerini (her iki düzen) tek geçişte listeler"""
+    tale_ids = set()
+    if not os.path.isdir(root):
+        return tale_ids
+    for entry in os.scandir(root):
+        if entry.is_dir() and len(entry.name) == 2:
+            for tale_entry in os.scandir(entry.path):
+                # Nokta ile başlayanlar yarım kalmış kayıtların hazırlık dizinleridir
+                if tale_entry.name.startswith('.') or not tale_entry.is_dir():
+                    continue
+                if os.path.exists(os.path.join(tale_entry.path, TALE_JSON)):
+                    tale_ids.add(tale_entry.name)
+        elif entry.is_file() and entry.name.endswith('.json'):
+            tale_ids.add(entry.name[:-len('.json')])
+    return tale_ids
+
+
+def legacy_groups(root):
+    """Eski düz düzendeki dosyaları masal kimliğine göre gruplar: {id: {ad: yol}}"""
+    groups = {}
+    if not os.path.isdir(root):
+        return groups
+    for entry in os.scandir(root):
+        if not entry.is_file():
+            continue
+        match = LEGACY_FILE_PATTERN.match(entry.name)
+        if match:
+            groups.setdefault(match.group('id'), {})[match.group('name') or TALE_JSON] = entry.path
+    return groups
+
+
+def migrate_tale(root, tale_id, files):
+    """
+    Eski düzendeki dosyaları masalın dizinine taşır.
+
+    JSON en son taşınır; yarıda kalan bir taşıma tekrar çalıştırıldığında
+    kaldığı yerden devam eder, okuyucular ise her iki düzeni birlikte görür.
+    """
+    directory = tale_dir(root, tale_id)
+    os.makedirs(directory, exist_ok=True)
+    moved = 0
+    for name in sorted(files, key=lambda name: name == TALE_JSON):
+        target = os.path.join(directory, name)
+        if os.path.exists(target):
+            # Yeni düzende daha güncel bir kopya var
+            os.unlink(files[name])
+        else:
+            os.replace(files[name], target)
+            moved += 1
+    return moved
+
+
+def create_staging_dir(root, tale_id):
+    """
+    Masalın dosyalarının yazılacağı geçici hazırlık dizinini oluşturur.
+
+    Dizin, hedefle aynı önek dizininde (aynı dosya sisteminde) açılır; böylece
+    commit_staging_dir tek bir rename ile tamamlanır.
+    """
+    parent = os.path.dirname(tale_dir(root, tale_id))
+    os.makedirs(parent, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f".{tale_id}.", suffix='.tmp', dir=parent)
+    os.chmod(staging_dir, DIR_MODE)
+    return staging_dir
+
+
+@contextmanager
+def _locked(parent):
+    """Önek dizinindeki dizin değişimlerini süreçler ve iş parçacıkları arasında sıraya koyar"""
+    with _commit_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(parent, COMMIT_LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def commit_staging_dir(root, tale_id, staging_dir):
+    """
+    Hazırlık dizinini masalın dizini yapar.
+
+    Varsa eski dizin önce kenara alınır, yenisi rename ile yerine konur ve
+    eskisi silinir. Okuyucular yarım yazılmış bir masal görmez.
+    """
+    target = tale_dir(root, tale_id)
+    retired = staging_dir[:-len('.tmp')] + '.old'
+    with _locked(os.path.dirname(target)):
+        try:
+            os.rename(target, retired)
+        except FileNotFoundError:
+            retired = None
+        os.rename(staging_dir, target)
+    if retired:
+        shutil.rmtree(retired, ignore_errors=True)
+    remove_legacy(root, tale_id)
@@ -0,0 +1,224 @@
+"""
+Metin hedging testleri
+
+Sahte metin sağlayıcılarıyla TextHedger'ın yarışını sınar: hiç parça
+üretmeyen yavaş birincil iptal edilmeli, takılı kalan kaybedenler yeni
+istekleri bekletmemeli, yedek istek oranı soğuk başlangıçta ve eşzamanlı
+isteklerde de sınırı aşmamalı, akışsız çağrılar sağlayıcının generate yolunu
+kullanmalı ve kaybeden OpenAI generate çağrısının bağlantısı kapatılmalıdır.
+API anahtarı gerektirmez; OpenAI yerine yerel, yanıt başlığından sonra
+takılan bir sunucu kullanılır.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from hedging import HedgedTextProvider, TextHedger
+from providers import TextProvider, TextRequest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+HEDGE_AFTER = 0.05
+
+
+class StuckProvider(TextProvider):
+    """İlk parçayı hiç üretmez; abortable ise iptal geri çağrısıyla uyanır"""
+
+    name = 'stuck'
+
+    def __init__(self, abortable=True):
+        self.abortable = abortable
+        self.release = threading.Event()
+        self.finished = threading.Event()
+
+    def generate(self, request):
+        self.release.wait()
+        return "geç"
+
+    def stream(self, request):
+        try:
+            if self.abortable:
+                with request.abort.on_abort(self.release.set):
+                    self.release.wait()
+            else:
+                self.release.wait()
+            raise ConnectionError("bağlantı kapatıldı")
+            yield
+        finally:
+            self.finished.set()
+
+
+class SlowProvider(TextProvider):
+    """Eşikten sonra ama takılmadan cevap verir"""
+
+    name = 'slow'
+
+    def generate(self, request):
+        time.sleep(0.3)
+        return "yavaş"
+
+
+class FastProvider(TextProvider):
+    name = 'fast'
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, request):
+        self.calls.append('generate')
+        return "hızlı"
+
+    def stream(self, request):
+        self.calls.append('stream')
+        yield 'delta', "hızlı"
+        yield 'final', "hızlı"
+
+
+def make_request():
+    return TextRequest("prompt", "Ada", "kız", "orman", "dostluk", 100)
+
+
+def make_hedger():
+    return TextHedger(str(HEDGE_AFTER), max_ratio=1.0)
+
+
+def test_stuck_primary_is_aborted():
+    primary, secondary = StuckProvider(), FastProvider()
+    hedger = make_hedger()
+    started = time.monotonic()
+    events = list(hedger.race(primary, secondary, make_request(), commit_on_first=True))
+    elapsed = time.monotonic() - started
+
+    assert events == [('delta', "hızlı"), ('final', "hızlı")]
+    assert elapsed < 1.0
+    # Kaybedenin bekleyen okuması iptalle uyandırılır ve iş parçacığı biter
+    assert primary.finished.wait(1.0)
+    stats = hedger.stats()
+    assert stats['secondary_wins'] == 1
+    assert stats['failed'] == 0
+
+
+def test_stuck_losers_do_not_delay_new_requests():
+    # Kesilemeyen kaybedenler eski 32'lik havuzdan fazla olsa da yeni birincil istekler hemen başlar
+    primary, secondary = StuckProvider(abortable=False), FastProvider()
+    hedger = make_hedger()
+    results = []
+
+    def run():
+        for _ in range(40):
+            results.extend(hedger.race(primary, secondary, make_request(), commit_on_first=True))
+
+    try:
+        runner = threading.Thread(target=run, daemon=True)
+        runner.start()
+        runner.join(20)
+        assert not runner.is_alive()
+        assert len(results) == 80
+        assert hedger.stats()['secondary_wins'] == 40
+    finally:
+        primary.release.set()
+
+
+def test_hedge_budget_counts_running_requests():
+    # Soğuk başlangıçta eşzamanlı 20 istekten en fazla %10'u (2) yedeklenir
+    hedged = HedgedTextProvider(TextHedger(str(HEDGE_AFTER), max_ratio=0.1), SlowProvider(), FastProvider())
+    barrier = threading.Barrier(20)
+    results = []
+
+    def run():
+        barrier.wait()
+        results.append(hedged.generate(make_request()))
+
+    runners = [threading.Thread(target=run) for _ in range(20)]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join(10)
+
+    stats = hedged.hedger.stats()
+    assert len(results) == 20
+    assert stats['hedged'] == 2
+    assert stats['budget_skips'] == 18
+    assert sorted(results) == ["hızlı"] * 2 + ["yavaş"] * 18
+
+
+def test_generate_races_generate_calls():
+    primary, secondary = StuckProvider(), FastProvider()
+    hedged = HedgedTextProvider(make_hedger(), primary, secondary)
+    request = make_request()
+    try:
+        assert hedged.generate(request) == "hızlı"
+        assert secondary.calls == ['generate']
+        # Metin önbelleği yarışı kazananın anahtarını kullanır
+        assert request.produced_by is secondary
+    finally:
+        primary.release.set()
+
+
+class StallingServer:
+    """Yanıt başlığını gönderip gövdeyi hiç göndermeyen sunucu; istemcinin bağlantıyı kapattığı anı kaydeder"""
+
+    def __init__(self):
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(5)
+        self.url = f"http://127.0.0.1:{self.socket.getsockname()[1]}/v1"
+        self.closed_at = None
+        self.closed = threading.Event()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        conn, _ = self.socket.accept()
+        conn.recv(65536)
+        conn.sendall(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\ntransfer-encoding: chunked\r\n\r\n")
+        conn.settimeout(30)
+        try:
+            while conn.recv(65536):
+                pass
+        except OSError:
+            pass
+        self.closed_at = time.time()
+        self.closed.set()
+
+
+def test_losing_openai_generate_is_aborted():
+    server = StallingServer()
+    state_dir = tempfile.mkdtemp(prefix="masal_hedge_")
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="test",
+        OPENAI_BASE_URL=server.url,
+        GOOGLE_API_KEY="",
+        GEMINI_WARMUP="0",
+        DALLE_RATE_LIMIT_DB=os.path.join(state_dir, "rate_limits.sqlite3"),
+        IMAGE_CACHE_DIR=os.path.join(state_dir, "images"),
+        GENERATED_IMAGE_DIR=os.path.join(state_dir, "generated"),
+        AUDIO_STORE_DIR=os.path.join(state_dir, "audio"),
+        TALE_INDEX_DB=os.path.join(state_dir, "tale_index.sqlite3"),
+        TALES_DIR=os.path.join(state_dir, "tales"),
+    )
+    # Süreç kapanınca bağlantı zaten kapanır; kapanışın generate dönerken olduğunu görmek için süreç bekletilir
+    result_path = os.path.join(state_dir, "result.txt")
+    code = (
+        "import sys, time, app\n"
+        "from hedging import HedgedTextProvider, TextHedger\n"
+        "from test_hedging import FastProvider, make_request\n"
+        "hedged = HedgedTextProvider(TextHedger('0.2', max_ratio=1.0), app.OpenAITextProvider(), FastProvider())\n"
+        "text = hedged.generate(make_request())\n"
+        "returned_at = time.time()\n"
+        "with open(sys.argv[1], 'w', encoding='utf-8') as f:\n"
+        "    f.write(f'{text} {returned_at}')\n"
+        "time.sleep(3)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code, result_path], cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    with open(result_path, encoding='utf-8') as f:
+        text, returned_at = f.read().split()
+    assert text == "hızlı"
+    assert server.closed.wait(5)
+    assert server.closed_at < float(returned_at) + 1.0
@@ -0,0 +1,92 @@
+"""
+Başlangıç süresi testi
+
+`python -X importtime` ile app modülünün içe aktarma süresini ölçer ve bütçeyi
+aşarsa başarısız olur. Sağlayıcı SDK'ları (google.generativeai, openai, gtts,
+docx), Pillow ve requests ilk kullanıma kadar yüklenmemelidir; API anahtarı olmadan da uygulama
+çökmeden açılmalıdır. API anahtarı gerektirmez, ağa çıkmaz.
+
+Bütçe IMPORT_TIME_BUDGET_MS ile değiştirilebilir (varsayılan 600 ms; SDK'lar
+başlangıçta yüklenirken süre 1.5 sn civarındaydı).
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 600))
+LAZY_MODULES = ('google.generativeai', 'openai', 'gtts', 'docx', 'PIL', 'requests')
+
+
+def run_python(code, google_api_key="", openai_api_key="", *args):
+    state_dir = tempfile.mkdtemp(prefix="masal_import_")
+    env = dict(
+        os.environ,
+        GOOGLE_API_KEY=google_api_key,
+        OPENAI_API_KEY=openai_api_key,
+        GEMINI_WARMUP="0",
+        DALLE_RATE_LIMIT_DB=os.path.join(state_dir, "rate_limits.sqlite3"),
+        IMAGE_CACHE_DIR=os.path.join(state_dir, "images"),
+        GENERATED_IMAGE_DIR=os.path.join(state_dir, "generated"),
+        AUDIO_STORE_DIR=os.path.join(state_dir, "audio"),
+        TALE_INDEX_DB=os.path.join(state_dir, "tale_index.sqlite3"),
+    )
+    return subprocess.run(
+        [sys.executable, *args, "-c", code],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+
+
+def import_time_ms(stderr):
+    """-X importtime çıktısından app modülünün toplam süresini (ms) alır"""
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[0].startswith('import time:') and parts[2] == ' app':
+            return int(parts[1]) / 1000
+    raise AssertionError("importtime çıktısında app modülü bulunamadı")
+
+
+def test_import_time_within_budget():
+    # İlk çalıştırma .pyc dosyalarını oluşturur; ölçüm ikinci çalıştırmadan alınır
+    run_python("import app", "test", "test")
+    result = run_python("import app", "test", "test", "-X", "importtime")
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    elapsed = import_time_ms(result.stderr)
+    print(f"app içe aktarma süresi: {elapsed:.0f} ms (bütçe {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    assert elapsed <= IMPORT_TIME_BUDGET_MS
+
+
+def output_value(stdout, marker):
+    """Alt süreçte print(marker + değer) ile yazılan değeri döndürür"""
+    for line in stdout.splitlines():
+        if line.startswith(marker):
+            return line[len(marker):]
+    raise AssertionError(f"{marker} çıktısı bulunamadı: {stdout[-2000:]}")
+
+
+def test_provider_sdks_are_loaded_lazily():
+    result = run_python(
+        "import sys, app; print('LOADED=' + ','.join(m for m in %r if m in sys.modules))" % (LAZY_MODULES,),
+        "test", "test"
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert output_value(result.stdout, 'LOADED=') == ''
+
+
+def test_starts_without_api_keys():
+    result = run_python(
+        "import json, app; print('CAPABILITIES=' + json.dumps(app.app.test_client().get('/capabilities').json))"
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    capabilities = json.loads(output_value(result.stdout, 'CAPABILITIES='))
+    assert capabilities['text'] == {'gemini': False, 'openai': False}
+    assert capabilities['image']['placeholder'] is True
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
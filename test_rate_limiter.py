@@ -0,0 +1,45 @@
+"""
+Hız sınırlayıcı bilet testi
+
+Kısa ticket_ttl ile bekleyen bir isteğin bileti bayatlayıp temizlendiğinde
+acquire'ın hata vermeden sırasını koruyarak token aldığını doğrular. Her
+test geçici bir SQLite dosyası kullanır; API anahtarı gerektirmez.
+"""
+
+import os
+import tempfile
+import time
+
+from rate_limiter import TokenBucketLimiter
+
+
+def make_limiter(**kwargs):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="masal_limiter_"), "rate_limits.sqlite3")
+    return TokenBucketLimiter(db_path, "test", **kwargs)
+
+
+def test_acquire_survives_stale_own_ticket():
+    # Bekleme adımı (0.3 sn) ticket_ttl'den uzun: her kontrolde kendi bileti bayat görünür
+    limiter = make_limiter(rate_per_minute=120, capacity=1, ticket_ttl=0.05, max_wait_step=0.3)
+    assert limiter.try_acquire()
+    started = time.monotonic()
+    assert limiter.acquire(timeout=5)
+    assert time.monotonic() - started < 2
+
+
+def test_ticket_purged_by_another_process_is_reinserted():
+    limiter = make_limiter(rate_per_minute=60, capacity=1, ticket_ttl=0.05)
+    other = TokenBucketLimiter(limiter.db_path, "test", rate_per_minute=60, capacity=1, ticket_ttl=0.05)
+    assert limiter.try_acquire()
+
+    first = limiter._enqueue('normal')
+    second = other._enqueue('normal')
+    time.sleep(0.1)
+    # Diğer süreç kendi sırasını kontrol ederken bayat ilk bileti temizler
+    assert other._try_take(second, 'normal') > 0
+    assert limiter.status()['waiting']['normal'] == 1
+
+    # İlk bilet aynı kimlikle geri eklenir ve ikincinin önünde kalır
+    assert limiter._try_take(first, 'normal') > 0
+    assert limiter.status()['waiting']['normal'] == 2
+    assert other._try_take(second, 'normal') > limiter._try_take(first, 'normal')
@@ -0,0 +1,92 @@
+"""
+Geçici dosya sızıntısı testi
+
+Ses ve Word çıktılarının tamamen bellekte oluşturulduğunu doğrular:
+1000 çağrıdan sonra geçici dizinde yeni dosya kalmamalıdır.
+API anahtarı gerektirmez; gTTS yerine ağ kullanmayan sahte bir sınıf kullanılır.
+"""
+
+import base64
+import io
+import os
+import sys
+import tempfile
+
+# Uygulama içe aktarılmadan önce izlenen geçici dizini ve depoları ayarla
+WATCHED_TEMP_DIR = tempfile.mkdtemp(prefix="masal_leak_")
+STATE_DIR = tempfile.mkdtemp(prefix="masal_state_")
+tempfile.tempdir = WATCHED_TEMP_DIR
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ["GEMINI_WARMUP"] = "0"
+os.environ["DALLE_RATE_LIMIT_DB"] = os.path.join(STATE_DIR, "rate_limits.sqlite3")
+os.environ["IMAGE_CACHE_DIR"] = os.path.join(STATE_DIR, "images")
+os.environ["AUDIO_STORE_DIR"] = os.path.join(STATE_DIR, "audio")
+os.environ["GENERATED_IMAGE_DIR"] = os.path.join(STATE_DIR, "generated")
+os.environ["TALE_INDEX_DB"] = os.path.join(STATE_DIR, "tale_index.sqlite3")
+os.environ["TALES_DIR"] = os.path.join(STATE_DIR, "tales")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app as masal_app  # noqa: E402
+from PIL import Image  # noqa: E402
+
+CALLS = 1000
+
+
+class FakeTTS:
+    """Ağa çıkmadan sabit MP3 verisi yazan gTTS yerine geçen sınıf"""
+
+    def __init__(self, text, lang='tr', slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        fp.write(b"ID3" + self.text.encode('utf-8'))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            self.write_to_fp(f)
+
+
+def temp_files():
+    return set(os.listdir(WATCHED_TEMP_DIR))
+
+
+def sample_image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color=(173, 216, 230)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def test_create_audio_leaves_no_temp_files():
+    masal_app.gTTS = FakeTTS
+    before = temp_files()
+    for i in range(CALLS):
+        audio = masal_app.create_audio(f"Sayfa {i} metni")
+        assert audio.startswith(b"ID3")
+    assert temp_files() == before
+
+
+def test_save_word_leaves_no_temp_files():
+    client = masal_app.app.test_client()
+    image = sample_image_base64()
+    before = temp_files()
+    for _ in range(CALLS):
+        response = client.post('/save_word', json={
+            'tale_text': "Birinci sayfa\n\nİkinci sayfa",
+            'images': [image, image]
+        })
+        assert response.status_code == 200
+        assert response.data[:2] == b"PK"
+    assert temp_files() == before
+
+
+if __name__ == "__main__":
+    print("Geçici Dosya Sızıntısı Testi")
+    print("----------------------------")
+
+    test_create_audio_leaves_no_temp_files()
+    print(f"create_audio: {CALLS} çağrı sonrası geçici dizinde yeni dosya yok")
+
+    test_save_word_leaves_no_temp_files()
+    print(f"/save_word: {CALLS} çağrı sonrası geçici dizinde yeni dosya yok")
+
+    print("\nTüm testler başarılı!")
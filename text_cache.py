@@ -0,0 +1,112 @@
+"""
+Masal metinleri için isteğe bağlı bellek içi önbellek.
+
+Anahtar; Türkçe kurallarına göre küçük harfe çevrilmiş ve boşlukları
+sadeleştirilmiş girdiler (karakter adı/türü, ortam, tema, özellikler,
+kelime limiti) ile sağlayıcı ve model adından oluşur. Her anahtar için
+yapılandırılabilir sayıda farklı masal (varyant) üretilir; varyant sayısı
+dolduktan sonra masallar sırayla (round-robin) sunulur, böylece aynı
+girdileri kullanan çocuklar yine farklı masallar görür.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("masal_app")
+
+
+def normalize_turkish(value):
+    """Türkçe büyük/küçük harf kurallarıyla küçültür ve boşlukları sadeleştirir"""
+    text = str(value or '')
+    # str.lower() 'I' harfini 'i' yapar; Türkçede 'ı' olmalı
+    text = text.replace('I', 'ı').replace('İ', 'i').lower()
+    return ' '.join(text.split())
+
+
+class TaleTextCache:
+    """TTL, anahtar başına varyant ve LRU tahliyesi olan masal metni önbelleği"""
+
+    def __init__(self, ttl=86400, variants=3, max_keys=1000):
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider, model, character_name, character_type, setting, theme, word_limit, character_attributes=None):
+        """Normalleştirilmiş üretim girdilerinden önbellek anahtarı oluşturur"""
+        attributes = {
+            key: normalize_turkish(value)
+            for key, value in sorted((character_attributes or {}).items())
+            if normalize_turkish(value)
+        }
+        payload = json.dumps([
+            provider,
+            model,
+            normalize_turkish(character_name),
+            normalize_turkish(character_type),
+            normalize_turkish(setting),
+            normalize_turkish(theme),
+            int(word_limit),
+            attributes
+        ], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Varyant sayısı dolduysa sıradaki masalı döndürür; dolmadıysa yeni üretim için None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Süresi dolan varyantları at
+                entry['variants'] = [
+                    variant for variant in entry['variants']
+                    if now - variant[1] < self.ttl
+                ]
+                if not entry['variants']:
+                    del self._entries[key]
+                    entry = None
+
+            if entry is None or len(entry['variants']) < self.variants:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            text = entry['variants'][entry['next'] % len(entry['variants'])][0]
+            entry['next'] += 1
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        """Yeni bir varyant ekler ve gerekirse en az kullanılan anahtarları tahliye eder"""
+        with self._lock:
+            entry = self._entries.setdefault(key, {'variants': [], 'next': 0})
+            if len(entry['variants']) < self.variants:
+                entry['variants'].append((text, time.time()))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'keys': len(self._entries),
+                'max_keys': self.max_keys,
+                'variants': self.variants,
+                'ttl': self.ttl
+            }
@@ -0,0 +1,10 @@
+"""
+WSGI giriş noktası (gunicorn, uWSGI, mod_wsgi vb.)
+
+    gunicorn -c gunicorn.conf.py          # önerilen
+    gunicorn wsgi:application
+"""
+
+from app import create_app
+
+application = create_app()